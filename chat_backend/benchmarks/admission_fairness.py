@@ -0,0 +1,92 @@
+"""
+上游准入调度基准：一个调用方突发大量请求时，其他调用方的排队耗时。
+
+模拟上游每个请求耗时 --upstream-ms，同时最多处理 --concurrency 个请求。
+调用方 heavy 一次性发出 --burst 个请求，随后 light 每隔 --light-interval-ms 发出 1 个，共 --light 个。分别用两种方式限流：
+- fifo:      asyncio.Semaphore（先到先服务，等价于没有按调用方排队）
+- admission: AdmissionScheduler（按调用方轮转放行）
+输出两个调用方各自的排队耗时 p50 / p95 / max（毫秒）与总耗时。
+
+用法（在 chat_backend 目录下）：
+    python benchmarks/admission_fairness.py --burst 200 --concurrency 8
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+from contextlib import asynccontextmanager
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.admission import AdmissionScheduler  # noqa: E402
+
+
+def summarize(waits: List[float]) -> str:
+    waits = sorted(waits)
+
+    def pct(p: float) -> float:
+        return waits[min(len(waits) - 1, int(len(waits) * p))] * 1000
+
+    return f"{pct(0.5):>8.0f} {pct(0.95):>8.0f} {pct(1.0):>8.0f}"
+
+
+async def run_case(slot, args) -> Dict[str, List[float]]:
+    waits: Dict[str, List[float]] = {"heavy": [], "light": []}
+
+    async def request(caller: str):
+        enqueued = time.perf_counter()
+        async with slot(caller):
+            waits[caller].append(time.perf_counter() - enqueued)
+            await asyncio.sleep(args.upstream_ms / 1000)
+
+    async def light():
+        tasks = []
+        for _ in range(args.light):
+            tasks.append(asyncio.create_task(request("light")))
+            await asyncio.sleep(args.light_interval_ms / 1000)
+        await asyncio.gather(*tasks)
+
+    heavy = [asyncio.create_task(request("heavy")) for _ in range(args.burst)]
+    await asyncio.sleep(0)
+    await asyncio.gather(light(), *heavy)
+    return waits
+
+
+async def run(args):
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    @asynccontextmanager
+    async def fifo(caller: str):
+        async with semaphore:
+            yield
+
+    scheduler = AdmissionScheduler(max_concurrency=args.concurrency)
+
+    def admission(caller: str):
+        return scheduler.slot("bench", caller)
+
+    print(f"upstream {args.upstream_ms}ms x {args.concurrency} concurrent, "
+          f"heavy burst {args.burst}, light {args.light} every {args.light_interval_ms}ms")
+    print(f"{'mode':>10} {'caller':>6} {'p50 ms':>8} {'p95 ms':>8} {'max ms':>8} {'total s':>8}")
+    for name, slot in (("fifo", fifo), ("admission", admission)):
+        started = time.perf_counter()
+        waits = await run_case(slot, args)
+        total = time.perf_counter() - started
+        for caller in ("heavy", "light"):
+            print(f"{name:>10} {caller:>6} {summarize(waits[caller])} {total:>8.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--burst", type=int, default=200)
+    parser.add_argument("--light", type=int, default=20)
+    parser.add_argument("--light-interval-ms", type=float, default=50)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--upstream-ms", type=float, default=100)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+ConversationManager 锁竞争基准：对比全局锁（lock_stripes=1，等价于旧实现）与分段锁。
+
+数据库被替换为固定延迟的假连接，因此测到的只是进程内锁带来的串行化：
+每个线程操作自己的会话，循环执行 append_message + get_messages。
+
+用法（在 chat_backend 目录下）：
+    python benchmarks/conversation_lock_contention.py --latency-ms 5 --ops 20
+"""
+import os
+import sys
+import time
+import argparse
+import threading
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import db  # noqa: E402
+
+
+class _FakeCursor:
+    _ids = iter(range(1, 1 << 62))
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.lastrowid = None
+        self.rowcount = 1
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def execute(self, sql, params=None):
+        time.sleep(self.latency)
+        self.lastrowid = next(self._ids)
+
+    def fetchone(self):
+        return (1,)
+
+    def fetchall(self):
+        return []
+
+
+class _FakeConn:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def cursor(self, *args):
+        return _FakeCursor(self.latency)
+
+
+LATENCY = 0.005
+
+
+@contextmanager
+def _fake_get_conn():
+    yield _FakeConn(LATENCY)
+
+
+# 必须在导入 manager 之前替换，manager 在导入时即按名字绑定 get_conn
+db.get_conn = _fake_get_conn
+
+from conversation_manager.manager import ConversationManager  # noqa: E402
+
+
+def run(stripes: int, conversations: int, ops: int) -> float:
+    manager = ConversationManager(lock_stripes=stripes)
+    conv_ids = [f"bench-{stripes}-{i}" for i in range(conversations)]
+    barrier = threading.Barrier(conversations + 1)
+
+    def worker(cid: str):
+        barrier.wait()
+        for _ in range(ops):
+            manager.append_message(cid, "user", "hello")
+            manager.get_messages(cid)
+
+    threads = [threading.Thread(target=worker, args=(cid,)) for cid in conv_ids]
+    for t in threads:
+        t.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - start
+    return conversations * ops * 2 / elapsed
+
+
+def main():
+    global LATENCY
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--latency-ms", type=float, default=5.0, help="每条 SQL 的模拟往返延迟")
+    parser.add_argument("--ops", type=int, default=20, help="每个会话执行的 append+get 轮数")
+    parser.add_argument("--stripes", type=int, default=64)
+    parser.add_argument("--concurrency", type=str, default="1,2,4,8,16,32")
+    args = parser.parse_args()
+    LATENCY = args.latency_ms / 1000.0
+
+    print(f"{'conversations':>13} {'global lock ops/s':>18} {'striped ops/s':>14} {'speedup':>8}")
+    for n in [int(x) for x in args.concurrency.split(",")]:
+        global_tp = run(1, n, args.ops)
+        striped_tp = run(args.stripes, n, args.ops)
+        print(f"{n:>13} {global_tp:>18.1f} {striped_tp:>14.1f} {striped_tp / global_tp:>7.2f}x")
+
+
+if __name__ == "__main__":
+    main()
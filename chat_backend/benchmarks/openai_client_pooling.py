@@ -0,0 +1,134 @@
+"""
+OpenAIClient 连接复用基准：每次请求新建 ClientSession（旧实现）与按 base_url 共享的 ClientSession。
+
+在本机启动一个 OpenAI 兼容的桩服务（aiohttp.web），分别以两种方式发起 --requests 次
+get_response_complete / get_response_stream 请求（并发 --concurrency），统计单请求耗时
+p50 / p99 与桩服务看到的 TCP 连接数。--delay-ms 可模拟握手之外的服务端耗时。
+
+用法（在 chat_backend 目录下）：
+    python benchmarks/openai_client_pooling.py --requests 2000 --concurrency 20
+"""
+import os
+import sys
+import json
+import time
+import socket
+import asyncio
+import argparse
+from typing import List
+
+import aiohttp
+from aiohttp import web
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import openai_client  # noqa: E402
+from openai_client import OpenAIClient, close_http_sessions  # noqa: E402
+
+_MESSAGES = [{"role": "user", "content": "ping"}]
+
+
+class StubServer:
+    """最小的 /v1/chat/completions 实现，记录新建的 TCP 连接数"""
+    def __init__(self, delay: float):
+        self.delay = delay
+        self.connections = 0
+        self._peers = set()
+
+    async def handle(self, request: web.Request):
+        peer = request.transport.get_extra_info("peername") if request.transport else None
+        if peer not in self._peers:
+            self._peers.add(peer)
+            self.connections += 1
+        body = await request.json()
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if not body.get("stream"):
+            return web.json_response({"choices": [{"message": {"role": "assistant", "content": "pong"}}]})
+        resp = web.StreamResponse(headers={"Content-Type": "text/event-stream"})
+        await resp.prepare(request)
+        for piece in ("po", "ng"):
+            chunk = {"choices": [{"delta": {"content": piece}}]}
+            await resp.write(f"data: {json.dumps(chunk)}\n\n".encode())
+        await resp.write(b"data: [DONE]\n\n")
+        await resp.write_eof()
+        return resp
+
+
+async def per_call(method: str, client: OpenAIClient):
+    """旧实现：每次调用创建并关闭自己的 ClientSession"""
+    url = f"{client.base_url}/chat/completions"
+    payload = {"model": "bench", "messages": _MESSAGES, "stream": method == "stream"}
+    async with aiohttp.ClientSession() as session:
+        async with session.post(url, json=payload) as resp:
+            if method == "stream":
+                async for _ in resp.content:
+                    pass
+            else:
+                await resp.json()
+
+
+async def shared(method: str, client: OpenAIClient):
+    if method == "stream":
+        async for _ in client.get_response_stream(_MESSAGES, "bench"):
+            pass
+    else:
+        await client.get_response_complete(_MESSAGES, "bench")
+
+
+async def run(mode: str, method: str, args) -> dict:
+    stub = StubServer(args.delay_ms / 1000.0)
+    app = web.Application()
+    app.router.add_post("/v1/chat/completions", stub.handle)
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    port = sock.getsockname()[1]
+    site = web.SockSite(runner, sock)
+    await site.start()
+
+    client = OpenAIClient("bench-key", f"http://localhost:{port}/v1")
+    call = per_call if mode == "per-call" else shared
+    durations: List[float] = []
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one():
+        async with semaphore:
+            started = time.perf_counter()
+            await call(method, client)
+            durations.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(args.requests)))
+    elapsed = time.perf_counter() - started
+    # 共享 session 绑定在当前事件循环上，每轮结束关闭，下一轮重新创建
+    await close_http_sessions()
+    await runner.cleanup()
+    return {"durations": durations, "elapsed": elapsed, "connections": stub.connections}
+
+
+def _pct(values: List[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--delay-ms", type=float, default=0)
+    args = parser.parse_args()
+
+    print(f"{args.requests} requests, concurrency {args.concurrency}, stub delay {args.delay_ms} ms, "
+          f"pool limit {openai_client.Config.OPENAI_HTTP_POOL_LIMIT}")
+    print(f"{'method':>8} {'session':>9} {'p50 ms':>8} {'p99 ms':>8} {'req/s':>8} {'tcp conns':>10}")
+    for method in ("complete", "stream"):
+        for mode in ("per-call", "shared"):
+            r = asyncio.run(run(mode, method, args))
+            print(f"{method:>8} {mode:>9} {_pct(r['durations'], 0.5):>8.2f} {_pct(r['durations'], 0.99):>8.2f} "
+                  f"{args.requests / r['elapsed']:>8.0f} {r['connections']:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+"""
+SSE 解析吞吐基准：OpenAIClient.get_response_stream 的旧解析循环与 SSEDecoder。
+
+构造一段 --events 个 chat.completion.chunk 事件的流（每个 delta 约 --content-chars 个字符），
+按 --read-bytes 大小切块（模拟每次 TCP 读取）送入 aiohttp.StreamReader，再分别用两种方式读完：
+- legacy:  async for line in resp.content（readline）+ decode/strip + 循环内 import json + json.loads
+- decoder: resp.content.readany() 原始字节块 + SSEDecoder + json_loads（已安装 orjson 时使用 orjson）
+输出 MB/s（按流的字节数计）与解析出的文本是否与原文一致。
+另有多行 data 与超长行（超过 readline 的 64KB 上限）两种情况的正确性检查。
+
+用法（在 chat_backend 目录下）：
+    python benchmarks/sse_parse_throughput.py --events 50000 --read-bytes 1400
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+from typing import List, Tuple
+
+from aiohttp import StreamReader
+from aiohttp.base_protocol import BaseProtocol
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services import sse_decoder  # noqa: E402
+from services.sse_decoder import SSEDecoder, delta_content  # noqa: E402
+
+
+def build_stream(events: int, content_chars: int) -> Tuple[bytes, str]:
+    alphabet = "stream 流式 token 😀 "
+    parts: List[bytes] = []
+    text: List[str] = []
+    for i in range(events):
+        start = (i * 7) % len(alphabet)
+        content = (alphabet[start:] + alphabet)[:content_chars]
+        chunk = {
+            "id": "chatcmpl-bench",
+            "object": "chat.completion.chunk",
+            "created": 1700000000,
+            "model": "bench",
+            "choices": [{"index": 0, "delta": {"content": content}, "finish_reason": None}],
+        }
+        parts.append(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+        text.append(content)
+    parts.append(b"data: [DONE]\n\n")
+    return b"".join(parts), "".join(text)
+
+
+class _Protocol(BaseProtocol):
+    """整段数据预先写入 StreamReader，不需要真正的流量控制"""
+    def pause_reading(self):
+        pass
+
+    def resume_reading(self, resume_parser: bool = True):
+        pass
+
+
+def make_reader(body: bytes, read_bytes: int) -> StreamReader:
+    # 缓冲上限与 aiohttp ClientResponse 默认的 read_bufsize（64KB）一致，readline 的行长上限也由它决定
+    loop = asyncio.get_running_loop()
+    reader = StreamReader(_Protocol(loop), 2 ** 16, loop=loop)
+    for i in range(0, len(body), read_bytes):
+        reader.feed_data(body[i:i + read_bytes])
+    reader.feed_eof()
+    return reader
+
+
+async def legacy(content) -> str:
+    """旧实现的解析循环（去掉网络部分，逐行逻辑保持原样）"""
+    out: List[str] = []
+    async for line in content:
+        if not line:
+            continue
+        try:
+            l = line.decode().strip()
+            if l.startswith("data: "):
+                data = l[6:]
+                if data == "[DONE]":
+                    break
+                import json as _json
+                payload = _json.loads(data)
+                if "choices" in payload:
+                    delta = payload["choices"][0].get("delta", {})
+                    if "content" in delta:
+                        out.append(delta["content"])
+        except Exception as e:
+            out.append(f"[Stream Error: {e}]")
+    return "".join(out)
+
+
+async def decoder(content) -> str:
+    """当前实现的解析循环"""
+    out: List[str] = []
+    dec = SSEDecoder()
+    while True:
+        raw = await content.readany()
+        events = dec.feed(raw) if raw else dec.flush()
+        for data in events:
+            if data == b"[DONE]":
+                return "".join(out)
+            try:
+                text = delta_content(sse_decoder.json_loads(data))
+            except ValueError:
+                continue
+            if text:
+                out.append(text)
+        if not raw:
+            return "".join(out)
+
+
+async def measure(parser, body: bytes, expected: str, read_bytes: int, repeat: int) -> Tuple[float, bool]:
+    best = float("inf")
+    ok = True
+    for _ in range(repeat):
+        reader = make_reader(body, read_bytes)
+        started = time.perf_counter()
+        text = await parser(reader)
+        best = min(best, time.perf_counter() - started)
+        ok = ok and text == expected
+    return len(body) / best / 1e6, ok
+
+
+async def edge_cases(read_bytes: int) -> List[Tuple[str, bool, bool]]:
+    multi = b'data: {"choices":[{"delta":\ndata: {"content":"multi-line"}}]}\n\n'
+    long_content = "x" * 200_000
+    long_line = f"data: {json.dumps({'choices': [{'delta': {'content': long_content}}]})}\n\n".encode()
+    cases = [("multi-line data", multi, "multi-line"), ("200KB line", long_line, long_content)]
+    results = []
+    for name, body, expected in cases:
+        row = [name]
+        for parser in (legacy, decoder):
+            try:
+                row.append(await parser(make_reader(body, read_bytes)) == expected)
+            except Exception:
+                row.append(False)
+        results.append(tuple(row))
+    return results
+
+
+async def run(args):
+    body, expected = build_stream(args.events, args.content_chars)
+    print(f"{args.events} events, {len(body) / 1e6:.1f} MB, {args.read_bytes} B per read, "
+          f"json backend: {'orjson' if sse_decoder.orjson else 'json'}")
+    print(f"{'parser':>16} {'MB/s':>8} {'correct':>8}")
+    rows = [("legacy", legacy), ("decoder", decoder)]
+    if sse_decoder.orjson is not None:
+        # 同一解码器换回标准库 json，区分解码器本身与 JSON 后端各自的收益
+        orjson_loads = sse_decoder.json_loads
+
+        async def decoder_stdlib(content):
+            sse_decoder.json_loads = json.loads
+            try:
+                return await decoder(content)
+            finally:
+                sse_decoder.json_loads = orjson_loads
+
+        rows.insert(1, ("decoder (json)", decoder_stdlib))
+    for name, parser in rows:
+        mbps, ok = await measure(parser, body, expected, args.read_bytes, args.repeat)
+        print(f"{name:>16} {mbps:>8.1f} {str(ok):>8}")
+    print(f"\n{'case':>16} {'legacy':>8} {'decoder':>8}")
+    for name, old_ok, new_ok in await edge_cases(args.read_bytes):
+        print(f"{name:>16} {str(old_ok):>8} {str(new_ok):>8}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--events", type=int, default=50000)
+    parser.add_argument("--content-chars", type=int, default=4)
+    parser.add_argument("--read-bytes", type=int, default=1400)
+    parser.add_argument("--repeat", type=int, default=3)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
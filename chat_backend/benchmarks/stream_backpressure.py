@@ -0,0 +1,148 @@
+"""
+背压基准：数千个慢速读者各自连接一个高速上游时，每条连接的缓冲内存是否有界。
+
+每个连接：上游尽快产出 --fragments 个 1~3 字符的碎片，客户端每读一次休眠 --read-delay-ms。
+运行 --seconds 秒后停止，统计：
+- conn peak KB: 所有连接中单连接队列内存峰值（sys.getsizeof 计）
+- total peak MB: tracemalloc 统计的进程内存峰值
+- spilled MB:   spill 策略写入临时文件的总量
+- upstream / delivered: 上游已读出与客户端已收到的碎片数
+unbounded 为对照组：无上限的 asyncio.Queue（即上游读多快就堆多少）。
+最后对少量连接校验客户端收到的文本与上游产出完全一致。
+
+用法（在 chat_backend 目录下）：
+    python benchmarks/stream_backpressure.py --readers 2000 --fragments 2000 --max-bytes 16384
+"""
+import os
+import sys
+import asyncio
+import argparse
+import tracemalloc
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.stream_backpressure import BoundedStreamPipe  # noqa: E402
+
+_ALPHABET = "ab字😀c"
+
+
+def fragment(stream: int, i: int) -> str:
+    return _ALPHABET[(stream + i) % len(_ALPHABET)] * (1 + i % 3)
+
+
+async def fast_upstream(stream: int, fragments: int, counters: Dict[str, int]):
+    for i in range(fragments):
+        if i % 64 == 0:
+            await asyncio.sleep(0)
+        counters["upstream"] += 1
+        yield fragment(stream, i)
+
+
+class UnboundedPipe:
+    """对照组：无界队列"""
+    def __init__(self):
+        self.queue: asyncio.Queue = asyncio.Queue()
+        self.queued_bytes = 0
+        self.peak_bytes = 0
+        self.spilled_bytes = 0
+
+    async def put(self, chunk: str):
+        self.queued_bytes += sys.getsizeof(chunk)
+        self.peak_bytes = max(self.peak_bytes, self.queued_bytes)
+        self.queue.put_nowait(chunk)
+
+    def close(self, error=None):
+        self.queue.put_nowait(None)
+
+    async def get(self):
+        chunk = await self.queue.get()
+        if chunk is not None:
+            self.queued_bytes -= sys.getsizeof(chunk)
+        return chunk
+
+    def dispose(self):
+        pass
+
+
+async def connection(stream: int, pipe, args, counters: Dict[str, int], received: List[str]):
+    async def pump():
+        async for chunk in fast_upstream(stream, args.fragments, counters):
+            await pipe.put(chunk)
+        pipe.close()
+
+    task = asyncio.create_task(pump())
+    try:
+        while True:
+            chunk = await pipe.get()
+            if chunk is None:
+                break
+            counters["delivered"] += 1
+            received.append(chunk)
+            await asyncio.sleep(args.read_delay_ms / 1000.0)
+    finally:
+        task.cancel()
+        pipe.dispose()
+
+
+async def run(policy: str, args) -> dict:
+    counters = {"upstream": 0, "delivered": 0}
+    pipes = [
+        UnboundedPipe() if policy == "unbounded" else BoundedStreamPipe(policy, args.max_bytes)
+        for _ in range(args.readers)
+    ]
+    received: List[List[str]] = [[] for _ in range(args.readers)]
+    tasks = [
+        asyncio.create_task(connection(i, pipe, args, counters, received[i]))
+        for i, pipe in enumerate(pipes)
+    ]
+    await asyncio.sleep(args.seconds)
+    for t in tasks:
+        t.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+    return {
+        "conn_peak_kb": max(p.peak_bytes for p in pipes) / 1024,
+        "spilled_mb": sum(p.spilled_bytes for p in pipes) / 1e6,
+        "upstream": counters["upstream"],
+        "delivered": counters["delivered"],
+    }
+
+
+async def verify(policy: str, args, streams: int = 5) -> bool:
+    """少量连接完整跑完，校验文本顺序与内容"""
+    ok = True
+    for stream in range(streams):
+        pipe = BoundedStreamPipe(policy, 512)
+        received: List[str] = []
+        quick = argparse.Namespace(fragments=args.fragments, read_delay_ms=0.01)
+        await connection(stream, pipe, quick, {"upstream": 0, "delivered": 0}, received)
+        expected = "".join(fragment(stream, i) for i in range(args.fragments))
+        ok = ok and "".join(received) == expected
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--readers", type=int, default=2000)
+    parser.add_argument("--fragments", type=int, default=2000)
+    parser.add_argument("--read-delay-ms", type=float, default=20)
+    parser.add_argument("--seconds", type=float, default=3)
+    parser.add_argument("--max-bytes", type=int, default=16384)
+    args = parser.parse_args()
+
+    print(f"{args.readers} slow readers ({args.read_delay_ms} ms/read), {args.fragments} fragments each, "
+          f"cap {args.max_bytes} B")
+    print(f"{'policy':>10} {'conn peak KB':>13} {'total peak MB':>14} {'spilled MB':>11} "
+          f"{'upstream':>10} {'delivered':>10} {'verified':>9}")
+    for policy in ("unbounded", "block", "coalesce", "spill"):
+        tracemalloc.start()
+        r = asyncio.run(run(policy, args))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        verified = "-" if policy == "unbounded" else str(asyncio.run(verify(policy, args)))
+        print(f"{policy:>10} {r['conn_peak_kb']:>13.1f} {peak / 1e6:>14.1f} {r['spilled_mb']:>11.2f} "
+              f"{r['upstream']:>10} {r['delivered']:>10} {verified:>9}")
+
+
+if __name__ == "__main__":
+    main()
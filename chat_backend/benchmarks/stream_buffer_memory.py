@@ -0,0 +1,84 @@
+"""
+StreamSession 分片缓冲基准：长输出下旧实现（chunks 列表 + full_response +=）与 ChunkBuffer 的追加耗时和内存。
+
+每轮追加 --chunks 个 --chunk-chars 字符的分片，每 --checkpoint-every 个分片取一次全文
+（对应旧实现的 full_response 与检查点读取）。内存为 tracemalloc 统计的结束时占用与峰值。
+
+用法（在 chat_backend 目录下）：
+    python benchmarks/stream_buffer_memory.py --chunks 200000 --chunk-chars 4
+"""
+import os
+import sys
+import time
+import argparse
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.chunk_buffer import ChunkBuffer  # noqa: E402
+
+
+class _LegacySession:
+    def __init__(self):
+        self.chunks = []
+        self.full_response = ""
+
+
+def run_legacy(chunks: int, chunk: str, checkpoint_every: int):
+    # 与旧 StreamSession 一致地写在实例属性上：CPython 对局部变量 s += t 的原地扩展优化对属性不生效
+    session = _LegacySession()
+    for i in range(chunks):
+        # 每个分片各自一个新 str 对象，与上游逐个产出时一致
+        piece = chunk[:-1] + chr(0x61 + i % 26)
+        session.chunks.append(piece)
+        session.full_response += piece
+        if checkpoint_every and i % checkpoint_every == 0:
+            session.full_response[len(session.full_response) // 2:]
+    return session
+
+
+def run_buffer(chunks: int, chunk: str, checkpoint_every: int, cap: int):
+    buf = ChunkBuffer(cap)
+    for i in range(chunks):
+        buf.append(chunk[:-1] + chr(0x61 + i % 26))
+        if checkpoint_every and i % checkpoint_every == 0:
+            buf.text(buf.char_length // 2)
+    return buf
+
+
+def measure(fn, *args):
+    # 计时与内存分两次运行，避免 tracemalloc 的开销计入耗时
+    start = time.perf_counter()
+    fn(*args)
+    elapsed = time.perf_counter() - start
+    tracemalloc.start()
+    result = fn(*args)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return elapsed, current / 1e6, peak / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--chunks", type=int, default=200000)
+    parser.add_argument("--chunk-chars", type=int, default=4)
+    parser.add_argument("--checkpoint-every", type=int, default=4000)
+    parser.add_argument("--cap-bytes", type=int, default=256 * 1024, help="带内存上限一行使用的上限")
+    args = parser.parse_args()
+    chunk = "x" * args.chunk_chars
+
+    print(f"{args.chunks} chunks x {args.chunk_chars} chars")
+    print(f"{'buffer':>18} {'seconds':>8} {'retained MB':>12} {'peak MB':>8}")
+    rows = [
+        ("list + attr +=", run_legacy, (args.chunks, chunk, args.checkpoint_every)),
+        ("ChunkBuffer", run_buffer, (args.chunks, chunk, args.checkpoint_every, 0)),
+        ("ChunkBuffer+spill", run_buffer, (args.chunks, chunk, args.checkpoint_every, args.cap_bytes)),
+    ]
+    for name, fn, fn_args in rows:
+        elapsed, current, peak = measure(fn, *fn_args)
+        print(f"{name:>18} {elapsed:>8.2f} {current:>12.1f} {peak:>8.1f}")
+
+
+if __name__ == "__main__":
+    main()
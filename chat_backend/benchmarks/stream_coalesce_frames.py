@@ -0,0 +1,82 @@
+"""
+SSE 分片合并基准：同一段上游输出在不合并 / 合并两种方式下产生的帧数、组帧耗时与附加延迟。
+
+上游为假实现：按 --rate 个分片/秒产出 1~2 个字符的细碎分片（接近 Poe 的输出形态）。
+每帧按 completion.py 的方式用 pydantic 构建 ChatCompletionStreamResponse 并 model_dump_json。
+"附加延迟" 为分片产出到其所在帧产出之间的时间。
+
+用法（在 chat_backend 目录下）：
+    python benchmarks/stream_coalesce_frames.py --fragments 2000 --rate 400
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from models import ChatCompletionStreamResponse, ChatCompletionStreamChoice  # noqa: E402
+from services.stream_coalesce import coalesce_chunks  # noqa: E402
+
+
+async def fake_upstream(fragments: int, rate: float, produced: List[float]):
+    interval = 1.0 / rate
+    loop = asyncio.get_running_loop()
+    start = loop.time()
+    for i in range(fragments):
+        # 按绝对时间对齐，避免 sleep 误差累积
+        await asyncio.sleep(max(0.0, start + i * interval - loop.time()))
+        produced.append(time.monotonic())
+        yield "字" if i % 3 else "ab"
+
+
+async def run(coalesce: bool, fragments: int, rate: float, window_ms: float, max_bytes: int) -> dict:
+    produced: List[float] = []
+    source = fake_upstream(fragments, rate, produced)
+    stream = coalesce_chunks(source, window_ms, max_bytes) if coalesce else source
+    frames = 0
+    frame_cpu = 0.0
+    delays: List[float] = []
+    consumed = 0
+    async for chunk in stream:
+        now = time.monotonic()
+        # 本帧包含的分片 = 已产出但尚未计入帧的全部分片
+        delays.extend(now - t for t in produced[consumed:])
+        consumed = len(produced)
+        t0 = time.perf_counter()
+        sse = ChatCompletionStreamResponse(
+            id="chatcmpl-bench", created=0, model="bench",
+            choices=[ChatCompletionStreamChoice(index=0, delta={"content": chunk})],
+        )
+        f"data: {sse.model_dump_json()}\n\n".encode("utf-8")
+        frame_cpu += time.perf_counter() - t0
+        frames += 1
+    delays.sort()
+    return {
+        "frames": frames,
+        "frame_cpu_ms": frame_cpu * 1000,
+        "p50_ms": delays[len(delays) // 2] * 1000,
+        "p99_ms": delays[min(len(delays) - 1, int(len(delays) * 0.99))] * 1000,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--fragments", type=int, default=2000)
+    parser.add_argument("--rate", type=float, default=400, help="上游每秒分片数")
+    parser.add_argument("--window-ms", type=float, default=20)
+    parser.add_argument("--max-bytes", type=int, default=256)
+    args = parser.parse_args()
+
+    print(f"{args.fragments} fragments at {args.rate:.0f}/s, window {args.window_ms} ms / {args.max_bytes} B")
+    print(f"{'mode':>10} {'frames':>7} {'framing CPU ms':>15} {'added p50 ms':>13} {'added p99 ms':>13}")
+    for coalesce in (False, True):
+        r = asyncio.run(run(coalesce, args.fragments, args.rate, args.window_ms, args.max_bytes))
+        mode = "coalesce" if coalesce else "per-chunk"
+        print(f"{mode:>10} {r['frames']:>7} {r['frame_cpu_ms']:>15.1f} {r['p50_ms']:>13.2f} {r['p99_ms']:>13.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+流式分片投递延迟基准：上游产出分片到 SSE 生成器拿到分片之间的延迟。
+
+对比两种投递方式（同一个 StreamSession，假 LLM 客户端）：
+- polling: 旧实现，每 150ms 轮询一次 session.get_chunks()
+- event:   当前实现，session.iter_chunks() 在分片到达时被唤醒
+
+输出首字延迟（TTFT，相对会话启动）与分片投递延迟的 p50 / p99 / max。
+
+用法（在 chat_backend 目录下）：
+    python benchmarks/stream_delivery_latency.py --streams 50 --chunks 40 --interval-ms 30
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+from datetime import datetime
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.chat_stream import StreamSession  # noqa: E402
+
+
+class FakeLLMClient:
+    """分片内容为产出时刻（monotonic），消费端据此计算投递延迟"""
+    def __init__(self, chunks: int, interval: float):
+        self.chunks = chunks
+        self.interval = interval
+
+    async def get_response_stream(self, messages, model):
+        for _ in range(self.chunks):
+            await asyncio.sleep(self.interval)
+            yield repr(time.monotonic())
+
+
+async def consume_polling(session: StreamSession, delays: List[float]):
+    sent_idx = 0
+    while not session.is_completed() or sent_idx < len(session.buffer):
+        for chunk in session.get_chunks(sent_idx):
+            sent_idx += 1
+            delays.append(time.monotonic() - float(chunk))
+        await asyncio.sleep(0.15)
+
+
+async def consume_event(session: StreamSession, delays: List[float]):
+    async for chunk in session.iter_chunks():
+        delays.append(time.monotonic() - float(chunk))
+
+
+async def run(mode: str, streams: int, client: FakeLLMClient) -> dict:
+    consume = consume_polling if mode == "polling" else consume_event
+    ttfts: List[float] = []
+    delays: List[float] = []
+
+    async def one(i: int):
+        session = StreamSession(f"bench-{i}", client, [], "bench", assistant_msg_id=0, now=datetime.now())
+        started = time.monotonic()
+        session.start()
+        own: List[float] = []
+        await consume(session, own)
+        if own:
+            # 首个分片的投递时刻 = 产出时刻 + 投递延迟
+            ttfts.append(session.first_chunk_at + own[0] - started)
+        delays.extend(own)
+
+    await asyncio.gather(*(one(i) for i in range(streams)))
+    return {"ttft": ttfts, "delay": delays}
+
+
+def _pct(values: List[float], p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--streams", type=int, default=50)
+    parser.add_argument("--chunks", type=int, default=40)
+    parser.add_argument("--interval-ms", type=float, default=30)
+    args = parser.parse_args()
+    client = FakeLLMClient(args.chunks, args.interval_ms / 1000.0)
+
+    print(f"{args.streams} concurrent streams, {args.chunks} chunks every {args.interval_ms} ms")
+    print(f"{'mode':>8} {'ttft p50':>9} {'ttft p99':>9} {'delay p50':>10} {'delay p99':>10} {'delay max':>10}  (ms)")
+    for mode in ("polling", "event"):
+        r = asyncio.run(run(mode, args.streams, client))
+        print(
+            f"{mode:>8} {_pct(r['ttft'], 0.5):>9.1f} {_pct(r['ttft'], 0.99):>9.1f} "
+            f"{_pct(r['delay'], 0.5):>10.2f} {_pct(r['delay'], 0.99):>10.2f} {max(r['delay']) * 1000:>10.2f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+StreamSession 资源占用基准：N 个并发流式会话下的线程数与常驻内存（RSS）。
+
+对比两种运行方式（各自在独立子进程中运行，互不影响 RSS）：
+- threads: 旧实现，每个流一个守护线程 + 独立事件循环
+- tasks:   当前实现，StreamSession 作为主事件循环上的 asyncio 任务
+
+LLM 客户端为假实现：每隔 --interval-ms 产出一个分片，共 --chunks 个。
+
+用法（在 chat_backend 目录下）：
+    python benchmarks/stream_session_footprint.py --streams 500
+"""
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import resource
+import threading
+import subprocess
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class FakeLLMClient:
+    def __init__(self, chunks: int, interval: float):
+        self.chunks = chunks
+        self.interval = interval
+
+    async def get_response_stream(self, messages, model):
+        for i in range(self.chunks):
+            await asyncio.sleep(self.interval)
+            yield f"token-{i} "
+
+
+def _rss_mb() -> float:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # macOS 等无 /proc 的平台退化为峰值 RSS（字节）
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 * 1024)
+
+
+class LegacyThreadedSession:
+    """旧版 StreamSession 的运行模型：线程 + new_event_loop，仅保留与资源占用相关的部分"""
+    def __init__(self, llm_client):
+        self.llm_client = llm_client
+        self.chunks = []
+        self.completed = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(self._stream())
+        finally:
+            loop.close()
+            self.completed.set()
+
+    async def _stream(self):
+        async for chunk in self.llm_client.get_response_stream([], "bench"):
+            self.chunks.append(chunk)
+
+
+def run_threads(streams: int, client: FakeLLMClient) -> dict:
+    base_rss = _rss_mb()
+    sessions = [LegacyThreadedSession(client) for _ in range(streams)]
+    start = time.perf_counter()
+    for s in sessions:
+        s.start()
+    time.sleep(client.interval * client.chunks / 2)
+    sample = {"threads": threading.active_count(), "rss_mb": _rss_mb() - base_rss}
+    for s in sessions:
+        s.completed.wait()
+    sample["elapsed_s"] = time.perf_counter() - start
+    return sample
+
+
+async def run_tasks(streams: int, client: FakeLLMClient) -> dict:
+    from services.chat_stream import StreamSession
+
+    base_rss = _rss_mb()
+    sessions = [
+        StreamSession(f"bench-{i}", client, [], "bench", assistant_msg_id=0, now=datetime.now())
+        for i in range(streams)
+    ]
+    start = time.perf_counter()
+    for s in sessions:
+        s.start()
+    await asyncio.sleep(client.interval * client.chunks / 2)
+    sample = {"threads": threading.active_count(), "rss_mb": _rss_mb() - base_rss}
+    await asyncio.gather(*(s.completed.wait() for s in sessions))
+    sample["elapsed_s"] = time.perf_counter() - start
+    return sample
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--streams", type=int, default=500)
+    parser.add_argument("--chunks", type=int, default=50)
+    parser.add_argument("--interval-ms", type=float, default=40)
+    parser.add_argument("--mode", choices=["threads", "tasks"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    client = FakeLLMClient(args.chunks, args.interval_ms / 1000.0)
+
+    if args.mode == "threads":
+        print(json.dumps(run_threads(args.streams, client)))
+        return
+    if args.mode == "tasks":
+        print(json.dumps(asyncio.run(run_tasks(args.streams, client))))
+        return
+
+    print(f"{args.streams} concurrent streams, {args.chunks} chunks every {args.interval_ms} ms")
+    print(f"{'mode':>8} {'threads':>8} {'RSS delta MB':>13} {'elapsed s':>10}")
+    for mode in ("threads", "tasks"):
+        out = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--mode", mode,
+             "--streams", str(args.streams), "--chunks", str(args.chunks),
+             "--interval-ms", str(args.interval_ms)],
+            capture_output=True, text=True, check=True,
+        ).stdout.strip().splitlines()[-1]
+        r = json.loads(out)
+        print(f"{mode:>8} {r['threads']:>8} {r['rss_mb']:>13.1f} {r['elapsed_s']:>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
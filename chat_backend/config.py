@@ -5,12 +5,69 @@ class Config:
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "sk-test-key-for-compatibility-Test")
     # 自定义 OpenAI 兼容 API 服务端 URL
     OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL", "http://43.132.224.225:8000/v1")
+    # OpenAI 兼容上游的 HTTP 连接池（每个 base_url 一个共享 ClientSession）
+    OPENAI_HTTP_POOL_LIMIT = int(os.getenv("OPENAI_HTTP_POOL_LIMIT", "100"))  # 总连接数上限
+    OPENAI_HTTP_POOL_LIMIT_PER_HOST = int(os.getenv("OPENAI_HTTP_POOL_LIMIT_PER_HOST", "50"))  # 单主机连接数上限，0 为不限
+    OPENAI_HTTP_KEEPALIVE_TIMEOUT = float(os.getenv("OPENAI_HTTP_KEEPALIVE_TIMEOUT", "30"))  # 空闲连接保留秒数
+    OPENAI_HTTP_DNS_TTL = int(os.getenv("OPENAI_HTTP_DNS_TTL", "300"))  # DNS 缓存秒数
+    OPENAI_HTTP_TIMEOUT = float(os.getenv("OPENAI_HTTP_TIMEOUT", "300"))  # 单次请求总超时秒数，0 为不限
+    OPENAI_UPSTREAM_MAX_CONCURRENCY = int(os.getenv("OPENAI_UPSTREAM_MAX_CONCURRENCY", "0"))  # 每个上游同时进行的请求数上限，0 为不限
+    # 按项目路由上游（projects.llm_url）；仅 openai 后端生效，默认关闭
+    PROJECT_UPSTREAM_ROUTING = os.getenv("PROJECT_UPSTREAM_ROUTING", "0") == "1"
+    # 允许按项目路由到的上游 base_url，逗号分隔；不在列表中的 llm_url 被忽略（全局 API key 只发往这些地址）
+    UPSTREAM_ALLOWLIST = os.getenv("UPSTREAM_ALLOWLIST", "")
+    # projects.llm_url 的建表默认值，视为项目未单独配置上游
+    PROJECT_DEFAULT_LLM_URL = "http://43.132.224.225:8000/v1/chat/completions"
+    PROJECT_UPSTREAM_CACHE_TTL = float(os.getenv("PROJECT_UPSTREAM_CACHE_TTL", "60"))  # 会话 -> 项目上游映射的缓存秒数
     HOST = "0.0.0.0"
     PORT = 8000
     LOG_DIR = "train_data"
 
     LLM_BACKEND = os.getenv("LLM_BACKEND", "openai")  # openai  or poe
 
+    # MySQL 连接池配置
+    DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "20"))  # 最大连接数
+    DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))  # 借连接最长等待秒数
+    DB_POOL_RECYCLE = float(os.getenv("DB_POOL_RECYCLE", "3600"))  # 连接最长存活秒数，需小于 MySQL wait_timeout
+    DB_POOL_PING_INTERVAL = float(os.getenv("DB_POOL_PING_INTERVAL", "30"))  # 空闲超过该秒数的连接借出前先 ping
+    # ConversationManager 按会话分段加锁的段数（不同会话互不阻塞）
+    CONVERSATION_LOCK_STRIPES = int(os.getenv("CONVERSATION_LOCK_STRIPES", "64"))
+    # 会话消息历史的进程内 LRU 缓存上限（字节），0 表示关闭
+    HISTORY_CACHE_MAX_BYTES = int(os.getenv("HISTORY_CACHE_MAX_BYTES", str(128 * 1024 * 1024)))
+    # 流式响应分片合并：窗口内的细碎分片合并成一帧 SSE，任一项为 0 表示关闭；请求头 X-Stream-Coalesce: off 可单独关闭
+    STREAM_COALESCE_MS = float(os.getenv("STREAM_COALESCE_MS", "20"))  # 最长合并等待毫秒数
+    STREAM_COALESCE_BYTES = int(os.getenv("STREAM_COALESCE_BYTES", "256"))  # 累积到该字节数立即发送
+    # 上游与客户端之间的有界缓冲（直连上游的流式响应）：超过上限时 block 挂起上游 / coalesce 合并积压后挂起 / spill 写入临时文件
+    STREAM_BACKPRESSURE_POLICY = os.getenv("STREAM_BACKPRESSURE_POLICY", "coalesce")
+    STREAM_BACKPRESSURE_MAX_BYTES = int(os.getenv("STREAM_BACKPRESSURE_MAX_BYTES", str(256 * 1024)))
+    STREAM_BACKPRESSURE_SPILL_DIR = os.getenv("STREAM_BACKPRESSURE_SPILL_DIR") or None
+    # 非流式补全结果缓存（默认关闭）：键为 (模型, 消息, 采样参数) 的规范化哈希；请求头 Cache-Control: no-cache 跳过读取，no-store 不读不写
+    COMPLETION_CACHE_ENABLED = os.getenv("COMPLETION_CACHE_ENABLED", "0") == "1"
+    COMPLETION_CACHE_MAX_TEMPERATURE = float(os.getenv("COMPLETION_CACHE_MAX_TEMPERATURE", "0"))  # 只缓存 temperature 不高于该值的请求
+    COMPLETION_CACHE_MAX_BYTES = int(os.getenv("COMPLETION_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))  # 内存层上限
+    COMPLETION_CACHE_TTL = float(os.getenv("COMPLETION_CACHE_TTL", "86400"))  # 条目有效秒数，0 为不过期
+    COMPLETION_CACHE_DIR = os.getenv("COMPLETION_CACHE_DIR") or None  # 磁盘层目录，不设置则只用内存层
+    COMPLETION_CACHE_DISK_MAX_BYTES = int(os.getenv("COMPLETION_CACHE_DISK_MAX_BYTES", str(1024 * 1024 * 1024)))  # 磁盘层上限，0 为不限
+    # 合并完全相同且正在进行中的补全请求（同一 API key、同一请求体），后到的请求复用第一个请求的结果 / 流
+    SINGLEFLIGHT_ENABLED = os.getenv("SINGLEFLIGHT_ENABLED", "1") == "1"
+    SINGLEFLIGHT_LINGER_SECONDS = float(os.getenv("SINGLEFLIGHT_LINGER_SECONDS", "5"))  # 流式请求的订阅者全部断开后保留上游请求的秒数，供断线重试接着使用
+    # 上游准入调度：总并发 / 每个模型 / 每个调用方（API key）的并发上限，0 为不限；超出的请求按调用方公平排队
+    ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "64"))  # 同时发往上游的请求总数上限
+    ADMISSION_MODEL_CONCURRENCY = int(os.getenv("ADMISSION_MODEL_CONCURRENCY", "16"))  # 每个模型的默认并发上限
+    ADMISSION_MODEL_LIMITS = os.getenv("ADMISSION_MODEL_LIMITS", "")  # 单独设置的模型上限，如 "GPT-5-Pro=2,Claude-Opus-4.6=4"
+    ADMISSION_KEY_CONCURRENCY = int(os.getenv("ADMISSION_KEY_CONCURRENCY", "0"))  # 每个调用方的并发上限
+    ADMISSION_MAX_QUEUE_WAIT = float(os.getenv("ADMISSION_MAX_QUEUE_WAIT", "120"))  # 最长排队秒数，超过返回 429，0 为一直等待
+    # 会话流结束后在注册表中保留的秒数，期间断线的客户端可通过 GET /v1/chat/streams/{session_id} 续传
+    STREAM_SESSION_GRACE_SECONDS = float(os.getenv("STREAM_SESSION_GRACE_SECONDS", "60"))
+    STREAM_SESSION_MAX_AGE_SECONDS = float(os.getenv("STREAM_SESSION_MAX_AGE_SECONDS", "7200"))  # 超过该时长仍未结束的会话被停止并移除，0 表示不限
+    STREAM_REAPER_INTERVAL_SECONDS = float(os.getenv("STREAM_REAPER_INTERVAL_SECONDS", "15"))  # 注册表清理周期
+    # 流式回复增量落库：未落库内容达到字节数或距上次落库超过秒数时追加写入，0 表示不按该条件触发（两者都为 0 则只在结束时写入）
+    STREAM_CHECKPOINT_BYTES = int(os.getenv("STREAM_CHECKPOINT_BYTES", str(16 * 1024)))
+    STREAM_CHECKPOINT_INTERVAL = float(os.getenv("STREAM_CHECKPOINT_INTERVAL", "5"))
+    # 单个流式会话分片缓冲区的内存上限（字节），超出部分写入临时文件；0 表示不限制
+    STREAM_BUFFER_MAX_MEMORY_BYTES = int(os.getenv("STREAM_BUFFER_MAX_MEMORY_BYTES", "0"))
+    STREAM_BUFFER_SPILL_DIR = os.getenv("STREAM_BUFFER_SPILL_DIR") or None  # 临时文件目录，默认系统临时目录
+
     # 忽略落库的用户消息内容列表（完全匹配时生效）
     ignoredUserMessages = [
         "continue, and mark [to be continue] at the last line of your replay if your output is NOT over and wait user's command to be continued",
@@ -1,2 +1,3 @@
 from .manager import ConversationManager, conversation_manager
-__all__ = ["ConversationManager", "conversation_manager"]
\ No newline at end of file
+from .async_manager import AsyncConversationManager, async_conversation_manager
+__all__ = ["ConversationManager", "conversation_manager", "AsyncConversationManager", "async_conversation_manager"]
\ No newline at end of file
@@ -0,0 +1,77 @@
+from datetime import datetime
+from typing import Optional, List, Dict, Any, Tuple
+from db import run_in_db_executor
+from .manager import ConversationManager, conversation_manager
+class AsyncConversationManager:
+    """
+    Awaitable facade over ConversationManager for use inside async routes.
+    Every call runs on the DB executor, so a slow query never blocks the event loop
+    (and the SSE streams sharing it). Semantics and exceptions (e.g. KeyError) are
+    exactly those of the wrapped synchronous method.
+    """
+    def __init__(self, manager: ConversationManager):
+        self.manager = manager
+    # ---------- Conversations ----------
+    async def create_conversation(
+        self,
+        system_prompt: Optional[str] = None,
+        project_id: int = 0,
+        name: Optional[str] = None,
+        model: Optional[str] = None,
+        assistance_role: Optional[str] = None,
+        status: int = 0
+    ) -> str:
+        return await run_in_db_executor(
+            self.manager.create_conversation,
+            system_prompt=system_prompt,
+            project_id=project_id,
+            name=name,
+            model=model,
+            assistance_role=assistance_role,
+            status=status
+        )
+    async def update_conversation(self, conversation_id: str, **fields: Any) -> bool:
+        return await run_in_db_executor(self.manager.update_conversation, conversation_id, **fields)
+    async def get_conversation_by_id(self, conversation_id: str) -> Dict[str, Any]:
+        return await run_in_db_executor(self.manager.get_conversation_by_id, conversation_id)
+    async def get_conversations(self, project_id: Optional[int] = None, status: Optional[int] = None, light: bool = False) -> List[Dict[str, Any]]:
+        return await run_in_db_executor(self.manager.get_conversations, project_id=project_id, status=status, light=light)
+    async def get_conversations_page(self, **kwargs: Any) -> Dict[str, Any]:
+        return await run_in_db_executor(self.manager.get_conversations_page, **kwargs)
+    async def get_all_conversations_grouped_by_project(self) -> Dict[str, List[Dict[str, Any]]]:
+        return await run_in_db_executor(self.manager.get_all_conversations_grouped_by_project)
+    async def delete_conversation(self, conversation_id: str) -> bool:
+        return await run_in_db_executor(self.manager.delete_conversation, conversation_id)
+    # ---------- Messages ----------
+    async def append_message(self, conversation_id: str, role: str, content: str, created_at: Optional[datetime] = None) -> int:
+        return await run_in_db_executor(self.manager.append_message, conversation_id, role, content, created_at)
+    async def insert_assistant_placeholder(self, conversation_id: str, created_at: Optional[datetime] = None) -> int:
+        return await run_in_db_executor(self.manager.insert_assistant_placeholder, conversation_id, created_at)
+    async def append_message_with_placeholder(
+        self,
+        conversation_id: str,
+        role: str,
+        content: str,
+        placeholder_created_at: Optional[datetime] = None,
+        store_user_message: bool = True
+    ) -> Tuple[Optional[int], int]:
+        return await run_in_db_executor(
+            self.manager.append_message_with_placeholder,
+            conversation_id,
+            role,
+            content,
+            placeholder_created_at=placeholder_created_at,
+            store_user_message=store_user_message
+        )
+    async def get_messages(self, conversation_id: str) -> List[Dict[str, Any]]:
+        return await run_in_db_executor(self.manager.get_messages, conversation_id)
+    async def get_messages_page(self, conversation_id: str, **kwargs: Any) -> Dict[str, Any]:
+        return await run_in_db_executor(self.manager.get_messages_page, conversation_id, **kwargs)
+    async def delete_messages(self, message_ids: List[int]) -> int:
+        return await run_in_db_executor(self.manager.delete_messages, message_ids)
+    async def update_message_content_and_time(self, message_id: int, content: str, created_at: Optional[datetime] = None) -> bool:
+        return await run_in_db_executor(self.manager.update_message_content_and_time, message_id, content, created_at)
+    async def append_message_content(self, message_id: int, delta: str, offset: int) -> bool:
+        return await run_in_db_executor(self.manager.append_message_content, message_id, delta, offset)
+# Global instance wrapping the shared synchronous manager
+async_conversation_manager = AsyncConversationManager(conversation_manager)
@@ -0,0 +1,165 @@
+import sys
+from threading import Lock
+from collections import OrderedDict
+from typing import Optional, List, Dict, Any, Tuple, Iterable
+# Rough per-message overhead (dict + datetimes + ints) on top of the content string itself
+_MESSAGE_OVERHEAD = 400
+# How many invalidations of uncached message ids are remembered individually (see HistoryCache.put)
+_RECENT_INVALIDATIONS = 4096
+def _message_size(msg: Dict[str, Any]) -> int:
+    return _MESSAGE_OVERHEAD + sys.getsizeof(msg.get("content") or "")
+class _Entry:
+    __slots__ = ("messages", "size", "generation")
+    def __init__(self, messages: List[Dict[str, Any]], size: int, generation: int):
+        self.messages = messages
+        self.size = size
+        self.generation = generation
+    @property
+    def last_id(self) -> int:
+        return self.messages[-1]["id"] if self.messages else 0
+class HistoryCache:
+    """
+    Byte-bounded LRU of conversation message histories (id, role, content, created_at, updated_at).
+    Coherence is maintained by ConversationManager's own write paths only: appends need no action
+    (they are picked up by the id > last_id tail fetch), content updates truncate the cached history
+    at the updated message so it is re-read, deletes drop the messages, conversation deletes evict.
+    Writes made by other processes are not observed.
+    A token from snapshot() must accompany put(); if the conversation was invalidated in between,
+    the put is dropped so a concurrent reader can never re-insert content older than an update.
+    Updates to messages that are not cached yet (e.g. the tail a reader is fetching right now) are
+    remembered per message id, and a put carrying any of them with an older token is dropped too.
+    """
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max(0, int(max_bytes))
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._owner: Dict[int, str] = {}
+        self._bytes = 0
+        self._epoch = 0
+        self._generation = 0
+        self._recent: "OrderedDict[int, int]" = OrderedDict()  # uncached message id -> epoch of its last invalidation
+        self._recent_floor = 0  # newest epoch forgotten from _recent; older tokens are rejected conservatively
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+    # ---------- read path ----------
+    def snapshot(self, conversation_id: str) -> Tuple[Optional[List[Dict[str, Any]]], int, Tuple[Optional[int], int]]:
+        """
+        Returns (cached messages or None, last cached message id, token).
+        The returned list is a copy and may be extended by the caller.
+        """
+        with self._lock:
+            entry = self._entries.get(conversation_id)
+            if entry is None:
+                self.misses += 1
+                return None, 0, (None, self._epoch)
+            self.hits += 1
+            self._entries.move_to_end(conversation_id)
+            return list(entry.messages), entry.last_id, (entry.generation, self._epoch)
+    def put(self, conversation_id: str, messages: List[Dict[str, Any]], token: Tuple[Optional[int], int]):
+        if not self.enabled:
+            return
+        size = sum(_message_size(m) for m in messages)
+        with self._lock:
+            generation, epoch = token
+            current = self._entries.get(conversation_id)
+            if generation is None:
+                if current is not None or epoch != self._epoch:
+                    return
+            elif current is None or current.generation != generation:
+                return
+            elif epoch != self._epoch and self._invalidated_since(epoch, messages):
+                return
+            if size > self.max_bytes:
+                if current is not None:
+                    self._remove(conversation_id)
+                return
+            if current is not None:
+                self._remove(conversation_id)
+            self._generation += 1
+            self._entries[conversation_id] = _Entry(list(messages), size, self._generation)
+            self._bytes += size
+            for m in messages:
+                self._owner[m["id"]] = conversation_id
+            while self._bytes > self.max_bytes and self._entries:
+                self._remove(next(iter(self._entries)))
+    # ---------- invalidation ----------
+    def truncate_from_message(self, message_id: int):
+        """Drop the cached copy of message_id and everything after it; the next read re-fetches them."""
+        with self._lock:
+            cid = self._owner.get(message_id)
+            if cid is None:
+                self._note_uncached(message_id)
+                return
+            entry = self._entries[cid]
+            keep = [m for m in entry.messages if m["id"] < message_id]
+            self._replace(cid, entry, keep)
+    def discard_messages(self, message_ids: Iterable[int]):
+        with self._lock:
+            by_conversation: Dict[str, set] = {}
+            for mid in message_ids:
+                cid = self._owner.get(mid)
+                if cid is None:
+                    self._note_uncached(mid)
+                else:
+                    by_conversation.setdefault(cid, set()).add(mid)
+            for cid, ids in by_conversation.items():
+                entry = self._entries[cid]
+                keep = [m for m in entry.messages if m["id"] not in ids]
+                self._replace(cid, entry, keep)
+    def evict(self, conversation_id: str):
+        with self._lock:
+            self._epoch += 1
+            if conversation_id in self._entries:
+                self._remove(conversation_id)
+    def clear(self):
+        with self._lock:
+            self._epoch += 1
+            self._entries.clear()
+            self._owner.clear()
+            self._recent.clear()
+            self._recent_floor = self._epoch
+            self._bytes = 0
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "max_bytes": self.max_bytes,
+                "bytes": self._bytes,
+                "conversations": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            }
+    # ---------- internals (caller holds self._lock) ----------
+    def _note_uncached(self, message_id: int):
+        self._epoch += 1
+        self._recent[message_id] = self._epoch
+        self._recent.move_to_end(message_id)
+        while len(self._recent) > _RECENT_INVALIDATIONS:
+            _, forgotten = self._recent.popitem(last=False)
+            self._recent_floor = max(self._recent_floor, forgotten)
+    def _invalidated_since(self, epoch: int, messages: List[Dict[str, Any]]) -> bool:
+        """Whether any of messages was updated/deleted after the snapshot that produced them was taken."""
+        if epoch < self._recent_floor:
+            return True
+        recent = self._recent
+        return any(recent.get(m["id"], 0) > epoch for m in messages)
+    def _remove(self, conversation_id: str):
+        entry = self._entries.pop(conversation_id)
+        self._bytes -= entry.size
+        for m in entry.messages:
+            self._owner.pop(m["id"], None)
+    def _replace(self, conversation_id: str, entry: _Entry, keep: List[Dict[str, Any]]):
+        for m in entry.messages:
+            self._owner.pop(m["id"], None)
+        self._bytes -= entry.size
+        self._generation += 1
+        entry.messages = keep
+        entry.size = sum(_message_size(m) for m in keep)
+        entry.generation = self._generation
+        self._bytes += entry.size
+        for m in keep:
+            self._owner[m["id"]] = conversation_id
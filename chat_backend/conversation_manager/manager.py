@@ -1,47 +1,26 @@
 import uuid
+import zlib
 import pymysql
+from pymysql.constants.ER import NO_REFERENCED_ROW_2 as ER_NO_REFERENCED_ROW_2
 from threading import Lock
+from contextlib import ExitStack
 from datetime import datetime
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Tuple
 from db import get_conn
+from config import Config
+from .history_cache import HistoryCache
 class ConversationManager:
-    def __init__(self):
-        self.lock = Lock()
-        self._ensure_tables()
+    def __init__(self, lock_stripes: Optional[int] = None):
+        # Striped locks: operations on the same conversation stay serialized (message order),
+        # while unrelated conversations hash to different stripes and proceed in parallel.
+        stripes = max(1, int(lock_stripes or Config.CONVERSATION_LOCK_STRIPES))
+        self._locks = [Lock() for _ in range(stripes)]
+        self.history_cache = HistoryCache(Config.HISTORY_CACHE_MAX_BYTES)
+        # No DDL here: tables and indexes are created by schema_migrations.py at deploy time.
     def _get_conn(self):
         return get_conn()
-    def _ensure_tables(self):
-        """
-        Ensure tables exist with latest schema:
-        - conversations: +status, +updated_at, +project_id, +name, +assistance_role, +model
-        - messages: MEDIUMTEXT content, +updated_at
-        """
-        with self._get_conn() as conn:
-            with conn.cursor() as cursor:
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS conversations (
-                        id VARCHAR(64) PRIMARY KEY,
-                        system_prompt MEDIUMTEXT,
-                        status TINYINT NOT NULL DEFAULT 0,
-                        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                        project_id INT NOT NULL DEFAULT 0,
-                        name VARCHAR(32) DEFAULT NULL,
-                        assistance_role VARCHAR(16) DEFAULT NULL,
-                        model VARCHAR(64) DEFAULT NULL
-                    )
-                """)
-                cursor.execute("""
-                    CREATE TABLE IF NOT EXISTS messages (
-                        id BIGINT PRIMARY KEY AUTO_INCREMENT,
-                        conversation_id VARCHAR(64),
-                        role VARCHAR(32),
-                        content MEDIUMTEXT,
-                        created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-                        updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
-                        FOREIGN KEY (conversation_id) REFERENCES conversations(id) ON DELETE CASCADE
-                    )
-                """)
+    def _lock_for(self, conversation_id: str) -> Lock:
+        return self._locks[zlib.crc32(conversation_id.encode("utf-8")) % len(self._locks)]
     # ---------- Conversations ----------
     def create_conversation(
         self,
@@ -58,33 +37,33 @@ class ConversationManager:
         """
         conversation_id = str(uuid.uuid4())
         now = datetime.now()
-        with self.lock:
-            with self._get_conn() as conn:
-                with conn.cursor() as cursor:
+        # A fresh uuid cannot be touched by any other caller yet, so no lock is needed.
+        with self._get_conn() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    """
+                    INSERT INTO conversations
+                        (id, system_prompt, status, created_at, updated_at, project_id, name, model, assistance_role)
+                    VALUES
+                        (%s, %s, %s, %s, %s, %s, %s, %s, %s)
+                    """,
+                    (
+                        conversation_id,
+                        system_prompt,
+                        status,
+                        now,
+                        now,
+                        project_id,
+                        name,
+                        model,
+                        assistance_role
+                    )
+                )
+                if system_prompt:
                     cursor.execute(
-                        """
-                        INSERT INTO conversations
-                            (id, system_prompt, status, created_at, updated_at, project_id, name, model, assistance_role)
-                        VALUES
-                            (%s, %s, %s, %s, %s, %s, %s, %s, %s)
-                        """,
-                        (
-                            conversation_id,
-                            system_prompt,
-                            status,
-                            now,
-                            now,
-                            project_id,
-                            name,
-                            model,
-                            assistance_role
-                        )
+                        "INSERT INTO messages (conversation_id, role, content, created_at) VALUES (%s, %s, %s, %s)",
+                        (conversation_id, "system", system_prompt, now)
                     )
-                    if system_prompt:
-                        cursor.execute(
-                            "INSERT INTO messages (conversation_id, role, content, created_at) VALUES (%s, %s, %s, %s)",
-                            (conversation_id, "system", system_prompt, now)
-                        )
         return conversation_id
     def update_conversation(
         self,
@@ -134,10 +113,17 @@ class ConversationManager:
                 if not row:
                     raise KeyError("Conversation not found")
                 return row
-    def get_conversations(self, project_id: Optional[int] = None, status: Optional[int] = None) -> List[Dict[str, Any]]:
+    # Listing columns without the MEDIUMTEXT system_prompt (fetch it via get_conversation_by_id)
+    LIGHT_COLUMNS = "id, status, created_at, updated_at, project_id, name, model, assistance_role"
+    def get_conversations(
+        self,
+        project_id: Optional[int] = None,
+        status: Optional[int] = None,
+        light: bool = False
+    ) -> List[Dict[str, Any]]:
         """
         List conversations optionally filtered by project_id and/or status.
-        Ordered by updated_at DESC for recency.
+        Ordered by updated_at DESC for recency. light=True omits system_prompt.
         """
         conds: List[str] = []
         vals: List[Any] = []
@@ -148,9 +134,9 @@ class ConversationManager:
             conds.append("status=%s")
             vals.append(status)
         where_clause = f"WHERE {' AND '.join(conds)}" if conds else ""
+        columns = self.LIGHT_COLUMNS if light else f"{self.LIGHT_COLUMNS}, system_prompt"
         sql = f"""
-            SELECT id, system_prompt, status, created_at, updated_at,
-                   project_id, name, model, assistance_role
+            SELECT {columns}
             FROM conversations
             {where_clause}
             ORDER BY updated_at DESC, created_at DESC
@@ -159,16 +145,59 @@ class ConversationManager:
             with conn.cursor(pymysql.cursors.DictCursor) as cursor:
                 cursor.execute(sql, tuple(vals))
                 return list(cursor.fetchall())
+    def get_conversations_page(
+        self,
+        project_id: Optional[int] = None,
+        status: Optional[int] = None,
+        limit: int = 50,
+        before: Optional[Tuple[datetime, str]] = None
+    ) -> Dict[str, Any]:
+        """
+        Keyset page of lightweight conversation rows ordered by (updated_at DESC, id DESC),
+        served by idx_project_status_updated (project_id, status, updated_at).
+        Relies on updated_at being NOT NULL (schema migration 5); a NULL would be skipped by the
+        keyset predicate and could not form a cursor.
+        before: (updated_at, id) of the last row of the previous page.
+        Returns {"conversations": [...], "has_more": bool, "next_cursor": (updated_at, id) | None}.
+        """
+        conds: List[str] = []
+        vals: List[Any] = []
+        if project_id is not None:
+            conds.append("project_id=%s")
+            vals.append(project_id)
+        if status is not None:
+            conds.append("status=%s")
+            vals.append(status)
+        if before is not None:
+            conds.append("(updated_at<%s OR (updated_at=%s AND id<%s))")
+            vals.extend([before[0], before[0], before[1]])
+        where_clause = f"WHERE {' AND '.join(conds)}" if conds else ""
+        vals.append(limit + 1)
+        sql = f"""
+            SELECT {self.LIGHT_COLUMNS}
+            FROM conversations
+            {where_clause}
+            ORDER BY updated_at DESC, id DESC
+            LIMIT %s
+        """
+        with self._get_conn() as conn:
+            with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+                cursor.execute(sql, tuple(vals))
+                rows = list(cursor.fetchall())
+        has_more = len(rows) > limit
+        rows = rows[:limit]
+        next_cursor = (rows[-1]["updated_at"], rows[-1]["id"]) if has_more else None
+        return {"conversations": rows, "has_more": has_more, "next_cursor": next_cursor}
     def get_all_conversations_grouped_by_project(self) -> Dict[str, List[Dict[str, Any]]]:
         """
         Backward-compatible grouped listing with more fields (status, updated_at).
+        Built from the lightweight columns: system_prompt is not included.
         """
         with self._get_conn() as conn:
             with conn.cursor(pymysql.cursors.DictCursor) as cursor:
                 cursor.execute("""
                     SELECT 
                         c.id AS conversation_id,
-                        c.system_prompt,
                         c.status,
                         c.created_at,
                         c.updated_at,
@@ -191,14 +220,36 @@ class ConversationManager:
         with self._get_conn() as conn:
             with conn.cursor() as cursor:
                 cursor.execute("DELETE FROM conversations WHERE id=%s", (conversation_id,))
-                return cursor.rowcount > 0
+                deleted = cursor.rowcount > 0
+        self.history_cache.evict(conversation_id)
+        return deleted
     def clear(self):
-        with self.lock:
+        # Takes every stripe (in a fixed order) so no conversation-scoped operation interleaves.
+        with ExitStack() as stack:
+            for lock in self._locks:
+                stack.enter_context(lock)
             with self._get_conn() as conn:
                 with conn.cursor() as cursor:
                     cursor.execute("DELETE FROM messages")
                     cursor.execute("DELETE FROM conversations")
+            self.history_cache.clear()
     # ---------- Messages ----------
+    @staticmethod
+    def _insert_message(cursor, conversation_id: str, role: str, content: str, created_at: datetime) -> int:
+        """
+        INSERT a message row and return its id. The messages.conversation_id foreign key
+        replaces a separate existence SELECT: a missing conversation surfaces as KeyError.
+        """
+        try:
+            cursor.execute(
+                "INSERT INTO messages (conversation_id, role, content, created_at) VALUES (%s, %s, %s, %s)",
+                (conversation_id, role, content, created_at)
+            )
+        except pymysql.err.IntegrityError as e:
+            if e.args and e.args[0] == ER_NO_REFERENCED_ROW_2:
+                raise KeyError("Conversation not found")
+            raise
+        return cursor.lastrowid
     def append_message(self, conversation_id: str, role: str, content: str, created_at: Optional[datetime] = None) -> int:
         """
         Insert a message and bump the parent conversation's updated_at to now.
@@ -206,17 +257,10 @@ class ConversationManager:
         """
         created_at = created_at or datetime.now()
         now = datetime.now()
-        with self.lock:
+        with self._lock_for(conversation_id):
             with self._get_conn() as conn:
                 with conn.cursor() as cursor:
-                    cursor.execute("SELECT 1 FROM conversations WHERE id=%s", (conversation_id,))
-                    if cursor.fetchone() is None:
-                        raise KeyError("Conversation not found")
-                    cursor.execute(
-                        "INSERT INTO messages (conversation_id, role, content, created_at) VALUES (%s, %s, %s, %s)",
-                        (conversation_id, role, content, created_at)
-                    )
-                    msg_id = cursor.lastrowid
+                    msg_id = self._insert_message(cursor, conversation_id, role, content, created_at)
                     # bump conversation updated_at
                     cursor.execute("UPDATE conversations SET updated_at=%s WHERE id=%s", (now, conversation_id))
                     return msg_id
@@ -227,31 +271,129 @@ class ConversationManager:
         """
         created_at = created_at or datetime.now()
         now = datetime.now()
-        with self.lock:
+        with self._lock_for(conversation_id):
             with self._get_conn() as conn:
                 with conn.cursor() as cursor:
-                    cursor.execute("SELECT 1 FROM conversations WHERE id=%s", (conversation_id,))
-                    if cursor.fetchone() is None:
-                        raise KeyError("Conversation not found")
-                    cursor.execute(
-                        "INSERT INTO messages (conversation_id, role, content, created_at) VALUES (%s, %s, %s, %s)",
-                        (conversation_id, "assistant", "", created_at)
-                    )
-                    msg_id = cursor.lastrowid
+                    msg_id = self._insert_message(cursor, conversation_id, "assistant", "", created_at)
                     cursor.execute("UPDATE conversations SET updated_at=%s WHERE id=%s", (now, conversation_id))
                     return msg_id
+    def append_message_with_placeholder(
+        self,
+        conversation_id: str,
+        role: str,
+        content: str,
+        placeholder_created_at: Optional[datetime] = None,
+        store_user_message: bool = True
+    ) -> Tuple[Optional[int], int]:
+        """
+        Append the user's message and reserve the assistant placeholder in one transaction
+        on one connection (INSERT, INSERT, UPDATE updated_at). With store_user_message=False
+        only the placeholder is inserted (ignored user messages).
+        Returns (user_message_id or None, assistant_message_id).
+        """
+        now = datetime.now()
+        placeholder_created_at = placeholder_created_at or now
+        with self._lock_for(conversation_id):
+            with self._get_conn() as conn:
+                conn.begin()
+                try:
+                    with conn.cursor() as cursor:
+                        user_msg_id = None
+                        if store_user_message:
+                            user_msg_id = self._insert_message(cursor, conversation_id, role, content, now)
+                        assistant_msg_id = self._insert_message(
+                            cursor, conversation_id, "assistant", "", placeholder_created_at
+                        )
+                        cursor.execute("UPDATE conversations SET updated_at=%s WHERE id=%s", (now, conversation_id))
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+        return user_msg_id, assistant_msg_id
     def get_messages(self, conversation_id: str) -> List[Dict[str, Any]]:
-        with self.lock:
+        """
+        Full message history of a conversation, ordered by id.
+        Served from history_cache when possible: on a hit only messages newer than the
+        last cached id are read from the database.
+        """
+        with self._lock_for(conversation_id):
+            cached, last_id, token = self.history_cache.snapshot(conversation_id)
             with self._get_conn() as conn:
                 with conn.cursor(pymysql.cursors.DictCursor) as cursor:
                     cursor.execute("SELECT 1 FROM conversations WHERE id=%s", (conversation_id,))
                     if cursor.fetchone() is None:
+                        self.history_cache.evict(conversation_id)
                         raise KeyError("Conversation not found")
-                    cursor.execute(
-                        "SELECT id, role, content, created_at, updated_at FROM messages WHERE conversation_id=%s ORDER BY id ASC",
-                        (conversation_id,)
-                    )
-                    return list(cursor.fetchall())
+                    if cached is None:
+                        cursor.execute(
+                            "SELECT id, role, content, created_at, updated_at FROM messages WHERE conversation_id=%s ORDER BY id ASC",
+                            (conversation_id,)
+                        )
+                    else:
+                        cursor.execute(
+                            "SELECT id, role, content, created_at, updated_at FROM messages WHERE conversation_id=%s AND id>%s ORDER BY id ASC",
+                            (conversation_id, last_id)
+                        )
+                    rows = list(cursor.fetchall())
+            messages = rows if cached is None else cached + rows
+            if cached is None or rows:
+                self.history_cache.put(conversation_id, messages, token)
+            # callers get their own dicts so they cannot mutate cached state
+            return [dict(m) for m in messages]
+    def get_messages_page(
+        self,
+        conversation_id: str,
+        before_id: Optional[int] = None,
+        after_id: Optional[int] = None,
+        limit: Optional[int] = 50,
+        summary: bool = False,
+        preview_chars: int = 200
+    ) -> Dict[str, Any]:
+        """
+        Keyset page over a conversation's messages (served by idx_conversation_id_id).
+        - after_id: the oldest `limit` messages with id > after_id
+        - before_id (or neither cursor): the newest `limit` messages with id < before_id
+        - limit=None: no page size, every matching message
+        Results are always returned in ascending id order. With summary=True the
+        content column is replaced by its length and a short preview.
+        Returns {"messages": [...], "has_more": bool}.
+        """
+        if summary:
+            columns = "id, role, CHAR_LENGTH(content) AS length, LEFT(content, %s) AS preview, created_at, updated_at"
+            params: List[Any] = [preview_chars]
+        else:
+            columns = "id, role, content, created_at, updated_at"
+            params = []
+        params.append(conversation_id)
+        conds = ""
+        if after_id is not None:
+            conds += " AND id>%s"
+            params.append(after_id)
+        if before_id is not None:
+            conds += " AND id<%s"
+            params.append(before_id)
+        # newest-first page unless paging forward from after_id; reversed below
+        order = "DESC" if limit is not None and after_id is None else "ASC"
+        limit_sql = ""
+        if limit is not None:
+            limit_sql = "LIMIT %s"
+            params.append(limit + 1)
+        with self._get_conn() as conn:
+            with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+                cursor.execute("SELECT 1 FROM conversations WHERE id=%s", (conversation_id,))
+                if cursor.fetchone() is None:
+                    raise KeyError("Conversation not found")
+                cursor.execute(
+                    f"SELECT {columns} FROM messages WHERE conversation_id=%s{conds} ORDER BY id {order} {limit_sql}",
+                    tuple(params)
+                )
+                rows = list(cursor.fetchall())
+        has_more = limit is not None and len(rows) > limit
+        if has_more:
+            rows = rows[:limit]
+        if order == "DESC":
+            rows.reverse()
+        return {"messages": rows, "has_more": has_more}
     def delete_messages(self, message_ids: List[int]) -> int:
         """Delete one or more messages by ids."""
         if not message_ids:
@@ -260,7 +402,9 @@ class ConversationManager:
             with conn.cursor() as cursor:
                 placeholders = ','.join(['%s'] * len(message_ids))
                 cursor.execute(f"DELETE FROM messages WHERE id IN ({placeholders})", tuple(message_ids))
-                return cursor.rowcount
+                count = cursor.rowcount
+        self.history_cache.discard_messages(message_ids)
+        return count
     def update_message_content_and_time(self, message_id: int, content: str, created_at: Optional[datetime] = None) -> bool:
         """
         Update specific message content and optionally its created_at.
@@ -268,13 +412,32 @@ class ConversationManager:
         """
         if created_at is None:
             created_at = datetime.now()
-        with self.lock:
-            with self._get_conn() as conn:
-                with conn.cursor() as cursor:
-                    cursor.execute(
-                        "UPDATE messages SET content=%s, created_at=%s WHERE id=%s",
-                        (content, created_at, message_id)
-                    )
-                    return cursor.rowcount > 0
+        # Single-row UPDATE keyed by primary key: atomic in MySQL, no in-process lock required.
+        with self._get_conn() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "UPDATE messages SET content=%s, created_at=%s WHERE id=%s",
+                    (content, created_at, message_id)
+                )
+                updated = cursor.rowcount > 0
+        self.history_cache.truncate_from_message(message_id)
+        return updated
+    def append_message_content(self, message_id: int, delta: str, offset: int) -> bool:
+        """
+        Append delta to a message's content, used to checkpoint a streaming reply.
+        Only the new text is sent. The UPDATE applies only if the stored content is still exactly
+        offset characters long, so a retried or out-of-order checkpoint can never duplicate text.
+        Returns False when nothing was applied (length mismatch or message gone).
+        """
+        with self._get_conn() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "UPDATE messages SET content=CONCAT(COALESCE(content, ''), %s) "
+                    "WHERE id=%s AND CHAR_LENGTH(COALESCE(content, ''))=%s",
+                    (delta, message_id, offset)
+                )
+                updated = cursor.rowcount > 0
+        self.history_cache.truncate_from_message(message_id)
+        return updated
 # Global instance (backward compatible import)
 conversation_manager = ConversationManager()
\ No newline at end of file
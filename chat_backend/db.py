@@ -1,13 +1,232 @@
+import time
+import asyncio
+import logging
+import threading
+import functools
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, TypeVar
+
 import pymysql
+from pymysql.constants import SERVER_STATUS
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+CONNECT_KWARGS: Dict[str, Any] = dict(
+    host="localhost",
+    port=3306,
+    user="sa",
+    password="dm257758",
+    database="plan_manager",
+    charset="utf8mb4",
+    autocommit=True,
+    connect_timeout=5
+)
+
+
+class PoolTimeout(Exception):
+    """在 DB_POOL_TIMEOUT 秒内未能从连接池获取到连接"""
+
+
+class ConnectionPool:
+    """
+    线程安全的 pymysql 连接池：
+    - 总连接数不超过 max_size，超出时等待，最长 timeout 秒
+    - 连接存活超过 recycle 秒时关闭重建（避开 MySQL wait_timeout）
+    - 空闲超过 ping_interval 秒的连接在借出前 ping 一次，失败则重建
+    - 归还时回滚未结束的事务，出现连接级异常的连接直接丢弃
+    """
+    def __init__(self, connect_kwargs: Dict[str, Any], max_size: int = 20, recycle: float = 3600,
+                 ping_interval: float = 30, timeout: float = 10):
+        self.connect_kwargs = connect_kwargs
+        self.max_size = max(1, int(max_size))
+        self.recycle = recycle
+        self.ping_interval = ping_interval
+        self.timeout = timeout
+        self._idle: deque = deque()
+        self._size = 0
+        self._cond = threading.Condition()
+        # 指标
+        self._acquired = 0
+        self._created = 0
+        self._recycled = 0
+        self._discarded = 0
+        self._timeouts = 0
+        self._waited = 0
+        self._wait_total = 0.0
+        self._wait_max = 0.0
+
+    def _connect(self):
+        conn = pymysql.connect(**self.connect_kwargs)
+        now = time.monotonic()
+        conn._pool_created_at = now
+        conn._pool_last_used = now
+        with self._cond:
+            self._created += 1
+        return conn
+
+    @staticmethod
+    def _close_quietly(conn):
+        try:
+            conn.close()
+        except Exception:
+            pass
+
+    def _forget(self, conn):
+        """关闭连接并释放其占用的名额"""
+        self._close_quietly(conn)
+        with self._cond:
+            self._size -= 1
+            self._discarded += 1
+            self._cond.notify()
+
+    def _validate(self, conn):
+        """借出前检查：超龄则回收重建，长时间空闲则 ping"""
+        now = time.monotonic()
+        if self.recycle and now - conn._pool_created_at > self.recycle:
+            self._close_quietly(conn)
+            with self._cond:
+                self._recycled += 1
+            return self._connect()
+        if self.ping_interval is not None and now - conn._pool_last_used > self.ping_interval:
+            try:
+                conn.ping(reconnect=False)
+            except Exception:
+                logger.info("Pooled MySQL connection failed health check, reconnecting")
+                self._close_quietly(conn)
+                with self._cond:
+                    self._recycled += 1
+                return self._connect()
+        return conn
+
+    def acquire(self):
+        start = time.monotonic()
+        deadline = start + self.timeout
+        conn = None
+        with self._cond:
+            while True:
+                if self._idle:
+                    conn = self._idle.pop()
+                    break
+                if self._size < self.max_size:
+                    self._size += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._timeouts += 1
+                    raise PoolTimeout(
+                        f"Timed out after {self.timeout}s waiting for a DB connection "
+                        f"(pool size {self.max_size})"
+                    )
+                self._cond.wait(remaining)
+            waited = time.monotonic() - start
+            self._acquired += 1
+            if waited > 0.001:
+                self._waited += 1
+            self._wait_total += waited
+            self._wait_max = max(self._wait_max, waited)
+        try:
+            return self._connect() if conn is None else self._validate(conn)
+        except Exception:
+            with self._cond:
+                self._size -= 1
+                self._cond.notify()
+            raise
+
+    def release(self, conn, discard: bool = False):
+        if not discard and not conn.open:
+            discard = True
+        if not discard and conn.server_status & SERVER_STATUS.SERVER_STATUS_IN_TRANS:
+            # 调用方 begin() 后未 commit/rollback（例如中途抛出 HTTPException）
+            try:
+                conn.rollback()
+            except Exception:
+                discard = True
+        if discard:
+            self._forget(conn)
+            return
+        conn._pool_last_used = time.monotonic()
+        with self._cond:
+            self._idle.append(conn)
+            self._cond.notify()
 
+    def close(self):
+        """关闭全部空闲连接；借出中的连接在归还时照常处理"""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._size -= len(idle)
+            self._cond.notify_all()
+        for conn in idle:
+            self._close_quietly(conn)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._cond:
+            idle = len(self._idle)
+            return {
+                "max_size": self.max_size,
+                "size": self._size,
+                "idle": idle,
+                "in_use": self._size - idle,
+                "acquired": self._acquired,
+                "created": self._created,
+                "recycled": self._recycled,
+                "discarded": self._discarded,
+                "timeouts": self._timeouts,
+                "waited": self._waited,
+                "wait_ms_total": round(self._wait_total * 1000, 2),
+                "wait_ms_avg": round(self._wait_total * 1000 / self._acquired, 3) if self._acquired else 0.0,
+                "wait_ms_max": round(self._wait_max * 1000, 2),
+            }
+
+
+pool = ConnectionPool(
+    CONNECT_KWARGS,
+    max_size=Config.DB_POOL_SIZE,
+    recycle=Config.DB_POOL_RECYCLE,
+    ping_interval=Config.DB_POOL_PING_INTERVAL,
+    timeout=Config.DB_POOL_TIMEOUT,
+)
+
+
+@contextmanager
 def get_conn():
-    return pymysql.connect(
-        host="localhost",
-        port=3306,
-        user="sa",
-        password="dm257758",
-        database="plan_manager",
-        charset="utf8mb4",
-        autocommit=True,
-        connect_timeout=5
-    )
+    """
+    从连接池借出一个连接，用法与原来的 pymysql.connect() 相同：
+        with get_conn() as conn:
+            ...
+    退出时连接归还池中而不是关闭。
+    """
+    conn = pool.acquire()
+    discard = False
+    try:
+        yield conn
+    except (pymysql.err.OperationalError, pymysql.err.InterfaceError):
+        discard = True
+        raise
+    finally:
+        pool.release(conn, discard=discard)
+
+
+# 专用 DB 线程池：线程数与连接池大小一致，异步代码通过它执行阻塞查询，
+# 既不占用事件循环，也不会因线程多于连接而在 acquire() 上排队
+_db_executor = ThreadPoolExecutor(max_workers=pool.max_size, thread_name_prefix="db")
+
+
+async def run_in_db_executor(func: Callable[..., T], *args, **kwargs) -> T:
+    """在 DB 线程池中执行阻塞的数据库函数并等待结果"""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_db_executor, functools.partial(func, *args, **kwargs))
+
+
+def get_pool_stats() -> Dict[str, Any]:
+    return pool.stats()
+
+
+def close_pool():
+    _db_executor.shutdown(wait=False)
+    pool.close()
@@ -1,10 +1,13 @@
 import logging
+import threading
 from enum import Enum
+from typing import Dict, Optional, Tuple
 from config import Config
 
 # 各 LLM 客户端
 from poe_client import PoeClient
 from openai_client import OpenAIClient
+from services.project_upstream import resolve_upstream, upstream_allowed
 
 logger = logging.getLogger(__name__)
 
@@ -15,12 +18,88 @@ class LLMBackend(str, Enum):
 def get_llm_backend():
     return getattr(Config, "LLM_BACKEND", "poe").lower()
 
+
+class LLMClientRegistry:
+    """
+    LLM 客户端注册表：按 (backend, 凭据, base_url) 缓存客户端实例，请求之间复用。
+    - 客户端本身无状态，OpenAIClient 的连接池按 base_url 在 openai_client 中共享，复用实例不会重置连接池；
+    - 当前默认客户端以 (key, client, backend) 单个元组保存，reload() 一次赋值完成替换，
+      正在进行的请求继续使用旧实例，新请求拿到新实例。
+    """
+
+    def __init__(self):
+        self._clients: Dict[tuple, object] = {}
+        self._lock = threading.Lock()
+        self._current: Optional[Tuple[tuple, object, LLMBackend]] = None
+
+    @staticmethod
+    def _config_key() -> tuple:
+        backend = get_llm_backend()
+        if backend == LLMBackend.OPENAI:
+            return (LLMBackend.OPENAI, Config.OPENAI_API_KEY, Config.OPENAI_BASE_URL.rstrip("/"))
+        if backend != LLMBackend.POE:
+            logger.warning("Unknown LLM_BACKEND '%s', fallback to poe.", backend)
+        return (LLMBackend.POE, Config.POE_API_KEY, None)
+
+    def get(self, backend: LLMBackend, api_key: str, base_url: Optional[str] = None):
+        """取 (backend, api_key, base_url) 对应的客户端，不存在时创建"""
+        key = (backend, api_key, base_url.rstrip("/") if base_url else None)
+        client = self._clients.get(key)
+        if client is None:
+            with self._lock:
+                client = self._clients.get(key)
+                if client is None:
+                    if backend == LLMBackend.OPENAI:
+                        client = OpenAIClient(api_key, base_url)
+                    else:
+                        client = PoeClient(api_key)
+                    self._clients[key] = client
+        return client
+
+    def current(self) -> Tuple[object, LLMBackend]:
+        """按当前 Config 返回默认客户端；Config 变化时自动切换"""
+        current = self._current
+        key = self._config_key()
+        if current is None or current[0] != key:
+            current = self.reload()
+        return current[1], current[2]
+
+    def reload(self) -> Tuple[tuple, object, LLMBackend]:
+        """按当前 Config 重建默认客户端并原子替换"""
+        key = self._config_key()
+        client = self.get(*key)
+        current = (key, client, key[0])
+        self._current = current
+        return current
+
+    def clear(self):
+        """丢弃缓存的客户端（如凭据轮换后），下次请求时按 Config 重新创建"""
+        with self._lock:
+            self._clients = {}
+            self._current = None
+
+
+llm_clients = LLMClientRegistry()
+
+
 def get_llm_client():
-    backend = get_llm_backend()
-    if backend == LLMBackend.POE:
-        return PoeClient(Config.POE_API_KEY), LLMBackend.POE
-    elif backend == LLMBackend.OPENAI:
-        return OpenAIClient(Config.OPENAI_API_KEY), LLMBackend.OPENAI
-    else:
-        logger.warning("Unknown LLM_BACKEND '%s', fallback to poe.", backend)
-        return PoeClient(Config.POE_API_KEY), LLMBackend.POE
\ No newline at end of file
+    return llm_clients.current()
+
+
+async def resolve_llm_client(conversation_id: Optional[str] = None, project_id: Optional[int] = None):
+    """
+    按会话（或项目）所属项目的 projects.llm_url 选择上游，返回 (client, backend)。
+    每个不同的 base_url 各有一个客户端和连接池（openai_client 中按 base_url 共享）以及独立的并发上限，
+    某个项目的大流量不会占满其他项目的上游。仅 openai 后端按项目路由（PROJECT_UPSTREAM_ROUTING=1）；
+    项目未配置地址或地址不在 UPSTREAM_ALLOWLIST 中时使用默认客户端。
+    """
+    client, backend = llm_clients.current()
+    if backend != LLMBackend.OPENAI:
+        return client, backend
+    upstream = await resolve_upstream(conversation_id, project_id)
+    if upstream.base_url is None or upstream.base_url == client.base_url:
+        return client, backend
+    if not upstream_allowed(upstream.base_url):
+        # 全局 API key 只发往白名单中的上游
+        return client, backend
+    return llm_clients.get(LLMBackend.OPENAI, Config.OPENAI_API_KEY, upstream.base_url), backend
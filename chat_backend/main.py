@@ -1,6 +1,8 @@
 import sys
 import os
+import asyncio
 import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
@@ -12,6 +14,10 @@ if BASE_DIR not in sys.path:
 # === 本地模块导入 ===
 from config import Config
 from logger import request_logger
+from db import close_pool
+from openai_client import close_http_sessions
+from services.chat_stream import run_reaper
+from services.admission import AdmissionRejected
 from routes_misc import register_misc_routes
 from routes_project import router as project_router
 from routes.chat import register_chat_routes 
@@ -32,12 +38,23 @@ from routes.upload_file import router as upload_file_router
 # === 新增认证路由 ===
 from routes.auth import router as auth_router
 
+# === 应用生命周期：运行流式会话清理任务，关闭时释放数据库与 HTTP 连接池 ===
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    reaper = asyncio.create_task(run_reaper())
+    yield
+    reaper.cancel()
+    await close_http_sessions()
+    close_pool()
+
 # === FastAPI App 初始化 ===
 app = FastAPI(
     title="OpenAI Compatible API Proxy to Poe & OpenAI",
     description="A proxy service that supports OpenAI-compatible API forwarding to Poe/OpenAI",
-    version="2.3.0"
+    version="2.3.0",
+    lifespan=lifespan
 )
+import math
 import traceback
 from fastapi import Request
 from fastapi.responses import JSONResponse
@@ -51,6 +68,15 @@ async def global_exception_handler(request: Request, exc: Exception):
         content={"detail": str(exc)},
     )
 
+@app.exception_handler(AdmissionRejected)
+async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+    # 上游准入排队超时：请求未发往上游，客户端稍后重试
+    return JSONResponse(
+        status_code=429,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))},
+    )
+
 # === CORS 设置 ===
 app.add_middleware(
     CORSMiddleware,
@@ -1,14 +1,140 @@
+import asyncio
 import aiohttp
-from typing import AsyncGenerator, List
+from contextlib import asynccontextmanager
+from typing import Any, AsyncGenerator, Dict, List, Optional
 import logging
 from config import Config
+from services.admission import AdmissionRejected, admission
+from services.sse_decoder import SSEDecoder, delta_content, json_loads
 
 logger = logging.getLogger(__name__)
 
+# 进程内按 base_url 复用的 ClientSession：连接池、keep-alive 连接与 DNS 缓存跨请求共享
+_http_sessions: Dict[str, aiohttp.ClientSession] = {}
+
+
+def get_http_session(base_url: str) -> aiohttp.ClientSession:
+    """
+    返回 base_url 对应的共享 ClientSession，首次使用时在当前事件循环上创建。
+    创建过程没有 await，单事件循环内不存在并发创建的竞争。
+    """
+    session = _http_sessions.get(base_url)
+    if session is None or session.closed:
+        connector = aiohttp.TCPConnector(
+            limit=Config.OPENAI_HTTP_POOL_LIMIT,
+            limit_per_host=Config.OPENAI_HTTP_POOL_LIMIT_PER_HOST,
+            keepalive_timeout=Config.OPENAI_HTTP_KEEPALIVE_TIMEOUT,
+            ttl_dns_cache=Config.OPENAI_HTTP_DNS_TTL,
+            use_dns_cache=True,
+        )
+        session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=Config.OPENAI_HTTP_TIMEOUT or None),
+        )
+        _http_sessions[base_url] = session
+    return session
+
+
+class UpstreamLimit:
+    """
+    单个上游（base_url）的并发上限：同时进行中的请求（流式请求持续到流结束）不超过 max_concurrency，
+    超出的请求在此排队；max_concurrency 为 0 时不限制，只做计数。
+    在全局准入名额之前获取：一个上游饱和时，排队的请求不占用全局名额，不影响其他项目的上游。
+    排队超过 max_wait 秒抛出 AdmissionRejected（路由返回 429）。
+    """
+
+    def __init__(self, max_concurrency: int = 0):
+        self.max_concurrency = max(0, int(max_concurrency))
+        self._semaphore = asyncio.Semaphore(self.max_concurrency) if self.max_concurrency else None
+        self.in_flight = 0
+        self.waiting = 0
+        self.total = 0
+        self.rejected = 0
+
+    @asynccontextmanager
+    async def acquire(self, max_wait: float = 0):
+        if self._semaphore is not None:
+            self.waiting += 1
+            # 不用 wait_for：取得名额与外部取消同时发生时它会吞掉取消；这里放弃等待后若名额仍被取得则归还
+            pending = asyncio.ensure_future(self._semaphore.acquire())
+            try:
+                done, _ = await asyncio.wait({pending}, timeout=max_wait or None)
+            except BaseException:
+                self._abandon(pending)
+                raise
+            finally:
+                self.waiting -= 1
+            if not done:
+                self._abandon(pending)
+                self.rejected += 1
+                raise AdmissionRejected(
+                    f"Upstream busy: waited {max_wait:g}s for a connection slot", retry_after=max_wait
+                )
+        self.in_flight += 1
+        self.total += 1
+        try:
+            yield
+        finally:
+            self.in_flight -= 1
+            if self._semaphore is not None:
+                self._semaphore.release()
+
+    def _abandon(self, pending: asyncio.Future):
+        pending.cancel()
+        pending.add_done_callback(
+            lambda f: self._semaphore.release() if not f.cancelled() and f.exception() is None else None
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "total": self.total,
+            "rejected": self.rejected,
+        }
+
+
+_upstream_limits: Dict[str, UpstreamLimit] = {}
+
+
+def get_upstream_limit(base_url: str) -> UpstreamLimit:
+    limit = _upstream_limits.get(base_url)
+    if limit is None:
+        limit = _upstream_limits[base_url] = UpstreamLimit(Config.OPENAI_UPSTREAM_MAX_CONCURRENCY)
+    return limit
+
+
+def upstream_stats() -> Dict[str, Dict[str, Any]]:
+    """各上游的并发与连接池状态（/health 使用）"""
+    return {
+        base_url: dict(limit.stats(), pooled=base_url in _http_sessions)
+        for base_url, limit in _upstream_limits.items()
+    }
+
+
+async def close_http_sessions():
+    """应用关闭时调用（main.py lifespan）"""
+    sessions = list(_http_sessions.values())
+    _http_sessions.clear()
+    for session in sessions:
+        await session.close()
+
+
+def normalize_base_url(url: Optional[str]) -> Optional[str]:
+    """projects.llm_url 存的是完整的 .../chat/completions 地址，统一成 base_url 形式"""
+    if not url or not url.strip():
+        return None
+    url = url.strip().rstrip("/")
+    if url.endswith("/chat/completions"):
+        url = url[:-len("/chat/completions")]
+    return url
+
+
 class OpenAIClient:
     def __init__(self, api_key: str, base_url: str = None):
         self.api_key = api_key
-        self.base_url = (base_url or Config.OPENAI_BASE_URL).rstrip("/")
+        self.base_url = normalize_base_url(base_url) or Config.OPENAI_BASE_URL.rstrip("/")
 
     async def get_response_stream(self, messages: List[dict], model: str) -> AsyncGenerator[str, None]:
         url = f"{self.base_url}/chat/completions"
@@ -21,31 +147,36 @@ class OpenAIClient:
             "messages": messages,
             "stream": True
         }
-        async with aiohttp.ClientSession() as session:
+        session = get_http_session(self.base_url)
+        # 先取上游名额再取全局名额：在饱和的上游前排队时不占用全局名额
+        async with get_upstream_limit(self.base_url).acquire(admission.max_wait), admission.slot(model):
             async with session.post(url, headers=headers, json=payload) as resp:
                 if resp.status != 200:
                     text = await resp.text()
                     logger.error(f"OpenAI API error: {resp.status} {text}")
                     yield f"Error: {text}"
                     return
-                async for line in resp.content:
-                    if not line:
-                        continue
-                    try:
-                        l = line.decode().strip()
-                        if l.startswith("data: "):
-                            data = l[6:]
-                            if data == "[DONE]":
-                                break
-                            import json
-                            payload = json.loads(data)
-                            if "choices" in payload:
-                                delta = payload["choices"][0].get("delta", {})
-                                if "content" in delta:
-                                    yield delta["content"]
-                    except Exception as e:
-                        logger.error(f"Parse stream error: {e}")
-                        yield f"[Stream Error: {e}]"
+                # 按读到的原始字节块增量解码，事件跨多次读取、多行 data、超长行都能正确处理
+                decoder = SSEDecoder()
+                eof = False
+                while not eof:
+                    raw = await resp.content.readany()
+                    if raw:
+                        events = decoder.feed(raw)
+                    else:
+                        eof = True
+                        events = decoder.flush()
+                    for data in events:
+                        if data == b"[DONE]":
+                            return
+                        try:
+                            content = delta_content(json_loads(data))
+                        except ValueError as e:
+                            # 无法解析的事件只记日志，不混入回复内容
+                            logger.error(f"Parse stream error: {e}: {data[:200]!r}")
+                            continue
+                        if content:
+                            yield content
 
     async def get_response_complete(self, messages: List[dict], model: str) -> str:
         url = f"{self.base_url}/chat/completions"
@@ -57,7 +188,9 @@ class OpenAIClient:
             "model": model,
             "messages": messages,
         }
-        async with aiohttp.ClientSession() as session:
+        session = get_http_session(self.base_url)
+        # 先取上游名额再取全局名额：在饱和的上游前排队时不占用全局名额
+        async with get_upstream_limit(self.base_url).acquire(admission.max_wait), admission.slot(model):
             async with session.post(url, headers=headers, json=payload) as resp:
                 if resp.status != 200:
                     text = await resp.text()
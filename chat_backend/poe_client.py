@@ -2,6 +2,7 @@ import asyncio
 import fastapi_poe as fp
 from typing import AsyncGenerator, List
 from config import Config
+from services.admission import admission
 import logging
 
 logger = logging.getLogger(__name__)
@@ -23,6 +24,17 @@ class PoeClient:
         return role_mapping.get(role.lower(), 'user')
     
     async def get_response_stream(self, messages: List[dict], model: str) -> AsyncGenerator[str, None]:
+        # 先取得上游准入名额再请求 Poe；排队超时的 AdmissionRejected 不转成 "Error: ..." 文本，由路由返回 429
+        async with admission.slot(model):
+            stream = self._poe_stream(messages, model)
+            try:
+                async for text in stream:
+                    yield text
+            finally:
+                # 调用方提前停止读取时立即关闭 Poe 请求，名额随之归还
+                await stream.aclose()
+
+    async def _poe_stream(self, messages: List[dict], model: str) -> AsyncGenerator[str, None]:
         """获取Poe的流式响应 - 直接使用Poe模型名称"""
         try:
             poe_messages = []
@@ -5,18 +5,26 @@ import logging
 import re  # 新增导入正则模块
 from datetime import datetime
 from fastapi import APIRouter, HTTPException, Depends, Body, UploadFile, File, Form, Request
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, JSONResponse
 
 from models import (
     ChatCompletionRequest, ChatCompletionResponse, ChatCompletionChoice,
     ChatMessage, Role, ChatCompletionUsage,
     ChatCompletionStreamResponse, ChatCompletionStreamChoice
 )
-from llm_router import get_llm_client
+from llm_router import get_llm_client, resolve_llm_client
 from logger import request_logger
 from auth import verify_api_key
-from conversation_manager import conversation_manager  # 新增
+from conversation_manager import async_conversation_manager  # 新增
 from services.attachments import save_upload, build_attachment_text_line, is_image
+from services.stream_coalesce import coalesce_chunks, coalesce_enabled
+from services.stream_backpressure import backpressure_stream
+from services.chat_stream import StreamSession, add_session
+from services.completion_cache import (
+    CACHE_OFF, CACHE_USE, cache_key, cache_mode, cacheable_response, completion_cache,
+)
+from services.singleflight import caller_scope, flights, singleflight_enabled
+from services.admission import AdmissionRejected, set_admission_caller
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
@@ -27,7 +35,10 @@ async def create_chat_completion(
     api_key: str = Depends(verify_api_key)
 ):
     llm_client, backend = get_llm_client()
+    # 上游准入调度按调用方公平排队
+    set_admission_caller(api_key)
     start_time = time.time()
+    coalesce = coalesce_enabled(request.headers)
 
     # 根据 Content-Type 判断是 JSON 还是 multipart
     content_type = (request.headers.get("content-type") or "").lower()
@@ -38,7 +49,10 @@ async def create_chat_completion(
         except Exception as e:
             raise HTTPException(status_code=400, detail=f"Invalid JSON body: {e}")
         messages = _normalize_messages_from_pydantic(parsed)
-        return await _handle_chat_flow(llm_client, backend, parsed, messages, start_time)
+        return await _handle_chat_flow(
+            llm_client, backend, parsed, messages, start_time, coalesce=coalesce,
+            headers=request.headers, api_key=api_key,
+        )
     elif "multipart/form-data" in content_type:
         form = await request.form()
         model = (form.get("model") or "").strip()
@@ -132,7 +146,7 @@ async def create_chat_completion(
         # 流式或非流式
         try:
             if stream_flag:
-                return await _stream_response(llm_client, backend, chat_req, messages, start_time)
+                return await _stream_response(llm_client, backend, chat_req, messages, start_time, coalesce=coalesce)
             else:
                 response_content = await llm_client.get_response_complete(messages, model)
                 response = ChatCompletionResponse(
@@ -156,6 +170,9 @@ async def create_chat_completion(
                     time.time() - start_time
                 )
                 return response
+        except AdmissionRejected:
+            # 由应用级异常处理返回 429
+            raise
         except Exception as e:
             logger.error(f"Error in chat completion (multipart): {e}")
             raise HTTPException(status_code=500, detail=str(e))
@@ -179,7 +196,47 @@ def _normalize_messages_from_pydantic(parsed: ChatCompletionRequest) -> list[dic
         messages.append(msg_dict)
     return messages
 
-async def _handle_chat_flow(llm_client, backend, request_obj: ChatCompletionRequest, messages: list[dict], start_time: float):
+def _request_key(llm_client, backend, request_obj: ChatCompletionRequest, messages: list[dict], params: dict) -> str:
+    # 不同后端 / 上游的结果分开缓存
+    scope = f"{getattr(backend, 'value', backend)}:{getattr(llm_client, 'base_url', '')}"
+    return cache_key(request_obj.model, messages, params, scope=scope)
+
+async def _complete_with_cache(llm_client, backend, request_obj: ChatCompletionRequest, messages: list[dict], headers=None, api_key=None):
+    """
+    非流式补全：按 Config.COMPLETION_CACHE_* 读写结果缓存，并与完全相同的进行中请求合并（singleflight）。
+    返回 (文本, 附加响应头)；响应头含 X-Cache（启用缓存时）与 X-Singleflight: joined（复用了进行中的请求时）。
+    """
+    headers = headers or {}
+    params = request_obj.model_dump()
+    mode = cache_mode(headers, params)
+    share = singleflight_enabled(headers)
+    if mode == CACHE_OFF and not share:
+        return await llm_client.get_response_complete(messages, request_obj.model), {}
+    key = _request_key(llm_client, backend, request_obj, messages, params)
+    extra_headers = {}
+    if mode == CACHE_USE:
+        cached = await completion_cache.get(key)
+        if cached is not None:
+            return cached, {"X-Cache": "HIT"}
+        extra_headers["X-Cache"] = "MISS"
+    elif mode != CACHE_OFF:
+        completion_cache.record_refresh()
+        extra_headers["X-Cache"] = "REFRESH"
+
+    async def call():
+        response_content = await llm_client.get_response_complete(messages, request_obj.model)
+        if mode != CACHE_OFF and cacheable_response(response_content):
+            await completion_cache.put(key, response_content)
+        return response_content
+
+    if not share:
+        return await call(), extra_headers
+    response_content, joined = await flights.do(f"{key}:{caller_scope(api_key)}", call)
+    if joined:
+        extra_headers["X-Singleflight"] = "joined"
+    return response_content, extra_headers
+
+async def _handle_chat_flow(llm_client, backend, request_obj: ChatCompletionRequest, messages: list[dict], start_time: float, coalesce: bool = True, headers=None, api_key=None):
     try:
         if request_obj.stream:
             conversation_id = None
@@ -190,12 +247,24 @@ async def _handle_chat_flow(llm_client, backend, request_obj: ChatCompletionRequ
                 if hasattr(msg, "name") and str(msg.name).startswith("cid-"):
                     conversation_id = str(msg.name)[4:]
                     break
+            if conversation_id:
+                # 会话所属项目配置了独立上游时改走该上游
+                llm_client, backend = await resolve_llm_client(conversation_id)
+
+            # 绑定会话的流各自落库，不参与合并；其余流与完全相同的进行中请求共用上游
+            flight_key = None
+            if not conversation_id and singleflight_enabled(headers or {}):
+                params = request_obj.model_dump()
+                flight_key = f"{_request_key(llm_client, backend, request_obj, messages, params)}:{caller_scope(api_key)}"
 
             return await _stream_response(
-                llm_client, backend, request_obj, messages, start_time, conversation_id=conversation_id
+                llm_client, backend, request_obj, messages, start_time, conversation_id=conversation_id,
+                coalesce=coalesce, flight_key=flight_key
             )
         else:
-            response_content = await llm_client.get_response_complete(messages, request_obj.model)
+            response_content, extra_headers = await _complete_with_cache(
+                llm_client, backend, request_obj, messages, headers, api_key
+            )
             response = ChatCompletionResponse(
                 id=f"chatcmpl-{uuid.uuid4().hex}",
                 created=int(time.time()),
@@ -211,18 +280,25 @@ async def _handle_chat_flow(llm_client, backend, request_obj: ChatCompletionRequ
                     total_tokens=sum(len(str(msg.get('content', '')).split()) for msg in messages) + len(response_content.split())
                 )
             )
-            request_logger.log_request_response(
-                request_obj.model_dump(),
-                response.model_dump(),
-                time.time() - start_time
-            )
-            return response
+            # 缓存命中与复用进行中请求的结果不是新的模型输出，不写训练日志
+            if extra_headers.get("X-Cache") != "HIT" and "X-Singleflight" not in extra_headers:
+                request_logger.log_request_response(
+                    request_obj.model_dump(),
+                    response.model_dump(),
+                    time.time() - start_time
+                )
+            if not extra_headers:
+                return response
+            return JSONResponse(response.model_dump(), headers=extra_headers)
+    except AdmissionRejected:
+        # 由应用级异常处理返回 429
+        raise
     except Exception as e:
         logger.error(f"Error in chat completion: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
 async def _stream_response(
-    llm_client, backend, request, messages, start_time, conversation_id=None
+    llm_client, backend, request, messages, start_time, conversation_id=None, coalesce=True, flight_key=None
 ):
     request_id = f"chatcmpl-{uuid.uuid4().hex}"
     created_time = int(time.time())
@@ -232,19 +308,54 @@ async def _stream_response(
 
     if conversation_id:
         try:
-            assistant_msg_id = conversation_manager.insert_assistant_placeholder(conversation_id, created_at=now)
+            assistant_msg_id = await async_conversation_manager.insert_assistant_placeholder(conversation_id, created_at=now)
         except Exception as e:
             logger.warning(f"Insert assistant placeholder failed: {e}")
 
+    # 需要落库时由 StreamSession 只请求一次上游：同一份分片既推给客户端，也由会话负责落库（客户端断开也会写完）
+    session = None
+    if assistant_msg_id:
+        session = StreamSession(
+            session_id=f"{conversation_id}:{assistant_msg_id}:{int(now.timestamp() * 1000)}",
+            llm_client=llm_client,
+            chat_messages=messages,
+            model=request.model,
+            assistant_msg_id=assistant_msg_id,
+            now=now,
+            conversation_id=conversation_id,
+        )
+        # 登记后同一会话的其它客户端可通过 /v1/chat/conversations/{id}/stream 接入
+        add_session(session.session_id, session)
+        session.start()
+
+    async def upstream():
+        if session is not None:
+            async for chunk in session.iter_chunks():
+                yield chunk
+            if session.exception:
+                raise session.exception
+            return
+        async for chunk in llm_client.get_response_stream(messages, request.model):
+            # 严格过滤：凡是以 "Thinking..." 开头的消息直接忽略（须在合并之前按原始分片判断）
+            if chunk and not chunk.strip().startswith("Thinking..."):
+                yield chunk
+
     async def generate():
         nonlocal full_response
+        # 有会话时分片已在会话缓冲中，客户端只持有读游标；合并请求时分片在 flight 中只存一份，同样只持有读游标；
+        # 其余直连上游的流经有界缓冲与慢客户端解耦
+        joined = False
+        if session is not None:
+            chunks = upstream()
+        elif flight_key is not None:
+            chunks, joined = flights.stream(flight_key, upstream)
+        else:
+            chunks = backpressure_stream(upstream())
+        if coalesce:
+            chunks = coalesce_chunks(chunks)
         try:
-            async for chunk in llm_client.get_response_stream(messages, request.model):
+            async for chunk in chunks:
                 if chunk:
-                    # 严格过滤：凡是以 "Thinking..." 开头的消息直接忽略
-                    if chunk.strip().startswith("Thinking..."):
-                        continue
-                    
                     full_response += chunk
                     stream_response = ChatCompletionStreamResponse(
                         id=request_id,
@@ -271,33 +382,20 @@ async def _stream_response(
             yield f"data: {final_response.model_dump_json()}\n\n"
             yield "data: [DONE]\n\n"
 
-            # 记录 multipart 或 json 的请求日志
-            try:
-                req_log = request.model_dump()
-            except Exception:
-                req_log = {"model": getattr(request, "model", None), "messages": messages, "stream": True}
-            request_logger.log_stream_request_response(
-                req_log, full_response, time.time() - start_time
-            )
+            # 记录 multipart 或 json 的请求日志；复用进行中请求的流不是新的模型输出，由发起者记录一次
+            if not joined:
+                try:
+                    req_log = request.model_dump()
+                except Exception:
+                    req_log = {"model": getattr(request, "model", None), "messages": messages, "stream": True}
+                request_logger.log_stream_request_response(
+                    req_log, full_response, time.time() - start_time
+                )
         except Exception as e:
             yield f"data: {json.dumps({'error': str(e)})}\n\n"
-
-    async def update_assistant_message():
-        nonlocal full_response
-        filtered_response = ""
-        async for chunk in llm_client.get_response_stream(messages, request.model):
-            if chunk and not chunk.strip().startswith("Thinking..."):
-                filtered_response += chunk
-        if assistant_msg_id:
-            conversation_manager.update_message_content_and_time(
-                assistant_msg_id,
-                filtered_response,
-                created_at=now
-            )
-
-    if assistant_msg_id:
-        import asyncio
-        asyncio.create_task(update_assistant_message())
+        finally:
+            # 客户端断开时立即停止读取上游（合并/缓冲阶段各自持有后台读取）
+            await chunks.aclose()
 
     return StreamingResponse(
         generate(),
@@ -1,7 +1,8 @@
 from fastapi import APIRouter, HTTPException, Body, Path, Query
 from pydantic import BaseModel
-from typing import Optional
-from conversation_manager import conversation_manager
+from typing import Optional, Tuple
+from datetime import datetime
+from conversation_manager import async_conversation_manager
 router = APIRouter()
 # ========== 请求模型 ==========
 class ConversationCreateRequest(BaseModel):
@@ -20,7 +21,7 @@ class UpdateConversationRequest(BaseModel):
 # ========== 接口实现 ==========
 @router.post("/v1/chat/conversations")
 async def create_conversation_api(request: ConversationCreateRequest = Body(...)):
-    conversation_id = conversation_manager.create_conversation(
+    conversation_id = await async_conversation_manager.create_conversation(
         system_prompt=request.system_prompt,
         project_id=request.project_id,
         name=request.name,
@@ -32,25 +33,48 @@ async def create_conversation_api(request: ConversationCreateRequest = Body(...)
     return {"conversation_id": conversation_id}
 @router.get("/v1/chat/conversations/grouped")
 async def get_grouped_conversations():
-    grouped = conversation_manager.get_all_conversations_grouped_by_project()
+    grouped = await async_conversation_manager.get_all_conversations_grouped_by_project()
     return grouped
+def _parse_cursor(cursor: str) -> Tuple[datetime, str]:
+    """游标格式: {updated_at ISO8601}|{conversation_id}"""
+    try:
+        ts, cid = cursor.rsplit("|", 1)
+        return datetime.fromisoformat(ts), cid
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid cursor: {cursor}")
 @router.get("/v1/chat/conversations")
 async def list_conversations(
     project_id: Optional[int] = Query(None, description="按项目ID筛选"),
-    status: Optional[int] = Query(None, description="按会话状态筛选（0/1）")
+    status: Optional[int] = Query(None, description="按会话状态筛选（0/1）"),
+    light: bool = Query(False, description="为 true 时不返回 system_prompt"),
+    limit: Optional[int] = Query(None, ge=1, le=500, description="每页条数；提供时启用分页（轻量字段）"),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor")
 ):
     """
     新增：获取会话列表，支持 project_id 与 status 条件筛选。
     返回包含 status / updated_at 等字段，向前兼容不影响旧接口。
+    - 提供 limit 或 cursor 时按 (updated_at, id) 倒序 keyset 分页，返回
+      {"conversations": [...], "has_more": bool, "next_cursor": str|null}，不含 system_prompt
     """
-    return conversation_manager.get_conversations(project_id=project_id, status=status)
+    if limit is None and cursor is None:
+        return await async_conversation_manager.get_conversations(project_id=project_id, status=status, light=light)
+    page = await async_conversation_manager.get_conversations_page(
+        project_id=project_id,
+        status=status,
+        limit=limit or 50,
+        before=_parse_cursor(cursor) if cursor else None
+    )
+    next_cursor = page["next_cursor"]
+    if next_cursor is not None:
+        page["next_cursor"] = f"{next_cursor[0].isoformat()}|{next_cursor[1]}"
+    return page
 @router.get("/v1/chat/conversations/{conversation_id}")
 async def get_conversation(conversation_id: str = Path(...)):
     """
     新增：根据会话ID获取单条会话详情。
     """
     try:
-        convo = conversation_manager.get_conversation_by_id(conversation_id)
+        convo = await async_conversation_manager.get_conversation_by_id(conversation_id)
         return convo
     except KeyError:
         raise HTTPException(status_code=404, detail="Conversation not found")
@@ -59,7 +83,7 @@ async def update_conversation(
     conversation_id: str = Path(...),
     request: UpdateConversationRequest = Body(...)
 ):
-    success = conversation_manager.update_conversation(
+    success = await async_conversation_manager.update_conversation(
         conversation_id,
         project_id=request.project_id,
         name=request.name,
@@ -73,7 +97,7 @@ async def update_conversation(
         raise HTTPException(status_code=404, detail="Conversation not found")
 @router.delete("/v1/chat/conversations/{conversation_id}")
 async def delete_conversation(conversation_id: str = Path(...)):
-    success = conversation_manager.delete_conversation(conversation_id)
+    success = await async_conversation_manager.delete_conversation(conversation_id)
     if success:
         return {"message": "Conversation deleted"}
     else:
@@ -1,13 +1,15 @@
 import json
-import asyncio
+import time
+import logging
 from datetime import datetime
-from fastapi import APIRouter, HTTPException, Body, Path, Depends, Request
+from fastapi import APIRouter, HTTPException, Body, Path, Query, Depends, Request, Header
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field, field_validator
 from typing import List, Optional, Dict
-from conversation_manager import conversation_manager
-from llm_router import get_llm_client
+from conversation_manager import conversation_manager, async_conversation_manager
+from llm_router import resolve_llm_client
 from auth import verify_api_key
+from services.admission import AdmissionRejected, set_admission_caller
 from services.message_utils import (
     is_ignored_user_message,
     merge_assistant_messages_with_user_history,
@@ -17,11 +19,16 @@ from services.chat_stream import (
     get_session,
     add_session,
     remove_session,
+    stream_registry,
 )
-from db import get_conn
+from db import get_conn, run_in_db_executor
 
+logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# 启用分页（带游标或 fields=summary）但未指定 limit 时的每页条数
+_DEFAULT_PAGE_SIZE = 50
+
 
 class AddMessageRequest(BaseModel):
     role: str
@@ -96,14 +103,36 @@ def _inject_kb_into_system_prompt(conversation_id: str, kb_block: Optional[str])
 
 
 @router.get("/v1/chat/conversations/{conversation_id}/messages")
-async def get_conversation_history(conversation_id: str = Path(...)):
+async def get_conversation_history(
+    conversation_id: str = Path(...),
+    before_id: Optional[int] = Query(None, description="只返回 id 小于该值的消息（向前翻页）"),
+    after_id: Optional[int] = Query(None, description="只返回 id 大于该值的消息（向后翻页）"),
+    limit: Optional[int] = Query(None, ge=1, le=500, description="每页条数；提供游标、limit 或 fields=summary 时启用分页，默认 50"),
+    fields: str = Query("full", pattern="^(full|summary)$", description="full 返回完整 content；summary 仅返回 length 与 preview"),
+):
     """
     返回指定会话的消息列表，包含：
     - id, role, content, created_at, updated_at
+    - fields=summary 时以 length（字符数）和 preview（前 200 字符）代替 content
+    分页（keyset，按 messages.id）：
+    - limit 不带游标：最新的 limit 条；before_id：更早的一页；after_id：更新的一页
+    - 每页内按 id 升序，has_more 表示该方向上是否还有更多消息
+    - 带游标或 fields=summary 但未给 limit 时每页 50 条
+    不带任何分页参数时与旧版一致，返回全部消息。
     """
+    summary = fields == "summary"
     try:
-        messages = conversation_manager.get_messages(conversation_id)
-        return {"conversation_id": conversation_id, "messages": messages}
+        if before_id is None and after_id is None and limit is None and not summary:
+            messages = await async_conversation_manager.get_messages(conversation_id)
+            return {"conversation_id": conversation_id, "messages": messages, "has_more": False}
+        page = await async_conversation_manager.get_messages_page(
+            conversation_id,
+            before_id=before_id,
+            after_id=after_id,
+            limit=limit or _DEFAULT_PAGE_SIZE,
+            summary=summary,
+        )
+        return {"conversation_id": conversation_id, **page}
     except KeyError:
         raise HTTPException(status_code=404, detail="Conversation not found")
 
@@ -122,11 +151,12 @@ async def add_message_and_reply(
     - 非流式：直接返回reply与消息ID；会自动更新会话的 updated_at。
     - 流式：SSE输出，第一帧包含user_message_id和assistant_message_id等。
     """
-    llm_client, backend = get_llm_client()
+    set_admission_caller(api_key)
+    llm_client, backend = await resolve_llm_client(conversation_id)
     try:
         kb_block: Optional[str] = None
         if request.documents:
-            kb_block = _build_kb_block_from_documents(request.documents)
+            kb_block = await run_in_db_executor(_build_kb_block_from_documents, request.documents)
 
         if request.stream:
             return await create_conversation_stream_response(
@@ -136,16 +166,17 @@ async def add_message_and_reply(
                 model=request.model,
                 fastapi_request=fastapi_request,
                 kb_block=kb_block,
+                llm_client=llm_client,
             )
 
         ignore_user = is_ignored_user_message(request.role, request.content)
         user_message_id = None
         if not ignore_user:
-            user_message_id = conversation_manager.append_message(
+            user_message_id = await async_conversation_manager.append_message(
                 conversation_id, request.role, request.content
             )
 
-        messages = conversation_manager.get_messages(conversation_id)
+        messages = await async_conversation_manager.get_messages(conversation_id)
         chat_messages = merge_assistant_messages_with_user_history(
             messages,
             user_role=request.role,
@@ -154,14 +185,14 @@ async def add_message_and_reply(
         )
 
         if kb_block:
-            injected_system = _inject_kb_into_system_prompt(conversation_id, kb_block)
+            injected_system = await run_in_db_executor(_inject_kb_into_system_prompt, conversation_id, kb_block)
             if injected_system:
                 chat_messages = [{"role": "system", "content": injected_system}] + chat_messages
 
         response_content = await llm_client.get_response_complete(
             chat_messages, request.model
         )
-        assistant_message_id = conversation_manager.append_message(
+        assistant_message_id = await async_conversation_manager.append_message(
             conversation_id, "assistant", response_content
         )
         return {
@@ -172,12 +203,47 @@ async def add_message_and_reply(
         }
     except KeyError:
         raise HTTPException(status_code=404, detail="Conversation not found")
+    except AdmissionRejected:
+        raise
     except Exception as e:
         import traceback
         traceback.print_exc()
         raise HTTPException(status_code=500, detail=str(e))
 
 
+class _DeliveryLatency:
+    """记录单个 SSE 流的首字延迟（TTFT）与分片间隔，流结束时写日志"""
+    def __init__(self, started: float):
+        self.started = started
+        self.first: Optional[float] = None
+        self.last: Optional[float] = None
+        self.count = 0
+        self.max_gap = 0.0
+
+    def mark(self):
+        now = time.monotonic()
+        if self.first is None:
+            self.first = now
+        else:
+            self.max_gap = max(self.max_gap, now - self.last)
+        self.last = now
+        self.count += 1
+
+    def log(self, session_id: str, upstream_ttft: Optional[float]):
+        if self.first is None:
+            return
+        mean_gap = (self.last - self.first) / (self.count - 1) if self.count > 1 else 0.0
+        logger.info(
+            "stream %s: chunks=%d ttft=%.1fms upstream_ttft=%s mean_gap=%.1fms max_gap=%.1fms",
+            session_id,
+            self.count,
+            (self.first - self.started) * 1000,
+            f"{upstream_ttft * 1000:.1f}ms" if upstream_ttft is not None else "-",
+            mean_gap * 1000,
+            self.max_gap * 1000,
+        )
+
+
 async def create_conversation_stream_response(
     conversation_id: str,
     user_role: str,
@@ -185,25 +251,34 @@ async def create_conversation_stream_response(
     model: str,
     fastapi_request: Request = None,
     kb_block: Optional[str] = None,
+    llm_client=None,
 ):
     """
     SSE流式回复：
     - 第一帧返回 { user_message_id, assistant_message_id, conversation_id, session_id }
-    - 中间多帧返回 { content: "..." }
+    - 中间多帧返回 { content: "..." }，带递增的 SSE id（已发送分片数），断线后可续传
     - 完成帧 { content: "", finish_reason: "stop" } + [DONE]
     - 如传入 kb_block，则在提交 LLM 前注入到 system prompt
+    - llm_client 由调用方传入时复用，否则按会话所属项目从 llm_router 解析
     """
-    llm_client, backend = get_llm_client()
+    if llm_client is None:
+        llm_client, _ = await resolve_llm_client(conversation_id)
     now = datetime.now()
+    request_started = time.monotonic()
 
     ignore_user = is_ignored_user_message(user_role, user_content)
-    user_message_id = None
-    if not ignore_user:
-        user_message_id = conversation_manager.append_message(
-            conversation_id, user_role, user_content
-        )
+    # 用户消息与助手占位消息在同一事务中写入
+    user_message_id, assistant_msg_id = await async_conversation_manager.append_message_with_placeholder(
+        conversation_id,
+        user_role,
+        user_content,
+        placeholder_created_at=now,
+        store_user_message=not ignore_user,
+    )
 
-    messages = conversation_manager.get_messages(conversation_id)
+    messages = await async_conversation_manager.get_messages(conversation_id)
+    # 占位消息已落库，构建上下文时排除
+    messages = [m for m in messages if m["id"] != assistant_msg_id]
     chat_messages = merge_assistant_messages_with_user_history(
         messages,
         user_role=user_role,
@@ -212,13 +287,10 @@ async def create_conversation_stream_response(
     )
 
     if kb_block:
-        injected_system = _inject_kb_into_system_prompt(conversation_id, kb_block)
+        injected_system = await run_in_db_executor(_inject_kb_into_system_prompt, conversation_id, kb_block)
         if injected_system:
             chat_messages = [{"role": "system", "content": injected_system}] + chat_messages
 
-    assistant_msg_id = conversation_manager.insert_assistant_placeholder(
-        conversation_id, created_at=now
-    )
     session_id = f"{conversation_id}:{assistant_msg_id}:{int(now.timestamp() * 1000)}"
     session = StreamSession(
         session_id=session_id,
@@ -227,34 +299,32 @@ async def create_conversation_stream_response(
         model=model,
         assistant_msg_id=assistant_msg_id,
         now=now,
+        conversation_id=conversation_id,
     )
     add_session(session_id, session)
     session.start()
 
     async def generate():
-        yield f"data: {json.dumps({'user_message_id': user_message_id, 'assistant_message_id': assistant_msg_id, 'conversation_id': conversation_id, 'session_id': session_id})}\n\n"
-        sent_idx = 0
+        yield _sse({'user_message_id': user_message_id, 'assistant_message_id': assistant_msg_id, 'conversation_id': conversation_id, 'session_id': session_id})
+        # 客户端断开时 Starlette 会取消本生成器；会话本身继续运行并落库，可通过 GET /v1/chat/streams/{session_id} 续传
+        latency = _DeliveryLatency(request_started)
         try:
-            while not session.is_completed() or sent_idx < len(session.chunks):
-                req: Request = fastapi_request
-                if req is not None and hasattr(req, "is_disconnected"):
-                    if await req.is_disconnected():
-                        break
-                new_chunks = session.get_chunks(sent_idx)
-                for chunk in new_chunks:
-                    sent_idx += 1
-                    yield f"data: {json.dumps({'content': chunk})}\n\n"
-                await asyncio.sleep(0.15)
-            if session.exception:
-                yield f"data: {json.dumps({'error': str(session.exception)})}\n\n"
-            else:
-                yield f"data: {json.dumps({'content': '', 'finish_reason': 'stop'})}\n\n"
-                yield "data: [DONE]\n\n"
+            async for frame in _session_events(session, 0, latency):
+                yield frame
         finally:
-            remove_session(session_id)
+            latency.log(session_id, session.time_to_first_chunk)
 
+    return _sse_response(generate())
+
+
+def _sse(payload: dict, event_id: Optional[int] = None) -> str:
+    head = f"id: {event_id}\n" if event_id is not None else ""
+    return f"{head}data: {json.dumps(payload)}\n\n"
+
+
+def _sse_response(frames) -> StreamingResponse:
     return StreamingResponse(
-        generate(),
+        frames,
         media_type="text/event-stream",
         headers={
             "Cache-Control": "no-cache",
@@ -264,6 +334,90 @@ async def create_conversation_stream_response(
     )
 
 
+async def _session_events(session: StreamSession, start_idx: int, latency: Optional[_DeliveryLatency] = None):
+    """
+    从第 start_idx 个分片起输出会话的 SSE 帧，直到会话结束。
+    内容帧的 id 为已发送的分片总数，客户端用它（Last-Event-ID 或 from）续传时不会重复或遗漏。
+    """
+    idx = start_idx
+    async for chunk in session.iter_chunks(start_idx):
+        idx += 1
+        yield _sse({'content': chunk}, idx)
+        if latency is not None:
+            latency.mark()
+    if session.exception:
+        yield _sse({'error': str(session.exception)})
+    else:
+        yield _sse({'content': '', 'finish_reason': 'stop'})
+        yield "data: [DONE]\n\n"
+
+
+@router.get("/v1/chat/streams")
+async def list_streams(api_key: str = Depends(verify_api_key)):
+    """运行中及宽限期内的流式会话（内存占用、时长、上游模型），按创建时间倒序"""
+    sessions = sorted(stream_registry.sessions(), key=lambda s: s.started_at, reverse=True)
+    return {
+        "summary": stream_registry.summary(),
+        "sessions": [s.info() for s in sessions],
+    }
+
+
+@router.get("/v1/chat/streams/{session_id}")
+async def resume_stream(
+    session_id: str = Path(...),
+    from_idx: int = Query(0, alias="from", ge=0, description="从第几个分片开始（即已收到的最后一个事件 id）"),
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+    api_key: str = Depends(verify_api_key),
+):
+    """
+    重新接入仍在运行（或刚结束）的流式会话：先补发已缓冲的分片，再继续实时推送。
+    Last-Event-ID 请求头（EventSource 自动重连时携带）优先于 from 参数。
+    会话已不在注册表中时返回 404，客户端应改为读取消息历史。
+    """
+    session = get_session(session_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="Stream session not found")
+    return _attach_stream(session, from_idx, last_event_id)
+
+
+@router.get("/v1/chat/conversations/{conversation_id}/stream")
+async def watch_conversation_stream(
+    conversation_id: str = Path(...),
+    from_idx: int = Query(0, alias="from", ge=0, description="从第几个分片开始，默认从头回放"),
+    last_event_id: Optional[str] = Header(None, alias="Last-Event-ID"),
+    api_key: str = Depends(verify_api_key),
+):
+    """
+    接入会话当前（或刚结束）的流式回复，供同一会话的其它标签页/设备实时观看，不会再次请求上游。
+    没有进行中的流时返回 404。
+    """
+    session = stream_registry.find_by_conversation(conversation_id)
+    if not session:
+        raise HTTPException(status_code=404, detail="No active stream for this conversation")
+    return _attach_stream(session, from_idx, last_event_id)
+
+
+def _attach_stream(session: StreamSession, from_idx: int, last_event_id: Optional[str]) -> StreamingResponse:
+    if last_event_id:
+        try:
+            from_idx = max(0, int(last_event_id))
+        except ValueError:
+            raise HTTPException(status_code=400, detail="Invalid Last-Event-ID")
+
+    async def generate():
+        yield _sse({
+            'assistant_message_id': session.assistant_msg_id,
+            'conversation_id': session.conversation_id,
+            'session_id': session.session_id,
+            'resumed_from': from_idx,
+            'subscribers': session.subscriber_count + 1,
+        })
+        async for frame in _session_events(session, from_idx):
+            yield frame
+
+    return _sse_response(generate())
+
+
 class DeleteMessagesRequest(BaseModel):
     message_ids: List[int]
 
@@ -271,7 +425,7 @@ class DeleteMessagesRequest(BaseModel):
 @router.post("/v1/chat/messages/delete")
 async def delete_messages(request: DeleteMessagesRequest = Body(...)):
     try:
-        count = conversation_manager.delete_messages(request.message_ids)
+        count = await async_conversation_manager.delete_messages(request.message_ids)
         return {"message": f"{count} messages deleted"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -287,6 +441,6 @@ async def stop_stream(request: StopStreamRequest = Body(...)):
     if not session:
         raise HTTPException(status_code=404, detail="Stream session not found")
     session.stop()
-    session.completed.wait(timeout=3)
+    await session.wait_completed(timeout=3)
     remove_session(request.session_id)
     return {"message": "Stream stopped", "session_id": request.session_id}
\ No newline at end of file
@@ -47,7 +47,7 @@ def _format_datetime(dt):
 
 @router.get("/v1/chat/conversations/{conversation_id}/referenced-documents", 
            response_model=ConversationReferencedDocumentsResponse)
-async def get_conversation_referenced_documents(conversation_id: str = Path(...)):
+def get_conversation_referenced_documents(conversation_id: str = Path(...)):
     """
     查询会话引用的文档列表，分为项目级引用和会话级引用
     """
@@ -121,7 +121,7 @@ async def get_conversation_referenced_documents(conversation_id: str = Path(...)
 
 @router.get("/v1/projects/{project_id}/document-references", 
            response_model=List[DocumentReferenceResponse])
-async def get_project_document_references(project_id: int = Path(...)):
+def get_project_document_references(project_id: int = Path(...)):
     """
     查询项目级文档引用列表
     """
@@ -156,7 +156,7 @@ async def get_project_document_references(project_id: int = Path(...)):
 
 @router.get("/v1/chat/conversations/{conversation_id}/document-references", 
            response_model=List[DocumentReferenceResponse])
-async def get_conversation_document_references(conversation_id: str = Path(...)):
+def get_conversation_document_references(conversation_id: str = Path(...)):
     """
     查询会话级文档引用列表
     """
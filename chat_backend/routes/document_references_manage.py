@@ -83,7 +83,7 @@ def _get_current_conversation_references(conversation_id: str) -> List[int]:
 
 @router.post("/v1/projects/{project_id}/document-references", 
             response_model=DocumentReferenceOperationResponse)
-async def set_project_document_references(
+def set_project_document_references(
     project_id: int = Path(...),
     request: ProjectDocumentReferencesRequest = Body(...)
 ):
@@ -133,7 +133,7 @@ async def set_project_document_references(
     )
 
 @router.delete("/v1/projects/{project_id}/document-references")
-async def clear_project_document_references(project_id: int = Path(...)):
+def clear_project_document_references(project_id: int = Path(...)):
     """
     清空项目级文档引用
     """
@@ -158,7 +158,7 @@ async def clear_project_document_references(project_id: int = Path(...)):
 
 @router.post("/v1/chat/conversations/{conversation_id}/document-references", 
             response_model=DocumentReferenceOperationResponse)
-async def set_conversation_document_references(
+def set_conversation_document_references(
     conversation_id: str = Path(...),
     request: ConversationDocumentReferencesRequest = Body(...)
 ):
@@ -218,7 +218,7 @@ async def set_conversation_document_references(
     )
 
 @router.delete("/v1/chat/conversations/{conversation_id}/document-references")
-async def clear_conversation_document_references(conversation_id: str = Path(...)):
+def clear_conversation_document_references(conversation_id: str = Path(...)):
     """
     清空会话级文档引用
     """
@@ -18,7 +18,7 @@ def _iso(dt):
     return dt.isoformat() if isinstance(dt, datetime) else dt
 
 @router.get("/v1/plan/categories", response_model=List[PlanCategoryModel])
-async def list_plan_categories():
+def list_plan_categories():
     with get_conn() as conn:
         with conn.cursor() as cursor:
             cursor.execute("""
@@ -35,7 +35,7 @@ async def list_plan_categories():
             return result
 
 @router.get("/v1/plan/categories/{category_id}", response_model=PlanCategoryModel)
-async def get_plan_category(category_id: int = Path(...)):
+def get_plan_category(category_id: int = Path(...)):
     with get_conn() as conn:
         with conn.cursor() as cursor:
             cursor.execute("""
@@ -50,7 +50,7 @@ async def get_plan_category(category_id: int = Path(...)):
             return d
 
 @router.post("/v1/plan/categories", response_model=PlanCategoryModel)
-async def create_plan_category(cat: PlanCategoryCreateRequest = Body(...)):
+def create_plan_category(cat: PlanCategoryCreateRequest = Body(...)):
     with get_conn() as conn:
         with conn.cursor() as cursor:
             try:
@@ -79,7 +79,7 @@ async def create_plan_category(cat: PlanCategoryCreateRequest = Body(...)):
             return d
 
 @router.put("/v1/plan/categories/{category_id}", response_model=PlanCategoryModel)
-async def update_plan_category(
+def update_plan_category(
     category_id: int = Path(...),
     cat: PlanCategoryUpdateRequest = Body(...)
 ):
@@ -133,7 +133,7 @@ async def update_plan_category(
             return d
 
 @router.delete("/v1/plan/categories/{category_id}")
-async def delete_plan_category(category_id: int = Path(...)):
+def delete_plan_category(category_id: int = Path(...)):
     """
     删除分类及其关联：
       1) 删除 document_references（通过文档ID）
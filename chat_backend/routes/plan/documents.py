@@ -31,7 +31,7 @@ def _to_int_or_none(val: Optional[str]) -> Optional[int]:
         raise HTTPException(status_code=400, detail=f"Invalid integer: {val}")
 
 @router.post("/v1/plan/documents", response_model=PlanDocumentResponse)
-async def create_plan_document(doc: PlanDocumentCreateRequest = Body(...)):
+def create_plan_document(doc: PlanDocumentCreateRequest = Body(...)):
     with get_conn() as conn:
         with conn.cursor() as cursor:
             cursor.execute("""
@@ -66,7 +66,7 @@ async def create_plan_document(doc: PlanDocumentCreateRequest = Body(...)):
             return d
 
 @router.get("/v1/plan/documents/history", response_model=List[PlanDocumentResponse])
-async def list_document_history(
+def list_document_history(
     project_id: int = Query(..., description="项目ID"),
     category_id: Optional[str] = Query(None, description="分类ID（可选；允许空字符串）"),
     filename: Optional[str] = Query(None, description="文档名（可选；允许空字符串）")
@@ -106,7 +106,7 @@ async def list_document_history(
             return result
 
 @router.get("/v1/plan/documents/{document_id}", response_model=PlanDocumentResponse)
-async def get_plan_document(document_id: int = Path(...)):
+def get_plan_document(document_id: int = Path(...)):
     with get_conn() as conn:
         with conn.cursor() as cursor:
             cursor.execute("""
@@ -121,7 +121,7 @@ async def get_plan_document(document_id: int = Path(...)):
             return d
 
 @router.put("/v1/plan/documents/{document_id}", response_model=PlanDocumentResponse)
-async def update_plan_document(
+def update_plan_document(
     document_id: int = Path(...),
     doc: PlanDocumentUpdateRequest = Body(...)
 ):
@@ -174,7 +174,7 @@ async def update_plan_document(
             return d
 
 @router.delete("/v1/plan/documents/{document_id}")
-async def delete_plan_document(document_id: int = Path(...)):
+def delete_plan_document(document_id: int = Path(...)):
     with get_conn() as conn:
         try:
             conn.begin()
@@ -220,7 +220,7 @@ async def delete_plan_document(document_id: int = Path(...)):
             }
 
 @router.delete("/v1/plan/documents")
-async def delete_all_versions(
+def delete_all_versions(
     project_id: int = Query(..., description="项目ID"),
     category_id: int = Query(..., description="分类ID"),
     filename: str = Query(..., description="文件名（删除该文件的全部历史版本）")
@@ -291,7 +291,7 @@ async def delete_all_versions(
             }
 
 @router.post("/v1/plan/documents/merge", response_model=MergeDocumentsResponse)
-async def merge_documents(body: MergeDocumentsRequest = Body(...)):
+def merge_documents(body: MergeDocumentsRequest = Body(...)):
     """
     合并文档内容：
     入参：{"document_ids":[...]}
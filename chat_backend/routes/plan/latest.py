@@ -42,7 +42,7 @@ def _normalize_order(val) -> str:
     return s
 
 @router.get("/v1/plan/documents/latest")
-async def list_latest_documents(request: Request):
+def list_latest_documents(request: Request):
     """
     List latest version of each document in a project.
     Query params (all optional except project_id):
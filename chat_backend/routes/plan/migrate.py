@@ -18,7 +18,7 @@ class MigrateFromCurrentRequest(BaseModel):
     source: Optional[str] = None        # 可选覆盖 source 字段
 
 @router.post("/v1/plan/documents/migrate/all-history")
-async def migrate_all_history(req: MigrateAllHistoryRequest = Body(...)):
+def migrate_all_history(req: MigrateAllHistoryRequest = Body(...)):
     """
     将某个文件（按 project_id+source_category_id+filename）的所有历史版本迁移到 target_category_id。
     若目标分类下已存在同名文件，将继续版本号（延续最大version+1...）。
@@ -81,7 +81,7 @@ async def migrate_all_history(req: MigrateAllHistoryRequest = Body(...)):
             }
 
 @router.post("/v1/plan/documents/migrate/from-current")
-async def migrate_from_current(req: MigrateFromCurrentRequest = Body(...)):
+def migrate_from_current(req: MigrateFromCurrentRequest = Body(...)):
     """
     从指定 document_id 对应文件（按 project_id+category_id+filename）的“下一版本起”
     在 target_category_id 创建一个新的版本轨道：
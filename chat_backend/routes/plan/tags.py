@@ -104,7 +104,7 @@ def _fetch_tag_by_unique(document_id: int, tag_name: str) -> Optional[Dict[str,
 
 # --------- Routes ---------
 @router.get("/v1/plan/documents/{document_id}/tags", response_model=TagListResponse)
-async def list_document_tags(document_id: int = Path(...)):
+def list_document_tags(document_id: int = Path(...)):
     _ensure_document_exists(document_id)
     with get_conn() as conn:
         with conn.cursor() as cursor:
@@ -121,7 +121,7 @@ async def list_document_tags(document_id: int = Path(...)):
             return TagListResponse(document_id=document_id, tags=tags)
 
 @router.post("/v1/plan/documents/{document_id}/tags")
-async def add_document_tag(
+def add_document_tag(
     document_id: int = Path(...),
     body: TagCreateRequest = Body(...)
 ):
@@ -158,7 +158,7 @@ async def add_document_tag(
                 raise HTTPException(status_code=400, detail=f"Failed to add tag: {e}")
 
 @router.delete("/v1/plan/documents/{document_id}/tags/{tag_name}")
-async def remove_document_tag(
+def remove_document_tag(
     document_id: int = Path(...),
     tag_name: str = Path(...)
 ):
@@ -176,7 +176,7 @@ async def remove_document_tag(
             return {"message": "Tag removed", "removed_count": removed}
 
 @router.post("/v1/plan/documents/{document_id}/tags:batch")
-async def batch_update_tags(
+def batch_update_tags(
     document_id: int = Path(...),
     body: TagBatchUpdateRequest = Body(...)
 ):
@@ -221,7 +221,7 @@ async def batch_update_tags(
     }
 
 @router.get("/v1/plan/documents/search-by-tags", response_model=List[PlanDocumentResponse])
-async def search_documents_by_tags(
+def search_documents_by_tags(
     project_id: int = Query(..., description="Project ID"),
     tags: str = Query(..., description="Comma separated tag names"),
     match: str = Query("any", pattern="^(any|all)$", description="Match mode: any|all")
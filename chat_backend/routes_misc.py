@@ -4,6 +4,14 @@ from datetime import datetime
 from config import Config
 from models import ModelInfo, ModelListResponse
 from llm_router import get_llm_backend
+from db import get_pool_stats
+from conversation_manager import conversation_manager
+from services.chat_stream import stream_registry
+from services.project_upstream import project_upstreams
+from openai_client import upstream_stats
+from services.completion_cache import completion_cache
+from services.singleflight import flights
+from services.admission import admission
 
 def register_misc_routes(app):
     router = APIRouter()
@@ -27,7 +35,15 @@ def register_misc_routes(app):
         return {
             "status": "healthy",
             "timestamp": datetime.now().isoformat(),
-            "llm_backend": get_llm_backend()
+            "llm_backend": get_llm_backend(),
+            "db_pool": get_pool_stats(),
+            "history_cache": conversation_manager.history_cache.stats(),
+            "stream_sessions": stream_registry.summary(),
+            "upstreams": upstream_stats(),
+            "project_upstream_cache": project_upstreams.stats(),
+            "completion_cache": completion_cache.stats(),
+            "singleflight": flights.stats(),
+            "admission": admission.stats()
         }
 
     @router.get("/v1/models", response_model=ModelListResponse)
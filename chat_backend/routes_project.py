@@ -2,8 +2,10 @@ from fastapi import APIRouter, HTTPException, Path, Body
 from pydantic import BaseModel
 from typing import List, Optional
 from db import get_conn
+from config import Config
 from datetime import datetime
 from code_project_reader.api import get_project_document
+from services.project_upstream import project_upstreams
 router = APIRouter()
 # ========== 数据模型 ==========
 class ProjectCreateRequest(BaseModel):
@@ -11,7 +13,7 @@ class ProjectCreateRequest(BaseModel):
     dev_environment: str
     grpc_server_address: str
     llm_model: Optional[str] = "GPT-4.1"
-    llm_url: Optional[str] = "http://43.132.224.225:8000/v1/chat/completions"
+    llm_url: Optional[str] = Config.PROJECT_DEFAULT_LLM_URL
     git_work_dir: Optional[str] = "/git_workspace"
     ai_work_dir: Optional[str] = "/aiWorkDir"
 class ProjectUpdateRequest(BaseModel):
@@ -39,14 +41,14 @@ def _row_to_dict(cursor, row):
     return dict(zip(columns, row))
 # ========== 路由接口 ==========
 @router.get("/v1/projects", response_model=List[ProjectResponse])
-async def list_projects():
+def list_projects():
     with get_conn() as conn:
         with conn.cursor() as cursor:
             cursor.execute("SELECT * FROM projects ORDER BY updated_time DESC, created_time DESC")
             rows = cursor.fetchall()
             return [_row_to_dict(cursor, row) for row in rows]
 @router.get("/v1/projects/{project_id}", response_model=ProjectResponse)
-async def get_project(project_id: int = Path(...)):
+def get_project(project_id: int = Path(...)):
     with get_conn() as conn:
         with conn.cursor() as cursor:
             cursor.execute("SELECT * FROM projects WHERE id=%s", (project_id,))
@@ -55,7 +57,7 @@ async def get_project(project_id: int = Path(...)):
                 raise HTTPException(status_code=404, detail="Project not found")
             return _row_to_dict(cursor, row)
 @router.post("/v1/projects", response_model=ProjectResponse)
-async def create_project(project: ProjectCreateRequest = Body(...)):
+def create_project(project: ProjectCreateRequest = Body(...)):
     with get_conn() as conn:
         with conn.cursor() as cursor:
             try:
@@ -84,7 +86,7 @@ async def create_project(project: ProjectCreateRequest = Body(...)):
             row = cursor.fetchone()
             return _row_to_dict(cursor, row)
 @router.put("/v1/projects/{project_id}", response_model=ProjectResponse)
-async def update_project(project_id: int, project: ProjectUpdateRequest = Body(...)):
+def update_project(project_id: int, project: ProjectUpdateRequest = Body(...)):
     updates = []
     values: List[object] = []
     def add(field_name: str, value):
@@ -110,19 +112,22 @@ async def update_project(project_id: int, project: ProjectUpdateRequest = Body(.
                 raise HTTPException(status_code=400, detail=f"Update project failed: {e}")
             if cursor.rowcount == 0:
                 raise HTTPException(status_code=404, detail="Project not found")
+            if project.llm_url is not None:
+                project_upstreams.invalidate(project_id)
             cursor.execute("SELECT * FROM projects WHERE id=%s", (project_id,))
             row = cursor.fetchone()
             return _row_to_dict(cursor, row)
 @router.delete("/v1/projects/{project_id}")
-async def delete_project(project_id: int):
+def delete_project(project_id: int):
     with get_conn() as conn:
         with conn.cursor() as cursor:
             cursor.execute("DELETE FROM projects WHERE id=%s", (project_id,))
             if cursor.rowcount == 0:
                 raise HTTPException(status_code=404, detail="Project not found")
+            project_upstreams.invalidate(project_id)
             return {"message": "Project deleted successfully"}
 @router.get("/v1/projects/{project_id}/complete-source-code")
-async def get_project_complete_source(project_id: int = Path(...)):
+def get_project_complete_source(project_id: int = Path(...)):
     import os
     os.environ["CODE_PROJECT_DEBUG"] = "1"
     with get_conn() as conn:
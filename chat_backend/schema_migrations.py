@@ -0,0 +1,238 @@
+"""
+数据库结构版本迁移。部署时显式执行，应用导入/启动时不会运行任何 DDL：
+
+    python schema_migrations.py            # 应用全部未执行的迁移
+    python schema_migrations.py --status   # 查看已执行版本与待执行迁移
+    python schema_migrations.py --explain  # 用 EXPLAIN 检查热点查询是否命中索引（未命中时退出码为 1）
+
+已执行的版本记录在 schema_migrations 表中。MySQL 的 DDL 会隐式提交，因此每个迁移
+都写成可重复执行（建表用 IF NOT EXISTS，加索引前先查 information_schema）。
+"""
+import sys
+import logging
+import argparse
+from typing import Any, Callable, Dict, List, Set, Tuple
+
+import pymysql
+from db import get_conn
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_LOCK = "plan_manager.schema_migrations"
+
+
+def _index_exists(cursor, table: str, index: str) -> bool:
+    cursor.execute(
+        """
+        SELECT 1 FROM information_schema.statistics
+        WHERE table_schema=DATABASE() AND table_name=%s AND index_name=%s
+        LIMIT 1
+        """,
+        (table, index)
+    )
+    return cursor.fetchone() is not None
+
+
+def _add_index(table: str, index: str, columns: str) -> Callable:
+    def apply(cursor):
+        if not _index_exists(cursor, table, index):
+            cursor.execute(f"ALTER TABLE {table} ADD INDEX {index} ({columns})")
+    return apply
+
+
+def _create_chat_tables(cursor):
+    """conversations / messages 基础表（原 ConversationManager._ensure_tables）"""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS conversations (
+            id VARCHAR(64) PRIMARY KEY,
+            system_prompt MEDIUMTEXT,
+            status TINYINT NOT NULL DEFAULT 0,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            project_id INT NOT NULL DEFAULT 0,
+            name VARCHAR(32) DEFAULT NULL,
+            assistance_role VARCHAR(16) DEFAULT NULL,
+            model VARCHAR(64) DEFAULT NULL
+        )
+    """)
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS messages (
+            id BIGINT PRIMARY KEY AUTO_INCREMENT,
+            conversation_id VARCHAR(64),
+            role VARCHAR(32),
+            content MEDIUMTEXT,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+            updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+            FOREIGN KEY (conversation_id) REFERENCES conversations(id) ON DELETE CASCADE
+        )
+    """)
+
+
+def _conversations_updated_at_not_null(cursor):
+    """
+    会话列表按 (updated_at, id) keyset 分页：updated_at 为 NULL 的行既无法生成游标，也会被
+    (updated_at, id) < (...) 条件跳过。先用 created_at 回填，再改为 NOT NULL。
+    """
+    cursor.execute("UPDATE conversations SET updated_at=COALESCE(created_at, NOW()) WHERE updated_at IS NULL")
+    cursor.execute("ALTER TABLE conversations MODIFY updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP")
+
+
+# (版本号, 说明, 执行函数)；只允许追加，不要修改已发布的版本
+MIGRATIONS: List[Tuple[int, str, Callable]] = [
+    (1, "conversations/messages base tables", _create_chat_tables),
+    (2, "messages(conversation_id, id) for history tail fetch and keyset pages",
+     _add_index("messages", "idx_conversation_id_id", "conversation_id, id")),
+    (3, "plan_documents(project_id, category_id, filename, version) for version lookups",
+     _add_index("plan_documents", "idx_project_category_filename_version", "project_id, category_id, filename, version")),
+    (4, "conversations(project_id, status, updated_at) for recency listings",
+     _add_index("conversations", "idx_project_status_updated", "project_id, status, updated_at")),
+    (5, "conversations.updated_at backfilled from created_at and NOT NULL (keyset cursor)",
+     _conversations_updated_at_not_null),
+]
+
+# EXPLAIN 检查的热点查询：(名称, SQL, 参数, 期望使用的索引)
+HOT_QUERIES: List[Tuple[str, str, tuple, str]] = [
+    (
+        "history tail fetch",
+        "SELECT id, role, content, created_at, updated_at FROM messages WHERE conversation_id=%s AND id>%s ORDER BY id ASC",
+        ("explain-check", 0),
+        "idx_conversation_id_id",
+    ),
+    (
+        "message keyset page",
+        "SELECT id, role, content, created_at, updated_at FROM messages WHERE conversation_id=%s AND id<%s ORDER BY id DESC LIMIT 51",
+        ("explain-check", 1 << 62),
+        "idx_conversation_id_id",
+    ),
+    (
+        "document max version",
+        "SELECT MAX(version) FROM plan_documents WHERE project_id=%s AND category_id=%s AND filename=%s",
+        (0, 0, "explain-check"),
+        "idx_project_category_filename_version",
+    ),
+    (
+        "document history",
+        "SELECT id, version, created_time FROM plan_documents WHERE project_id=%s AND category_id=%s AND filename=%s ORDER BY version DESC",
+        (0, 0, "explain-check"),
+        "idx_project_category_filename_version",
+    ),
+    (
+        "conversation listing",
+        "SELECT id, status, updated_at FROM conversations WHERE project_id=%s AND status=%s ORDER BY updated_at DESC, id DESC LIMIT 51",
+        (0, 0),
+        "idx_project_status_updated",
+    ),
+]
+
+# MIN/MAX 直接由索引求值时 EXPLAIN 的 key 列为空，Extra 中给出以下说明之一
+_INDEX_RESOLVED_EXTRAS = ("Select tables optimized away", "No matching min/max row")
+
+
+def _ensure_version_table(cursor):
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migrations (
+            version INT PRIMARY KEY,
+            description VARCHAR(255) NOT NULL,
+            applied_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+    """)
+
+
+def _applied_versions(cursor) -> Set[int]:
+    cursor.execute("SELECT version FROM schema_migrations")
+    return {row[0] for row in cursor.fetchall()}
+
+
+def migrate() -> List[int]:
+    """应用全部未执行的迁移，返回本次执行的版本号。通过 MySQL 命名锁防止多个部署进程并发执行。"""
+    applied: List[int] = []
+    with get_conn() as conn:
+        with conn.cursor() as cursor:
+            cursor.execute("SELECT GET_LOCK(%s, 60)", (MIGRATION_LOCK,))
+            if cursor.fetchone()[0] != 1:
+                raise RuntimeError("Another schema migration is running")
+            try:
+                _ensure_version_table(cursor)
+                done = _applied_versions(cursor)
+                for version, description, apply in MIGRATIONS:
+                    if version in done:
+                        continue
+                    logger.info("Applying schema migration %s: %s", version, description)
+                    apply(cursor)
+                    cursor.execute(
+                        "INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                        (version, description)
+                    )
+                    applied.append(version)
+            finally:
+                cursor.execute("SELECT RELEASE_LOCK(%s)", (MIGRATION_LOCK,))
+    return applied
+
+
+def status() -> Dict[str, Any]:
+    with get_conn() as conn:
+        with conn.cursor() as cursor:
+            _ensure_version_table(cursor)
+            done = _applied_versions(cursor)
+    return {
+        "current_version": max(done) if done else 0,
+        "latest_version": MIGRATIONS[-1][0],
+        "pending": [(v, d) for v, d, _ in MIGRATIONS if v not in done],
+    }
+
+
+def explain_hot_queries() -> List[Dict[str, Any]]:
+    """对 HOT_QUERIES 逐条执行 EXPLAIN，返回每条查询实际使用的索引及是否符合预期"""
+    results: List[Dict[str, Any]] = []
+    with get_conn() as conn:
+        with conn.cursor(pymysql.cursors.DictCursor) as cursor:
+            for name, sql, params, expected in HOT_QUERIES:
+                cursor.execute("EXPLAIN " + sql, params)
+                plan = cursor.fetchall()[0]
+                key = plan.get("key")
+                extra = plan.get("Extra") or ""
+                ok = key == expected or (key is None and any(x in extra for x in _INDEX_RESOLVED_EXTRAS))
+                results.append({
+                    "query": name,
+                    "expected": expected,
+                    "key": key,
+                    "type": plan.get("type"),
+                    "rows": plan.get("rows"),
+                    "extra": extra,
+                    "ok": ok,
+                })
+    return results
+
+
+def main(argv=None) -> int:
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s [%(name)s] %(message)s")
+    parser = argparse.ArgumentParser(description="Apply or inspect chat_backend schema migrations")
+    group = parser.add_mutually_exclusive_group()
+    group.add_argument("--status", action="store_true", help="show applied and pending migrations")
+    group.add_argument("--explain", action="store_true", help="check that hot queries use their indexes")
+    args = parser.parse_args(argv)
+
+    if args.status:
+        info = status()
+        print(f"current version: {info['current_version']} / latest: {info['latest_version']}")
+        for version, description in info["pending"]:
+            print(f"  pending {version}: {description}")
+        return 0
+
+    if args.explain:
+        results = explain_hot_queries()
+        for r in results:
+            mark = "OK  " if r["ok"] else "FAIL"
+            print(f"[{mark}] {r['query']:<22} key={r['key']} expected={r['expected']} type={r['type']} rows={r['rows']} {r['extra']}")
+        return 0 if all(r["ok"] for r in results) else 1
+
+    applied = migrate()
+    if applied:
+        print(f"applied migrations: {', '.join(str(v) for v in applied)}")
+    else:
+        print("schema is up to date")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,80 +1,312 @@
+import time
 import asyncio
 import threading
 from datetime import datetime
-from typing import Optional, Dict, List, Any
-from conversation_manager import conversation_manager
+from typing import Optional, Dict, List, Any, Set, AsyncIterator
+from config import Config
+from conversation_manager import async_conversation_manager
+from services.chunk_buffer import ChunkBuffer
+# 事件循环只对任务保持弱引用；客户端断开、会话被移出注册表后流仍需跑完并落库，这里保持强引用
+_background_tasks: Set[asyncio.Task] = set()
+def _keep_task(task: asyncio.Task):
+    _background_tasks.add(task)
+    task.add_done_callback(_task_done)
+def _task_done(task: asyncio.Task):
+    _background_tasks.discard(task)
+    # 等待方已被取消时异常无人读取，这里取走以免 asyncio 报 "exception was never retrieved"
+    if not task.cancelled():
+        task.exception()
+_REPLAY_BATCH = 256
+class _Subscriber:
+    """一个正在读取会话的客户端：各自的读取游标（下一个要发送的分片序号）"""
+    __slots__ = ("cursor", "attached_at")
+    def __init__(self, cursor: int):
+        self.cursor = cursor
+        self.attached_at = time.monotonic()
 class StreamSession:
     """
-    基于线程的流式会话，负责从 LLM 客户端获取分片并累积，同时在完成后落库。
+    运行在服务端事件循环上的流式会话（asyncio 任务），负责从 LLM 客户端获取分片并累积，同时在完成后落库。
+    客户端断开不影响会话继续运行；stop() 取消任务，已收到的内容照常落库。
+    会话结束后在注册表中再保留 STREAM_SESSION_GRACE_SECONDS 秒，供断线客户端按分片序号续传（由 reaper 清理）。
+    运行期间按 STREAM_CHECKPOINT_BYTES / STREAM_CHECKPOINT_INTERVAL 把新增内容追加写入助手消息，
+    进程重启最多丢失一个检查点间隔的内容，历史接口也能读到生成中的进度。
+    任意数量的客户端可同时订阅（iter_chunks），各自持有游标读取同一份缓冲，只消耗一次上游请求。
     """
-    def __init__(self, session_id: str, llm_client, chat_messages: List[Dict[str, Any]], model: str, assistant_msg_id: int, now: datetime):
+    def __init__(self, session_id: str, llm_client, chat_messages: List[Dict[str, Any]], model: str, assistant_msg_id: int, now: datetime, conversation_id: Optional[str] = None):
         self.session_id = session_id
+        self.conversation_id = conversation_id
         self.llm_client = llm_client
         self.chat_messages = chat_messages
         self.model = model
         self.assistant_msg_id = assistant_msg_id
         self.now = now
-        self.full_response = ""
-        self.stopped = threading.Event()
-        self.completed = threading.Event()
+        self.stopped = False
+        self.completed = asyncio.Event()
         self.exception: Optional[Exception] = None
-        self.thread: Optional[threading.Thread] = None
-        self.chunks: List[str] = []
-        self.lock = threading.Lock()
-        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.task: Optional[asyncio.Task] = None
+        # 分片只保存在 buffer 中一份（按序号回放，超出内存上限时写入临时文件）
+        self.buffer = ChunkBuffer(Config.STREAM_BUFFER_MAX_MEMORY_BYTES, Config.STREAM_BUFFER_SPILL_DIR)
+        # 每次有新分片或会话结束时 set 当前 Event 并换一个新的，所有等待者被同时唤醒
+        self._changed = asyncio.Event()
+        self._subscribers: Set[_Subscriber] = set()
+        self.started_at = time.monotonic()
+        self.completed_at: Optional[float] = None
+        self.first_chunk_at: Optional[float] = None
+        # 增量落库状态：_persisted 为已写入数据库的字符数
+        self._persisted = 0
+        self._unpersisted_bytes = 0
+        self._last_checkpoint = self.started_at
+        self._checkpoint_task: Optional[asyncio.Task] = None
+        self._checkpoint_ok = True
+        self._discarded = False
     def stop(self):
-        self.stopped.set()
+        # 只取消一次：重复 stop（再次 stop-stream、reaper 超龄）不能打断正在进行的最终落库
+        if self.stopped:
+            return
+        self.stopped = True
+        if self.task is not None and not self.task.done():
+            self.task.cancel()
     def is_completed(self) -> bool:
         return self.completed.is_set()
+    def discard(self):
+        """会话移出注册表时调用：结束且没有客户端仍在读取后释放分片缓冲（含 spill 临时文件）"""
+        self._discarded = True
+        self._maybe_release_buffer()
+    def _maybe_release_buffer(self):
+        if self._discarded and self.completed.is_set() and not self._subscribers:
+            self.buffer.close()
     def start(self):
-        self.thread = threading.Thread(target=self._run_stream, daemon=True)
-        self.thread.start()
-    def _run_stream(self):
+        """必须在事件循环中调用（路由处理函数内）"""
+        self.task = asyncio.get_running_loop().create_task(self._stream())
+        _keep_task(self.task)
+    async def wait_completed(self, timeout: Optional[float] = None) -> bool:
         try:
-            asyncio.set_event_loop(asyncio.new_event_loop())
-            self._loop = asyncio.get_event_loop()
-            self._loop.run_until_complete(self._stream())
-        except Exception as e:
-            self.exception = e
-        finally:
-            self.completed.set()
+            await asyncio.wait_for(self.completed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        return self.completed.is_set()
     async def _stream(self):
         try:
             async for chunk in self.llm_client.get_response_stream(self.chat_messages, self.model):
-                if self.stopped.is_set():
+                if self.stopped:
                     break
                 if not chunk:
                     continue
                 # 过滤以 "Thinking..." 开头的内容
                 if chunk.strip().startswith("Thinking..."):
                     continue
-                with self.lock:
-                    self.chunks.append(chunk)
-                self.full_response += chunk
+                if self.first_chunk_at is None:
+                    self.first_chunk_at = time.monotonic()
+                self._unpersisted_bytes += self.buffer.append(chunk)
+                self._notify()
+                self._maybe_checkpoint()
+        except asyncio.CancelledError:
+            # stop() 触发的取消：按正常结束处理，保留已收到的内容
+            pass
         except Exception as e:
             self.exception = e
         finally:
-            if self.assistant_msg_id:
-                try:
-                    conversation_manager.update_message_content_and_time(
-                        self.assistant_msg_id,
-                        self.full_response,
-                        created_at=self.now
-                    )
-                except Exception:
-                    pass
-            self.completed.set()
+            try:
+                if self.assistant_msg_id:
+                    # 落库在独立任务中完成，即使本任务再次被取消也会写完
+                    persist = asyncio.get_running_loop().create_task(self._persist_final())
+                    _keep_task(persist)
+                    try:
+                        await asyncio.shield(persist)
+                    except Exception:
+                        pass
+            finally:
+                # 无论落库结果如何都要通知订阅者结束，否则续传客户端会一直挂起，reaper 也无法回收会话
+                self.completed_at = time.monotonic()
+                self.completed.set()
+                self._notify()
+                self._maybe_release_buffer()
+    def _maybe_checkpoint(self):
+        """达到字节数或时间阈值时在后台追加写入；同一时刻最多一个检查点在写"""
+        if not self.assistant_msg_id or not self._checkpoint_ok:
+            return
+        if self._checkpoint_task is not None and not self._checkpoint_task.done():
+            return
+        by_bytes = Config.STREAM_CHECKPOINT_BYTES > 0 and self._unpersisted_bytes >= Config.STREAM_CHECKPOINT_BYTES
+        by_time = (
+            Config.STREAM_CHECKPOINT_INTERVAL > 0
+            and time.monotonic() - self._last_checkpoint >= Config.STREAM_CHECKPOINT_INTERVAL
+        )
+        if by_bytes or by_time:
+            self._unpersisted_bytes = 0
+            self._last_checkpoint = time.monotonic()
+            self._checkpoint_task = asyncio.get_running_loop().create_task(self._checkpoint())
+    async def _checkpoint(self):
+        offset = self._persisted
+        delta = self.buffer.text(offset)
+        try:
+            applied = await async_conversation_manager.append_message_content(
+                self.assistant_msg_id, delta, offset
+            )
+        except Exception:
+            # 写入结果未知：保持偏移不变，下次检查点的长度校验会识别已写入的情况
+            return
+        if applied:
+            self._persisted = offset + len(delta)
+        else:
+            # 库中内容与偏移不一致（如消息被编辑/删除）：停止增量写，结束时整体覆盖
+            self._checkpoint_ok = False
+    async def _persist_final(self):
+        """检查点正常时只追加剩余尾部；否则（或追加未生效）退回整体写入"""
+        if self._checkpoint_task is not None:
+            await self._checkpoint_task
+        if self._checkpoint_ok and self._persisted > 0:
+            tail = self.buffer.text(self._persisted)
+            if not tail:
+                return
+            try:
+                if await async_conversation_manager.append_message_content(self.assistant_msg_id, tail, self._persisted):
+                    self._persisted = self.buffer.char_length
+                    return
+            except Exception:
+                # 结果未知时整体覆盖写入是幂等的
+                pass
+        await async_conversation_manager.update_message_content_and_time(
+            self.assistant_msg_id,
+            self.full_response,
+            created_at=self.now
+        )
+    def _notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+    @property
+    def full_response(self) -> str:
+        return self.buffer.text()
     def get_chunks(self, start_idx: int) -> List[str]:
-        with self.lock:
-            return self.chunks[start_idx:]
-_stream_sessions: Dict[str, StreamSession] = {}
-_sessions_lock = threading.Lock()
+        return self.buffer.chunks(start_idx)
+    async def iter_chunks(self, start_idx: int = 0) -> AsyncIterator[str]:
+        """
+        从 start_idx 起按顺序产出分片，直到会话结束。每次调用即一个订阅者，迭代结束或被关闭时退订。
+        没有新分片时挂起在通知事件上，分片到达即刻唤醒，不做轮询。
+        """
+        sub = _Subscriber(start_idx)
+        self._subscribers.add(sub)
+        try:
+            while True:
+                if sub.cursor < len(self.buffer):
+                    # 分批取出：落后很多的慢客户端每次只物化有限个分片，内存不随落后量增长
+                    batch = self.buffer.chunks(sub.cursor, sub.cursor + _REPLAY_BATCH)
+                    for chunk in batch:
+                        sub.cursor += 1
+                        yield chunk
+                    continue
+                if self.completed.is_set():
+                    return
+                await self._changed.wait()
+        finally:
+            self._subscribers.discard(sub)
+            self._maybe_release_buffer()
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+    @property
+    def time_to_first_chunk(self) -> Optional[float]:
+        """上游首个分片相对会话创建的延迟（秒）"""
+        if self.first_chunk_at is None:
+            return None
+        return self.first_chunk_at - self.started_at
+    def info(self) -> Dict[str, Any]:
+        now = time.monotonic()
+        buffer = self.buffer.stats()
+        ttfc = self.time_to_first_chunk
+        lag = [len(self.buffer) - sub.cursor for sub in self._subscribers]
+        return {
+            "session_id": self.session_id,
+            "conversation_id": self.conversation_id,
+            "model": self.model,
+            "assistant_message_id": self.assistant_msg_id,
+            "completed": self.is_completed(),
+            "age_seconds": round(now - self.started_at, 1),
+            "idle_seconds": round(now - self.completed_at, 1) if self.completed_at is not None else None,
+            "chunks": buffer["chunks"],
+            "buffered_bytes": buffer["memory_bytes"] + buffer["spilled_bytes"],
+            "spilled_bytes": buffer["spilled_bytes"],
+            "time_to_first_chunk_ms": round(ttfc * 1000, 1) if ttfc is not None else None,
+            "subscribers": len(lag),
+            "max_subscriber_lag_chunks": max(lag, default=0),
+        }
+class StreamSessionRegistry:
+    """
+    session_id -> StreamSession。会话在以下情况被移除：
+    - 结束后超过 grace 秒（留给断线客户端续传）；
+    - 运行超过 max_age 秒仍未结束（上游挂死等），先 stop() 落库再移除；
+    - 显式 remove()（如 /v1/chat/stop-stream）。
+    移出的会话调用 discard()，结束且无人读取后释放分片缓冲与 spill 临时文件。
+    reap() 由 run_reaper() 周期调用。
+    """
+    def __init__(self, grace: float, max_age: float):
+        self.grace = grace
+        self.max_age = max_age
+        self._sessions: Dict[str, StreamSession] = {}
+        self._lock = threading.Lock()
+        self.reaped = 0
+    def get(self, session_id: str) -> Optional[StreamSession]:
+        with self._lock:
+            return self._sessions.get(session_id)
+    def add(self, session_id: str, session: StreamSession):
+        with self._lock:
+            self._sessions[session_id] = session
+    def remove(self, session_id: str):
+        with self._lock:
+            session = self._sessions.pop(session_id, None)
+        if session is not None:
+            session.discard()
+    def sessions(self) -> List[StreamSession]:
+        with self._lock:
+            return list(self._sessions.values())
+    def find_by_conversation(self, conversation_id: str) -> Optional[StreamSession]:
+        """会话最近一次的流（运行中或仍在宽限期内），供其它标签页/设备接入"""
+        candidates = [s for s in self.sessions() if s.conversation_id == conversation_id]
+        return max(candidates, key=lambda s: s.started_at, default=None)
+    def reap(self) -> int:
+        now = time.monotonic()
+        expired: List[StreamSession] = []
+        with self._lock:
+            for sid, session in list(self._sessions.items()):
+                if session.completed_at is not None:
+                    if now - session.completed_at >= self.grace:
+                        expired.append(self._sessions.pop(sid))
+                elif self.max_age > 0 and now - session.started_at >= self.max_age:
+                    expired.append(self._sessions.pop(sid))
+        for session in expired:
+            # 已结束的会话 stop() 无副作用；超龄会话被取消，已收到的内容照常落库
+            session.stop()
+            session.discard()
+        self.reaped += len(expired)
+        return len(expired)
+    def summary(self) -> Dict[str, Any]:
+        sessions = self.sessions()
+        infos = [s.info() for s in sessions]
+        return {
+            "sessions": len(infos),
+            "active": sum(1 for i in infos if not i["completed"]),
+            "buffered_bytes": sum(i["buffered_bytes"] for i in infos),
+            "spilled_bytes": sum(i["spilled_bytes"] for i in infos),
+            "oldest_age_seconds": max((i["age_seconds"] for i in infos), default=0),
+            "subscribers": sum(i["subscribers"] for i in infos),
+            "reaped_total": self.reaped,
+        }
+stream_registry = StreamSessionRegistry(
+    grace=Config.STREAM_SESSION_GRACE_SECONDS,
+    max_age=Config.STREAM_SESSION_MAX_AGE_SECONDS,
+)
+async def run_reaper(interval: Optional[float] = None):
+    """在应用生命周期内周期清理注册表（main.py lifespan 中以任务方式启动）"""
+    interval = interval or Config.STREAM_REAPER_INTERVAL_SECONDS
+    while True:
+        await asyncio.sleep(interval)
+        try:
+            stream_registry.reap()
+        except Exception:
+            pass
 def get_session(session_id: str) -> Optional[StreamSession]:
-    with _sessions_lock:
-        return _stream_sessions.get(session_id)
+    return stream_registry.get(session_id)
 def add_session(session_id: str, session: StreamSession):
-    with _sessions_lock:
-        _stream_sessions[session_id] = session
+    stream_registry.add(session_id, session)
 def remove_session(session_id: str):
-    with _sessions_lock:
-        _stream_sessions.pop(session_id, None)
\ No newline at end of file
+    stream_registry.remove(session_id)
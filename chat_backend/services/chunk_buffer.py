@@ -0,0 +1,169 @@
+import io
+import bisect
+import tempfile
+from array import array
+from typing import List, Optional
+
+
+class _Segment:
+    """若干个连续分片合并成的一段文本；spill 后 text 为 None，内容在临时文件 [file_offset, file_offset + nbytes)"""
+    __slots__ = ("start", "end", "text", "nbytes", "file_offset")
+
+    def __init__(self, start: int, end: int, text: str, nbytes: int):
+        self.start = start
+        self.end = end
+        self.text: Optional[str] = text
+        self.nbytes = nbytes
+        self.file_offset = -1
+
+
+class ChunkBuffer:
+    """
+    流式会话的分片缓冲区：文本只保存一份，按分片序号回放。
+
+    - 分片边界存在 array('q') 中（每个分片 8 字节的结束字符偏移），不为每个分片保留 str 对象；
+    - 最近的分片先放在 tail 列表，满 compact_every 个后合并成一个段（compaction），追加为均摊 O(1)，
+      不会像 full_response += chunk 那样反复复制整段文本；
+    - 设置 max_memory_bytes 后，超出部分从最早的段开始写入临时文件（spill），回放时再读回；
+    - 仅在事件循环线程中使用，不加锁。
+    """
+
+    def __init__(self, max_memory_bytes: int = 0, spill_dir: Optional[str] = None, compact_every: int = 64):
+        self.max_memory_bytes = max(0, int(max_memory_bytes))
+        self.spill_dir = spill_dir or None
+        self.compact_every = max(1, int(compact_every))
+        self._ends = array("q")
+        self._segments: List[_Segment] = []
+        self._segment_starts: List[int] = []
+        self._resident_from = 0  # 第一个仍在内存中的段（之前的段都已 spill）
+        self._tail: List[str] = []
+        self._tail_first_idx = 0
+        self._tail_start = 0
+        self._tail_bytes = 0
+        self._length = 0
+        self.memory_bytes = 0
+        self.spilled_bytes = 0
+        self._spill = None
+
+    def __len__(self) -> int:
+        """分片数"""
+        return len(self._ends)
+
+    @property
+    def char_length(self) -> int:
+        return self._length
+
+    def append(self, chunk: str) -> int:
+        """追加一个分片，返回其 UTF-8 字节数"""
+        nbytes = len(chunk.encode("utf-8"))
+        self._tail.append(chunk)
+        self._tail_bytes += nbytes
+        self._length += len(chunk)
+        self._ends.append(self._length)
+        self.memory_bytes += nbytes
+        if len(self._tail) >= self.compact_every:
+            self._compact()
+        if self.max_memory_bytes and self.memory_bytes > self.max_memory_bytes:
+            self._spill_oldest()
+        return nbytes
+
+    def chunks(self, start_idx: int, end_idx: Optional[int] = None) -> List[str]:
+        """返回序号 [start_idx, end_idx) 的分片"""
+        count = len(self._ends)
+        end_idx = count if end_idx is None else min(end_idx, count)
+        if start_idx >= end_idx:
+            return []
+        if start_idx >= self._tail_first_idx:
+            # 实时推送的常见路径：只涉及尚未合并的最新分片
+            base = self._tail_first_idx
+            return self._tail[start_idx - base:end_idx - base]
+        first = self._ends[start_idx - 1] if start_idx > 0 else 0
+        text = self._text_between(first, self._ends[end_idx - 1])
+        out: List[str] = []
+        prev = first
+        for i in range(start_idx, end_idx):
+            end = self._ends[i]
+            out.append(text[prev - first:end - first])
+            prev = end
+        return out
+
+    def text(self, start: int = 0) -> str:
+        """从字符偏移 start 起的全部文本"""
+        return self._text_between(start, self._length)
+
+    def stats(self) -> dict:
+        return {
+            "chunks": len(self._ends),
+            "chars": self._length,
+            "memory_bytes": self.memory_bytes,
+            "spilled_bytes": self.spilled_bytes,
+        }
+
+    def close(self):
+        """
+        释放全部内容（内存中的段与临时文件）。由 StreamSession.discard() 在会话结束且移出注册表后调用；
+        之后缓冲区视为空，可重复调用。
+        """
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+        self._ends = array("q")
+        self._segments = []
+        self._segment_starts = []
+        self._resident_from = 0
+        self._tail = []
+        self._tail_first_idx = 0
+        self._tail_start = 0
+        self._tail_bytes = 0
+        self._length = 0
+        self.memory_bytes = 0
+        self.spilled_bytes = 0
+
+    # ---------- internals ----------
+    def _compact(self):
+        if not self._tail:
+            return
+        segment = _Segment(self._tail_start, self._length, "".join(self._tail), self._tail_bytes)
+        self._segments.append(segment)
+        self._segment_starts.append(segment.start)
+        self._tail = []
+        self._tail_first_idx = len(self._ends)
+        self._tail_start = self._length
+        self._tail_bytes = 0
+
+    def _spill_oldest(self):
+        self._compact()
+        if self._spill is None:
+            self._spill = tempfile.TemporaryFile(prefix="stream-", dir=self.spill_dir)
+        self._spill.seek(0, io.SEEK_END)
+        while self.memory_bytes > self.max_memory_bytes and self._resident_from < len(self._segments):
+            segment = self._segments[self._resident_from]
+            segment.file_offset = self._spill.tell()
+            self._spill.write(segment.text.encode("utf-8"))
+            segment.text = None
+            self.memory_bytes -= segment.nbytes
+            self.spilled_bytes += segment.nbytes
+            self._resident_from += 1
+
+    def _segment_text(self, segment: _Segment) -> str:
+        if segment.text is not None:
+            return segment.text
+        self._spill.seek(segment.file_offset)
+        return self._spill.read(segment.nbytes).decode("utf-8")
+
+    def _text_between(self, start: int, end: int) -> str:
+        """字符区间 [start, end) 的文本"""
+        if start >= end:
+            return ""
+        parts: List[str] = []
+        if start < self._tail_start:
+            i = max(0, bisect.bisect_right(self._segment_starts, start) - 1)
+            while i < len(self._segments) and self._segments[i].start < end:
+                segment = self._segments[i]
+                text = self._segment_text(segment)
+                parts.append(text[max(start, segment.start) - segment.start:min(end, segment.end) - segment.start])
+                i += 1
+        if end > self._tail_start:
+            tail = "".join(self._tail)
+            parts.append(tail[max(start, self._tail_start) - self._tail_start:end - self._tail_start])
+        return "".join(parts)
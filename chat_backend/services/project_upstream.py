@@ -0,0 +1,148 @@
+import time
+import logging
+import threading
+from typing import Dict, NamedTuple, Optional, Tuple
+from config import Config
+from db import get_conn, run_in_db_executor
+from openai_client import normalize_base_url
+
+logger = logging.getLogger(__name__)
+
+
+class ProjectUpstream(NamedTuple):
+    project_id: Optional[int]
+    base_url: Optional[str]  # 已规范化为 base_url；None 表示使用全局 OPENAI_BASE_URL
+
+
+_NO_UPSTREAM = ProjectUpstream(None, None)
+
+
+def upstream_allowed(base_url: Optional[str]) -> bool:
+    """base_url 是否在 Config.UPSTREAM_ALLOWLIST 中；列表为空时不允许任何按项目路由"""
+    allowlist = {normalize_base_url(u) for u in Config.UPSTREAM_ALLOWLIST.split(",") if u.strip()}
+    return base_url is not None and base_url in allowlist
+
+
+def project_base_url(llm_url: Optional[str]) -> Optional[str]:
+    """
+    projects.llm_url -> 项目单独配置的上游 base_url。空值和建表默认值视为未配置；
+    不在白名单中的地址被忽略（项目接口无鉴权，任意地址都可能被写入，不能把全局 API key 发过去）。
+    """
+    base_url = normalize_base_url(llm_url)
+    if base_url is None or base_url == normalize_base_url(Config.PROJECT_DEFAULT_LLM_URL):
+        return None
+    if not upstream_allowed(base_url):
+        logger.warning("Project llm_url %s is not in UPSTREAM_ALLOWLIST, using default upstream", base_url)
+        return None
+    return base_url
+# 缓存条目超过该数量时写入前清理过期条目
+_PRUNE_AT = 10000
+
+
+class ProjectUpstreamCache:
+    """
+    会话 / 项目 -> 上游地址的 TTL 缓存，避免每个请求都查一次 projects 表。
+    项目被修改或删除时由 routes_project 调用 invalidate()；会话改挂到其他项目最多延迟 ttl 秒生效。
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = max(0.0, float(ttl))
+        self._conversations: Dict[str, Tuple[float, ProjectUpstream]] = {}
+        self._projects: Dict[int, Tuple[float, ProjectUpstream]] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _get(self, table: dict, key) -> Optional[ProjectUpstream]:
+        with self._lock:
+            item = table.get(key)
+            if item is not None and item[0] > time.monotonic():
+                self.hits += 1
+                return item[1]
+            self.misses += 1
+            return None
+
+    def _put(self, table: dict, key, upstream: ProjectUpstream):
+        if self.ttl:
+            now = time.monotonic()
+            with self._lock:
+                if len(table) >= _PRUNE_AT:
+                    for k in [k for k, (expires, _) in table.items() if expires <= now]:
+                        del table[k]
+                table[key] = (now + self.ttl, upstream)
+
+    def cached_conversation(self, conversation_id: str) -> Optional[ProjectUpstream]:
+        return self._get(self._conversations, conversation_id)
+
+    def cached_project(self, project_id: int) -> Optional[ProjectUpstream]:
+        return self._get(self._projects, project_id)
+
+    def load_conversation(self, conversation_id: str) -> ProjectUpstream:
+        """查库并写入缓存（阻塞，在 DB 线程池中调用）"""
+        with get_conn() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute(
+                    "SELECT p.id, p.llm_url FROM conversations c "
+                    "JOIN projects p ON p.id=c.project_id WHERE c.id=%s",
+                    (conversation_id,),
+                )
+                row = cursor.fetchone()
+        upstream = ProjectUpstream(row[0], project_base_url(row[1])) if row else _NO_UPSTREAM
+        self._put(self._conversations, conversation_id, upstream)
+        return upstream
+
+    def load_project(self, project_id: int) -> ProjectUpstream:
+        with get_conn() as conn:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT llm_url FROM projects WHERE id=%s", (project_id,))
+                row = cursor.fetchone()
+        upstream = ProjectUpstream(project_id, project_base_url(row[0])) if row else _NO_UPSTREAM
+        self._put(self._projects, project_id, upstream)
+        return upstream
+
+    def invalidate(self, project_id: Optional[int] = None):
+        """项目变更后调用；会话缓存按项目过滤，project_id 为 None 时全部清空"""
+        with self._lock:
+            if project_id is None:
+                self._conversations.clear()
+                self._projects.clear()
+                return
+            self._projects.pop(project_id, None)
+            stale = [cid for cid, (_, u) in self._conversations.items() if u.project_id == project_id]
+            for cid in stale:
+                del self._conversations[cid]
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "ttl": self.ttl,
+                "conversations": len(self._conversations),
+                "projects": len(self._projects),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+project_upstreams = ProjectUpstreamCache(Config.PROJECT_UPSTREAM_CACHE_TTL)
+
+
+async def resolve_upstream(conversation_id: Optional[str] = None, project_id: Optional[int] = None) -> ProjectUpstream:
+    """按会话或项目解析上游；查询失败（会话不存在、数据库异常）时退回全局上游"""
+    if not Config.PROJECT_UPSTREAM_ROUTING or (conversation_id is None and project_id is None):
+        return _NO_UPSTREAM
+    # 缓存命中时不经过 DB 线程池
+    if conversation_id is not None:
+        upstream = project_upstreams.cached_conversation(conversation_id)
+        load, key = project_upstreams.load_conversation, conversation_id
+    else:
+        upstream = project_upstreams.cached_project(project_id)
+        load, key = project_upstreams.load_project, project_id
+    if upstream is not None:
+        return upstream
+    try:
+        return await run_in_db_executor(load, key)
+    except Exception as e:
+        logger.warning("Resolve project upstream for %s failed, using default: %s", key, e)
+        return _NO_UPSTREAM
@@ -0,0 +1,73 @@
+import json
+from typing import Any, List, Optional
+
+try:
+    import orjson
+
+    def json_loads(data: bytes) -> Any:
+        return orjson.loads(data)
+except ImportError:  # orjson 为可选依赖，未安装时退回标准库
+    orjson = None
+
+    def json_loads(data: bytes) -> Any:
+        return json.loads(data)
+
+
+class SSEDecoder:
+    """
+    增量 SSE（text/event-stream）解码器，直接处理原始字节块：
+    - 输入可在任意位置切分（帧、行、多字节 UTF-8 字符都可能跨两次读取），未完整的行留在缓冲区等待后续数据；
+    - 一个事件内的多行 data: 以 \\n 连接，空行结束事件；
+    - 注释行（以 : 开头）与 event / id / retry 字段忽略；行结束符支持 \\n 与 \\r\\n。
+    产出的是每个事件 data 字段的原始字节，由调用方决定如何解析。
+    """
+
+    __slots__ = ("_tail", "_data")
+
+    def __init__(self):
+        # 未完整的行按块暂存，遇到换行时才拼接一次，超长的行分多次到达时不会反复复制
+        self._tail: List[bytes] = []
+        self._data: List[bytes] = []
+
+    def feed(self, chunk: bytes) -> List[bytes]:
+        """送入一块字节，返回本块内完整结束的事件的 data"""
+        if b"\n" not in chunk:
+            if chunk:
+                self._tail.append(chunk)
+            return []
+        if self._tail:
+            self._tail.append(chunk)
+            chunk = b"".join(self._tail)
+        lines = chunk.split(b"\n")
+        last = lines.pop()
+        self._tail = [last] if last else []
+        events: List[bytes] = []
+        data = self._data
+        for line in lines:
+            if line[-1:] == b"\r":
+                line = line[:-1]
+            if not line:
+                if data:
+                    events.append(data[0] if len(data) == 1 else b"\n".join(data))
+                    data = self._data = []
+            elif line[:5] == b"data:":
+                data.append(line[6:] if line[5:6] == b" " else line[5:])
+        return events
+
+    def flush(self) -> List[bytes]:
+        """流结束：没有以空行结尾的最后一个事件也视为完整"""
+        return self.feed(b"\n\n") if self._tail or self._data else []
+
+
+def delta_content(payload: Any) -> Optional[str]:
+    """chat.completion.chunk 中 choices[0].delta.content；没有或结构不符（合法 JSON 但字段类型不对）时返回 None"""
+    if not isinstance(payload, dict):
+        return None
+    choices = payload.get("choices")
+    if not isinstance(choices, list) or not choices or not isinstance(choices[0], dict):
+        return None
+    delta = choices[0].get("delta")
+    if not isinstance(delta, dict):
+        return None
+    content = delta.get("content")
+    return content if isinstance(content, str) else None
@@ -0,0 +1,175 @@
+import sys
+import codecs
+import asyncio
+import tempfile
+from collections import deque
+from typing import AsyncIterator, Optional
+from config import Config
+
+POLICIES = ("block", "coalesce", "spill")
+# coalesce 策略下队列中积累到该数量的碎片即合并为一个字符串，避免大量小 str 对象的额外开销
+_COALESCE_PARTS = 32
+
+
+class BoundedStreamPipe:
+    """
+    上游与单个客户端之间的有界缓冲（单生产者、单消费者，仅在事件循环线程中使用）。
+    队列内存按 sys.getsizeof 计（含 str 对象头），超过 max_bytes 时按策略处理：
+    - block:    put() 挂起，直到客户端读走数据，上游随最慢的客户端限速；
+    - coalesce: 碎片合并为大字符串后才计入上限，客户端一次取走全部积压，仍超限时同 block；
+    - spill:    put() 不挂起，超出部分顺序写入临时文件，客户端读完内存部分后再从文件读回。
+    """
+
+    def __init__(self, policy: str = "block", max_bytes: int = 256 * 1024, spill_dir: Optional[str] = None):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown backpressure policy: {policy}")
+        self.policy = policy
+        self.max_bytes = max(1, int(max_bytes))
+        self.spill_dir = spill_dir or None
+        self._queue: deque = deque()
+        self._bytes = 0
+        self._readable = asyncio.Event()
+        self._writable = asyncio.Event()
+        self._done = False
+        self._error: Optional[BaseException] = None
+        self._spill = None
+        self._spill_read = 0
+        self._spill_write = 0
+        self._decoder = None
+        # 观测指标
+        self.peak_bytes = 0
+        self.blocked_seconds = 0.0
+        self.spilled_bytes = 0
+
+    @property
+    def queued_bytes(self) -> int:
+        return self._bytes
+
+    async def put(self, chunk: str):
+        if self.policy == "spill":
+            # 文件里还有未读内容时必须继续写文件，保证顺序
+            if self._spill_write > self._spill_read or self._bytes + sys.getsizeof(chunk) > self.max_bytes:
+                self._spill_out(chunk)
+                self._readable.set()
+                return
+        else:
+            if self._bytes >= self.max_bytes:
+                loop = asyncio.get_running_loop()
+                started = loop.time()
+                while self._bytes >= self.max_bytes:
+                    self._writable.clear()
+                    await self._writable.wait()
+                self.blocked_seconds += loop.time() - started
+        self._queue.append(chunk)
+        self._bytes += sys.getsizeof(chunk)
+        if self.policy == "coalesce" and len(self._queue) >= _COALESCE_PARTS:
+            merged = "".join(self._queue)
+            self._queue.clear()
+            self._queue.append(merged)
+            self._bytes = sys.getsizeof(merged)
+        self.peak_bytes = max(self.peak_bytes, self._bytes)
+        self._readable.set()
+
+    def close(self, error: Optional[BaseException] = None):
+        """上游结束（或出错）；消费者读完剩余数据后结束（或抛出该异常）"""
+        self._done = True
+        self._error = error
+        self._readable.set()
+
+    async def get(self) -> Optional[str]:
+        """取下一段文本；上游结束且数据读完时返回 None"""
+        while True:
+            if self._queue:
+                if self.policy == "coalesce":
+                    text = "".join(self._queue)
+                    self._queue.clear()
+                    self._bytes = 0
+                else:
+                    text = self._queue.popleft()
+                    self._bytes -= sys.getsizeof(text)
+                self._writable.set()
+                return text
+            if self._spill_write > self._spill_read:
+                text = self._spill_in()
+                if text:
+                    return text
+                continue
+            if self._done:
+                if self._error is not None:
+                    raise self._error
+                return None
+            self._readable.clear()
+            await self._readable.wait()
+
+    def dispose(self):
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
+    def _spill_out(self, chunk: str):
+        if self._spill is None:
+            self._spill = tempfile.TemporaryFile(prefix="sse-", dir=self.spill_dir)
+            self._decoder = codecs.getincrementaldecoder("utf-8")()
+        data = chunk.encode("utf-8")
+        self._spill.seek(self._spill_write)
+        self._spill.write(data)
+        self._spill_write += len(data)
+        self.spilled_bytes += len(data)
+
+    def _spill_in(self) -> str:
+        # 每次最多读回 max_bytes，读回的内容也受内存上限约束；增量解码器处理被截断的多字节字符
+        self._spill.seek(self._spill_read)
+        data = self._spill.read(min(self.max_bytes, self._spill_write - self._spill_read))
+        self._spill_read += len(data)
+        text = self._decoder.decode(data)
+        if self._spill_read == self._spill_write:
+            # 文件读空：复位，避免临时文件无限增长
+            self._spill.seek(0)
+            self._spill.truncate()
+            self._spill_read = self._spill_write = 0
+        return text
+
+
+async def backpressure_stream(
+    source: AsyncIterator[str],
+    policy: Optional[str] = None,
+    max_bytes: Optional[int] = None,
+    spill_dir: Optional[str] = None,
+) -> AsyncIterator[str]:
+    """
+    在独立任务中读取上游写入 BoundedStreamPipe，调用方按自己的速度读取。
+    客户端断开（本生成器被关闭）时停止读取上游并关闭上游生成器。
+    """
+    pipe = BoundedStreamPipe(
+        policy or Config.STREAM_BACKPRESSURE_POLICY,
+        Config.STREAM_BACKPRESSURE_MAX_BYTES if max_bytes is None else max_bytes,
+        spill_dir if spill_dir is not None else Config.STREAM_BACKPRESSURE_SPILL_DIR,
+    )
+
+    async def pump():
+        try:
+            async for chunk in source:
+                if chunk:
+                    await pipe.put(chunk)
+        except Exception as e:
+            pipe.close(e)
+        else:
+            pipe.close()
+
+    task = asyncio.get_running_loop().create_task(pump())
+    try:
+        while True:
+            chunk = await pipe.get()
+            if chunk is None:
+                break
+            yield chunk
+    finally:
+        if not task.done():
+            task.cancel()
+            try:
+                await task
+            except (asyncio.CancelledError, Exception):
+                pass
+        if hasattr(source, "aclose"):
+            await source.aclose()
+        pipe.dispose()
@@ -0,0 +1,5 @@
+import os
+import sys
+
+# 与运行服务时一致：以 chat_backend 目录为导入根（from config import Config 等）
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,145 @@
+import asyncio
+
+import pytest
+
+from services.admission import AdmissionRejected, AdmissionScheduler
+
+
+async def _hold(scheduler, caller, entered, release):
+    async with scheduler.slot("m", caller):
+        entered.append(caller)
+        await release.wait()
+
+
+def test_cancel_while_queued_then_release_does_not_leak():
+    """排队者断开与另一个请求归还名额发生在同一轮事件循环：归还方不报错，名额不泄漏，后续排队者照常放行"""
+
+    async def main():
+        scheduler = AdmissionScheduler(max_concurrency=1)
+        holder = scheduler.slot("m", "a")
+        await holder.__aenter__()
+        entered = []
+        release = asyncio.Event()
+        cancelled = asyncio.create_task(_hold(scheduler, "b", entered, release))
+        waiting = asyncio.create_task(_hold(scheduler, "c", entered, release))
+        await asyncio.sleep(0)
+        assert scheduler.queued == 2
+
+        # 取消后 slot() 的 except 尚未执行时归还名额
+        cancelled.cancel()
+        await holder.__aexit__(None, None, None)
+
+        with pytest.raises(asyncio.CancelledError):
+            await cancelled
+        await asyncio.sleep(0)
+        assert entered == ["c"]
+        release.set()
+        await waiting
+        stats = scheduler.stats()
+        assert stats["running"] == 0
+        assert stats["queued"] == 0
+        assert stats["running_by_model"] == {}
+
+    asyncio.run(main())
+
+
+def test_fair_round_robin_between_callers():
+    async def main():
+        scheduler = AdmissionScheduler(max_concurrency=1)
+        order = []
+
+        async def job(caller):
+            async with scheduler.slot("m", caller):
+                order.append(caller)
+                await asyncio.sleep(0)
+
+        holder = scheduler.slot("m", "holder")
+        await holder.__aenter__()
+        tasks = [asyncio.create_task(job("heavy")) for _ in range(4)]
+        await asyncio.sleep(0)
+        tasks += [asyncio.create_task(job("light")) for _ in range(2)]
+        await asyncio.sleep(0)
+        await holder.__aexit__(None, None, None)
+        await asyncio.gather(*tasks)
+        assert order == ["heavy", "light", "heavy", "light", "heavy", "heavy"]
+
+    asyncio.run(main())
+
+
+def test_model_limit_skips_blocked_head_of_line():
+    async def main():
+        scheduler = AdmissionScheduler(max_concurrency=4, model_limits={"slow": 1})
+        order = []
+        release = asyncio.Event()
+
+        async def job(caller, model):
+            async with scheduler.slot(model, caller):
+                order.append((caller, model))
+                await release.wait()
+
+        tasks = [asyncio.create_task(job("a", "slow")), asyncio.create_task(job("a", "slow"))]
+        await asyncio.sleep(0)
+        tasks.append(asyncio.create_task(job("b", "fast")))
+        await asyncio.sleep(0)
+        assert order == [("a", "slow"), ("b", "fast")]
+        release.set()
+        await asyncio.gather(*tasks)
+        assert scheduler.stats()["running"] == 0
+
+    asyncio.run(main())
+
+
+def test_queue_wait_timeout_rejects():
+    async def main():
+        scheduler = AdmissionScheduler(max_concurrency=1, max_wait=0.05)
+        release = asyncio.Event()
+        holder = asyncio.create_task(_hold(scheduler, "a", [], release))
+        await asyncio.sleep(0)
+        with pytest.raises(AdmissionRejected) as exc:
+            async with scheduler.slot("m", "b"):
+                pass
+        assert exc.value.retry_after == 0.05
+        release.set()
+        await holder
+        stats = scheduler.stats()
+        assert stats["rejected"] == 1
+        assert stats["running"] == 0
+        assert stats["queued"] == 0
+
+    asyncio.run(main())
+
+
+def test_upstream_limit_is_taken_before_global_slot():
+    """饱和上游前排队的请求不占用全局名额，其他上游照常放行；排队超时返回 AdmissionRejected"""
+    pytest.importorskip("aiohttp")
+    from openai_client import UpstreamLimit
+
+    async def through(scheduler, upstream, entered, release, caller):
+        async with upstream.acquire(0.05), scheduler.slot("m", caller):
+            entered.append(caller)
+            await release.wait()
+
+    async def main():
+        scheduler = AdmissionScheduler(max_concurrency=2)
+        busy, other = UpstreamLimit(1), UpstreamLimit(1)
+        entered = []
+        release = asyncio.Event()
+        holder = asyncio.create_task(through(scheduler, busy, entered, release, "a"))
+        while not entered:
+            await asyncio.sleep(0)
+        queued = asyncio.create_task(through(scheduler, busy, entered, release, "b"))
+        await asyncio.sleep(0.01)
+        assert busy.stats()["waiting"] == 1
+        assert scheduler.stats()["running"] == 1
+        async with other.acquire(0.05), scheduler.slot("m", "c"):
+            entered.append("c")
+        with pytest.raises(AdmissionRejected):
+            await queued
+        release.set()
+        await holder
+        return entered, busy.stats(), scheduler.stats()
+
+    entered, busy_stats, stats = asyncio.run(main())
+    assert entered == ["a", "c"]
+    assert busy_stats["rejected"] == 1 and busy_stats["in_flight"] == 0
+    assert stats["running"] == 0 and stats["queued"] == 0
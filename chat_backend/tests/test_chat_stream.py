@@ -0,0 +1,132 @@
+import asyncio
+from datetime import datetime
+
+import pytest
+
+from services import chat_stream
+from services.chat_stream import StreamSession
+
+
+class _SlowLLM:
+    async def get_response_stream(self, messages, model):
+        for i in range(1000):
+            yield f"c{i} "
+            await asyncio.sleep(0.01)
+
+
+class _SlowStore:
+    def __init__(self):
+        self.final = None
+
+    async def update_message_content_and_time(self, message_id, content, created_at=None):
+        await asyncio.sleep(0.05)
+        self.final = content
+        return True
+
+    async def append_message_content(self, message_id, delta, offset):
+        return False
+
+
+@pytest.fixture
+def store(monkeypatch):
+    store = _SlowStore()
+    monkeypatch.setattr(chat_stream, "async_conversation_manager", store)
+    monkeypatch.setattr(chat_stream.Config, "STREAM_CHECKPOINT_BYTES", 0)
+    monkeypatch.setattr(chat_stream.Config, "STREAM_CHECKPOINT_INTERVAL", 0)
+    return store
+
+
+def _session():
+    return StreamSession("s1", _SlowLLM(), [], "m", assistant_msg_id=1, now=datetime.now())
+
+
+def test_repeated_stop_during_final_persist_still_completes(store):
+    async def main():
+        session = _session()
+        session.start()
+        await asyncio.sleep(0.05)
+        session.stop()
+        await asyncio.sleep(0.01)  # 最终落库进行中
+        session.stop()
+        session.stop()
+        assert await session.wait_completed(1.0)
+        assert session.completed_at is not None
+        assert store.final == session.full_response
+
+    asyncio.run(main())
+
+
+def test_second_cancel_during_final_persist_still_signals_subscribers(store):
+    async def main():
+        session = _session()
+        session.start()
+        chunks = []
+
+        async def subscriber():
+            async for chunk in session.iter_chunks():
+                chunks.append(chunk)
+
+        reader = asyncio.create_task(subscriber())
+        await asyncio.sleep(0.05)
+        session.task.cancel()
+        await asyncio.sleep(0.01)
+        session.task.cancel()  # 例如应用关闭时再次取消
+        await asyncio.wait_for(reader, 1.0)
+        assert session.is_completed()
+        assert "".join(chunks) == session.full_response
+        await asyncio.sleep(0.1)
+        assert store.final == session.full_response
+
+    asyncio.run(main())
+
+
+def _spilling_session():
+    session = _session()
+    session.buffer.max_memory_bytes = 16
+    session.buffer.compact_every = 2
+    return session
+
+
+def test_reaped_session_closes_spill_file(store, monkeypatch):
+    async def main():
+        registry = chat_stream.StreamSessionRegistry(grace=0, max_age=0)
+        session = _spilling_session()
+        registry.add(session.session_id, session)
+        session.start()
+        await asyncio.sleep(0.2)
+        session.stop()
+        assert await session.wait_completed(1.0)
+        spill = session.buffer._spill
+        assert spill is not None and not spill.closed
+
+        assert registry.reap() == 1
+        assert spill.closed
+        assert registry.get(session.session_id) is None
+
+    asyncio.run(main())
+
+
+def test_removed_running_session_closes_buffer_after_last_reader(store):
+    async def main():
+        registry = chat_stream.StreamSessionRegistry(grace=60, max_age=0)
+        session = _spilling_session()
+        registry.add(session.session_id, session)
+        session.start()
+        chunks = []
+
+        async def subscriber():
+            async for chunk in session.iter_chunks():
+                chunks.append(chunk)
+                await asyncio.sleep(0.001)
+
+        reader = asyncio.create_task(subscriber())
+        await asyncio.sleep(0.2)
+        session.stop()
+        registry.remove(session.session_id)  # stop-stream 路径
+        spill = session.buffer._spill
+        assert spill is not None
+        await asyncio.wait_for(reader, 2.0)
+        assert "".join(chunks) == store.final
+        assert spill.closed
+
+    asyncio.run(main())
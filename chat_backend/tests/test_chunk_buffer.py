@@ -0,0 +1,29 @@
+from services.chunk_buffer import ChunkBuffer
+
+
+def test_spilled_chunks_replay_in_order():
+    buffer = ChunkBuffer(max_memory_bytes=256, compact_every=4)
+    chunks = [f"分片{i:04d}" for i in range(500)]
+    for chunk in chunks:
+        buffer.append(chunk)
+    assert buffer.spilled_bytes > 0
+    assert buffer.memory_bytes <= 256 + 4 * 20
+    assert buffer.chunks(0) == chunks
+    assert buffer.chunks(123, 130) == chunks[123:130]
+    assert buffer.text() == "".join(chunks)
+
+
+def test_close_releases_spill_file_and_content():
+    buffer = ChunkBuffer(max_memory_bytes=64, compact_every=2)
+    for i in range(100):
+        buffer.append(f"chunk-{i} ")
+    spill = buffer._spill
+    assert spill is not None and not spill.closed
+
+    buffer.close()
+    assert spill.closed
+    assert len(buffer) == 0
+    assert buffer.text() == ""
+    assert buffer.chunks(0) == []
+    assert buffer.stats()["memory_bytes"] == 0
+    buffer.close()
@@ -0,0 +1,19 @@
+import asyncio
+import os
+
+from services.completion_cache import CompletionCache
+
+
+def test_overwriting_disk_entry_counts_only_the_size_difference(tmp_path):
+    """同一个键反复写入磁盘层：计数等于实际文件大小，不会累加到触发误删"""
+
+    async def main():
+        cache = CompletionCache(1 << 20, 0, str(tmp_path), disk_max_bytes=1 << 20)
+        await cache.put("k", "a" * 100)
+        cache._disk_bytes = os.path.getsize(tmp_path / "k.json")
+        for text in ("b" * 300, "c" * 50, "c" * 50):
+            await cache.put("k", text)
+        return cache._disk_bytes
+
+    disk_bytes = asyncio.run(main())
+    assert disk_bytes == os.path.getsize(tmp_path / "k.json")
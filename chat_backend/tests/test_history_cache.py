@@ -0,0 +1,51 @@
+from conversation_manager.history_cache import HistoryCache
+
+
+def _msg(mid, content):
+    return {"id": mid, "role": "assistant", "content": content}
+
+
+def test_update_of_uncached_tail_between_select_and_put_is_not_cached():
+    cache = HistoryCache(1 << 20)
+    _, _, token = cache.snapshot("c1")
+    cache.put("c1", [_msg(10, "hi")], token)
+
+    # 读取方拿到快照并读到尚未缓存的占位消息 11（content 为空）……
+    cached, last_id, token = cache.snapshot("c1")
+    assert last_id == 10
+    stale = cached + [_msg(11, "")]
+    # ……此时流式回复写入最终内容
+    cache.truncate_from_message(11)
+    cache.put("c1", stale, token)
+
+    cached, last_id, _ = cache.snapshot("c1")
+    assert last_id == 10
+    assert [m["id"] for m in cached] == [10]
+
+
+def test_unrelated_invalidation_does_not_block_put():
+    cache = HistoryCache(1 << 20)
+    _, _, token = cache.snapshot("c1")
+    cache.put("c1", [_msg(10, "hi")], token)
+
+    cached, _, token = cache.snapshot("c1")
+    cache.truncate_from_message(99)  # 另一个未缓存会话里的消息
+    cache.put("c1", cached + [_msg(11, "done")], token)
+
+    cached, last_id, _ = cache.snapshot("c1")
+    assert last_id == 11
+    assert cached[-1]["content"] == "done"
+
+
+def test_forgotten_invalidations_reject_conservatively():
+    cache = HistoryCache(1 << 20)
+    _, _, token = cache.snapshot("c1")
+    cache.put("c1", [_msg(10, "hi")], token)
+
+    cached, _, token = cache.snapshot("c1")
+    for mid in range(1000, 1000 + 5000):
+        cache.truncate_from_message(mid)
+    cache.put("c1", cached + [_msg(11, "")], token)
+
+    _, last_id, _ = cache.snapshot("c1")
+    assert last_id == 10
@@ -0,0 +1,25 @@
+from config import Config
+from openai_client import normalize_base_url
+from services.project_upstream import project_base_url, upstream_allowed
+
+
+def test_only_allowlisted_llm_url_overrides_default(monkeypatch):
+    monkeypatch.setattr(Config, "UPSTREAM_ALLOWLIST", "http://llm-a:8000/v1, http://llm-b:8000/v1/")
+    assert project_base_url("http://llm-a:8000/v1/chat/completions") == "http://llm-a:8000/v1"
+    assert project_base_url("http://llm-b:8000/v1") == "http://llm-b:8000/v1"
+    # 白名单以外的地址（可能被任意写入）不路由，也就不会带上全局 API key
+    assert project_base_url("http://evil.example/v1/chat/completions") is None
+    assert not upstream_allowed("http://evil.example/v1")
+
+
+def test_empty_and_schema_default_llm_url_mean_no_override(monkeypatch):
+    monkeypatch.setattr(Config, "UPSTREAM_ALLOWLIST", normalize_base_url(Config.PROJECT_DEFAULT_LLM_URL))
+    assert project_base_url(None) is None
+    assert project_base_url("  ") is None
+    assert project_base_url(Config.PROJECT_DEFAULT_LLM_URL) is None
+
+
+def test_empty_allowlist_disables_overrides(monkeypatch):
+    monkeypatch.setattr(Config, "UPSTREAM_ALLOWLIST", "")
+    assert project_base_url("http://llm-a:8000/v1") is None
+
@@ -0,0 +1,117 @@
+import asyncio
+
+from services.singleflight import SingleFlight
+
+
+async def _upstream(started):
+    started.append(True)
+    for i in range(5):
+        await asyncio.sleep(0.01)
+        yield f"c{i} "
+
+
+def test_joined_stream_shares_upstream_and_reports_joined():
+    async def main():
+        flights = SingleFlight()
+        started = []
+        first, first_joined = flights.stream("k", lambda: _upstream(started))
+        second, second_joined = flights.stream("k", lambda: _upstream(started))
+
+        async def read(chunks):
+            return "".join([c async for c in chunks])
+
+        texts = await asyncio.gather(read(first), read(second))
+        return first_joined, second_joined, texts, started, flights.stats()
+
+    first_joined, second_joined, texts, started, stats = asyncio.run(main())
+    assert (first_joined, second_joined) == (False, True)
+    assert texts[0] == texts[1] == "c0 c1 c2 c3 c4 "
+    assert started == [True]
+    assert stats["leaders"] == 1 and stats["joined"] == 1
+    assert stats["in_flight_streams"] == 0
+
+
+def test_last_subscriber_leaving_cancels_upstream():
+    async def main():
+        flights = SingleFlight()
+        started = []
+        chunks, _ = flights.stream("k", lambda: _upstream(started))
+        assert await chunks.__anext__() == "c0 "
+        await chunks.aclose()
+        await asyncio.sleep(0)
+        return flights.stats()
+
+    stats = asyncio.run(main())
+    assert stats["in_flight_streams"] == 0
+    assert stats["subscribers"] == 0
+
+
+def test_unread_subscriber_closing_cancels_upstream():
+    async def main():
+        flights = SingleFlight()
+        started = []
+        chunks, _ = flights.stream("k", lambda: _upstream(started))
+        await chunks.aclose()
+        await asyncio.sleep(0)
+        return flights.stats()
+
+    stats = asyncio.run(main())
+    assert stats["in_flight_streams"] == 0
+    assert stats["subscribers"] == 0
+
+
+def test_slow_subscriber_replays_spilled_chunks(monkeypatch, tmp_path):
+    from config import Config
+
+    monkeypatch.setattr(Config, "STREAM_BACKPRESSURE_MAX_BYTES", 4)
+    monkeypatch.setattr(Config, "STREAM_BACKPRESSURE_SPILL_DIR", str(tmp_path))
+
+    async def main():
+        flights = SingleFlight()
+        started = []
+        fast, _ = flights.stream("k", lambda: _upstream(started))
+        slow, _ = flights.stream("k", lambda: _upstream(started))
+        fast_text = "".join([c async for c in fast])
+        spilled = flights.stats()["spilled_bytes"]
+        slow_text = "".join([c async for c in slow])
+        return fast_text, slow_text, spilled
+
+    fast_text, slow_text, spilled = asyncio.run(main())
+    assert fast_text == slow_text == "c0 c1 c2 c3 c4 "
+    assert spilled > 0
+
+
+def test_retry_within_linger_rejoins_orphaned_stream():
+    """客户端断线后重试：上游请求在 linger 期间保留，重试的请求接着使用它并从头收到完整输出"""
+
+    async def main():
+        flights = SingleFlight(linger=1)
+        started = []
+        first, _ = flights.stream("k", lambda: _upstream(started))
+        assert await first.__anext__() == "c0 "
+        await first.aclose()
+        await asyncio.sleep(0.02)
+        assert flights.stats()["lingering_streams"] == 1
+        retry, joined = flights.stream("k", lambda: _upstream(started))
+        text = "".join([c async for c in retry])
+        return joined, text, started
+
+    joined, text, started = asyncio.run(main())
+    assert joined
+    assert text == "c0 c1 c2 c3 c4 "
+    assert started == [True]
+
+
+def test_orphaned_stream_is_cancelled_after_linger():
+    async def main():
+        flights = SingleFlight(linger=0.02)
+        started = []
+        chunks, _ = flights.stream("k", lambda: _upstream(started))
+        await chunks.aclose()
+        assert flights.stats()["in_flight_streams"] == 1
+        await asyncio.sleep(0.05)
+        return flights.stats()
+
+    stats = asyncio.run(main())
+    assert stats["in_flight_streams"] == 0
+    assert stats["lingering_streams"] == 0
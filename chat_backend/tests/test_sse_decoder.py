@@ -0,0 +1,19 @@
+from services.sse_decoder import SSEDecoder, delta_content, json_loads
+
+
+def _contents(raw: bytes):
+    decoder = SSEDecoder()
+    events = decoder.feed(raw) + decoder.flush()
+    return [delta_content(json_loads(data)) for data in events if data != b"[DONE]"]
+
+
+def test_malformed_choices_are_skipped_not_raised():
+    raw = (
+        b'data: {"choices":{}}\n\n'
+        b'data: {"choices":["x"]}\n\n'
+        b'data: {"choices":[{"delta":"x"}]}\n\n'
+        b'data: {"choices":[{"delta":{"content":["x"]}}]}\n\n'
+        b'data: {"choices":[{"delta":{"content":"ok"}}]}\n\n'
+        b"data: [DONE]\n\n"
+    )
+    assert _contents(raw) == [None, None, None, None, "ok"]
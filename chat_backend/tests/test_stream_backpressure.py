@@ -0,0 +1,89 @@
+import sys
+import asyncio
+
+import pytest
+
+from services import stream_backpressure
+from services.stream_backpressure import POLICIES, backpressure_stream
+
+READERS = 1000
+FRAGMENTS = 200
+MAX_BYTES = 1024
+_ALPHABET = "ab字😀c"
+
+
+def _fragment(stream: int, i: int) -> str:
+    return _ALPHABET[(stream + i) % len(_ALPHABET)] * (1 + i % 3)
+
+
+async def _fast_upstream(stream: int):
+    for i in range(FRAGMENTS):
+        if i % 64 == 0:
+            await asyncio.sleep(0)
+        yield _fragment(stream, i)
+
+
+@pytest.fixture
+def pipes(monkeypatch):
+    """记录 backpressure_stream 创建的每个管道，便于检查各连接的内存峰值"""
+    created = []
+    original = stream_backpressure.BoundedStreamPipe
+
+    class RecordingPipe(original):
+        def __init__(self, *args, **kwargs):
+            super().__init__(*args, **kwargs)
+            created.append(self)
+
+    monkeypatch.setattr(stream_backpressure, "BoundedStreamPipe", RecordingPipe)
+    return created
+
+
+@pytest.mark.parametrize("policy", POLICIES)
+def test_many_slow_readers_stay_bounded_and_ordered(policy, pipes, tmp_path):
+    async def slow_reader(stream: int) -> str:
+        parts = []
+        async for text in backpressure_stream(_fast_upstream(stream), policy, MAX_BYTES, str(tmp_path)):
+            parts.append(text)
+            await asyncio.sleep(0.001)
+        return "".join(parts)
+
+    async def main():
+        return await asyncio.gather(*(slow_reader(i) for i in range(READERS)))
+
+    received = asyncio.run(main())
+
+    for stream, text in enumerate(received):
+        assert text == "".join(_fragment(stream, i) for i in range(FRAGMENTS))
+    assert len(pipes) == READERS
+    # 单个碎片入队前才检查上限，峰值最多超出一个（合并后的）碎片
+    largest = sys.getsizeof(_ALPHABET[-2] * 3)
+    for pipe in pipes:
+        assert pipe.peak_bytes <= MAX_BYTES + largest
+        assert pipe.queued_bytes == 0
+    if policy == "spill":
+        assert sum(p.spilled_bytes for p in pipes) > 0
+        assert all(p._spill is None for p in pipes)
+    else:
+        # 慢读者让上游在 block / coalesce 下被挂起
+        assert sum(p.blocked_seconds for p in pipes) > 0
+
+
+@pytest.mark.parametrize("policy", POLICIES)
+def test_reader_disconnect_closes_upstream(policy, tmp_path):
+    closed = []
+
+    async def upstream():
+        try:
+            for i in range(FRAGMENTS):
+                yield _fragment(0, i)
+        finally:
+            closed.append(True)
+
+    async def main():
+        stream = backpressure_stream(upstream(), policy, MAX_BYTES, str(tmp_path))
+        first = await stream.__anext__()
+        await stream.aclose()
+        return first
+
+    assert asyncio.run(main()).startswith(_fragment(0, 0))
+    assert closed == [True]
@@ -1,6 +1,7 @@
 import asyncio
 import os
 import json
+import math
 import logging
 import weakref
 from typing import Any
@@ -14,6 +15,7 @@ from fastapi.responses import JSONResponse
 from config import Config
 from services.server_info import startup_banner
 from poe_client import PoeClient
+from utils.admission import AdmissionRejected
 
 logger = logging.getLogger(__name__)
 
@@ -95,6 +97,22 @@ def create_app() -> FastAPI:
             }
         )
 
+    @app.exception_handler(AdmissionRejected)
+    async def admission_rejected_handler(request: Request, exc: AdmissionRejected):
+        # 上游准入排队超时：请求未发往 Poe，客户端稍后重试
+        logger.warning(f"Admission rejected: {exc}")
+        return JSONResponse(
+            status_code=429,
+            headers={"Retry-After": str(max(1, math.ceil(exc.retry_after)))},
+            content={
+                "error": {
+                    "message": str(exc),
+                    "type": "rate_limit_error",
+                    "code": "rate_limit_exceeded",
+                }
+            }
+        )
+
     @app.middleware("http")
     async def preprocess_request(request: Request, call_next):
         if request.url.path == "/v1/chat/completions" and request.method == "POST" and (request.headers.get("content-type") or "").startswith("application/json"):
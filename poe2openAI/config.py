@@ -10,6 +10,30 @@ class Config:
     TIMEOUT_GRACEFUL_SHUTDOWN = 300  # 优雅关闭超时时间
     TIMEOUT_HTTP = 0  # HTTP 请求超时，0 表示无限制
 
+    # 流式响应分片合并：窗口内的细碎分片合并成一帧 SSE，任一项为 0 表示关闭；请求头 X-Stream-Coalesce: off 可单独关闭
+    STREAM_COALESCE_MS = float(os.getenv("STREAM_COALESCE_MS", "20"))  # 最长合并等待毫秒数
+    STREAM_COALESCE_BYTES = int(os.getenv("STREAM_COALESCE_BYTES", "256"))  # 累积到该字节数立即发送
+    # 上游与客户端之间的有界缓冲（直连上游的流式响应）：超过上限时 block 挂起上游 / coalesce 合并积压后挂起 / spill 写入临时文件
+    STREAM_BACKPRESSURE_POLICY = os.getenv("STREAM_BACKPRESSURE_POLICY", "coalesce")
+    STREAM_BACKPRESSURE_MAX_BYTES = int(os.getenv("STREAM_BACKPRESSURE_MAX_BYTES", str(256 * 1024)))
+    STREAM_BACKPRESSURE_SPILL_DIR = os.getenv("STREAM_BACKPRESSURE_SPILL_DIR") or None
+    # 非流式补全结果缓存（默认关闭）：键为 (模型, 消息, 采样参数) 的规范化哈希；请求头 Cache-Control: no-cache 跳过读取，no-store 不读不写
+    COMPLETION_CACHE_ENABLED = os.getenv("COMPLETION_CACHE_ENABLED", "0") == "1"
+    COMPLETION_CACHE_MAX_TEMPERATURE = float(os.getenv("COMPLETION_CACHE_MAX_TEMPERATURE", "0"))  # 只缓存 temperature 不高于该值的请求
+    COMPLETION_CACHE_MAX_BYTES = int(os.getenv("COMPLETION_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))  # 内存层上限
+    COMPLETION_CACHE_TTL = float(os.getenv("COMPLETION_CACHE_TTL", "86400"))  # 条目有效秒数，0 为不过期
+    COMPLETION_CACHE_DIR = os.getenv("COMPLETION_CACHE_DIR") or None  # 磁盘层目录，不设置则只用内存层
+    COMPLETION_CACHE_DISK_MAX_BYTES = int(os.getenv("COMPLETION_CACHE_DISK_MAX_BYTES", str(1024 * 1024 * 1024)))  # 磁盘层上限，0 为不限
+    # 合并完全相同且正在进行中的补全请求（同一 API key、同一请求体），后到的请求复用第一个请求的结果 / 流
+    SINGLEFLIGHT_ENABLED = os.getenv("SINGLEFLIGHT_ENABLED", "1") == "1"
+    SINGLEFLIGHT_LINGER_SECONDS = float(os.getenv("SINGLEFLIGHT_LINGER_SECONDS", "5"))  # 流式请求的订阅者全部断开后保留上游请求的秒数，供断线重试接着使用
+    # 上游准入调度：总并发 / 每个模型 / 每个调用方（API key）的并发上限，0 为不限；超出的请求按调用方公平排队
+    ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "64"))  # 同时发往上游的请求总数上限
+    ADMISSION_MODEL_CONCURRENCY = int(os.getenv("ADMISSION_MODEL_CONCURRENCY", "16"))  # 每个模型的默认并发上限
+    ADMISSION_MODEL_LIMITS = os.getenv("ADMISSION_MODEL_LIMITS", "")  # 单独设置的模型上限，如 "GPT-5-Pro=2,Claude-Opus-4.6=4"
+    ADMISSION_KEY_CONCURRENCY = int(os.getenv("ADMISSION_KEY_CONCURRENCY", "0"))  # 每个调用方的并发上限
+    ADMISSION_MAX_QUEUE_WAIT = float(os.getenv("ADMISSION_MAX_QUEUE_WAIT", "120"))  # 最长排队秒数，超过返回 429，0 为一直等待
+
     # 附件相关配置
     ATTACHMENTS_DIR = os.getenv("ATTACHMENTS_DIR", "attachments")
     ATTACHMENT_MAX_SIZE_MB = float(os.getenv("ATTACHMENT_MAX_SIZE_MB", "20"))  # 单文件最大MB
@@ -2,6 +2,7 @@ import fastapi_poe as fp
 from typing import AsyncGenerator, List, Dict, Any
 import logging
 import json
+from utils.admission import admission
 
 logger = logging.getLogger(__name__)
 
@@ -21,6 +22,17 @@ class PoeClient:
         return role_mapping.get((role or "user").lower(), 'user')
     
     async def get_response_stream(self, messages: List[Dict[str, Any]], model: str) -> AsyncGenerator[str, None]:
+        # 先取得上游准入名额再请求 Poe；排队超时的 AdmissionRejected 不转成 "Error: ..." 文本，由路由返回 429
+        async with admission.slot(model):
+            stream = self._poe_stream(messages, model)
+            try:
+                async for text in stream:
+                    yield text
+            finally:
+                # 调用方提前停止读取时立即关闭 Poe 请求，名额随之归还
+                await stream.aclose()
+
+    async def _poe_stream(self, messages: List[Dict[str, Any]], model: str) -> AsyncGenerator[str, None]:
         try:
             poe_messages: List[fp.ProtocolMessage] = []
             for i, msg in enumerate(messages):
@@ -2,10 +2,10 @@ import json
 import time
 import uuid
 import logging
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional
 
 from fastapi import APIRouter, Request, Depends, HTTPException, UploadFile
-from fastapi.responses import StreamingResponse
+from fastapi.responses import StreamingResponse, JSONResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
 from config import Config
@@ -21,6 +21,13 @@ from models import (
 )
 from logger import request_logger
 from utils.attachments import save_upload, public_url, attachments_meta
+from utils.stream_coalesce import coalesce_chunks, coalesce_enabled
+from utils.stream_backpressure import backpressure_stream
+from utils.completion_cache import (
+    CACHE_OFF, CACHE_USE, cache_key, cache_mode, cacheable_response, completion_cache,
+)
+from utils.singleflight import caller_scope, flights, singleflight_enabled
+from utils.admission import AdmissionRejected, set_admission_caller
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -77,13 +84,52 @@ class SafeStreamWrapper:
             await self.close()
 
 
-async def _stream_response(parsed: ChatCompletionRequest, request_obj: Request):
+async def _complete_with_cache(
+    poe_client, parsed: ChatCompletionRequest, messages: List[Dict[str, Any]], headers, api_key: Optional[str] = None
+):
+    """
+    非流式补全：按 Config.COMPLETION_CACHE_* 读写结果缓存（缓存 Poe 原始文本），
+    并与完全相同的进行中请求合并（singleflight）。
+    返回 (原始文本, 附加响应头)；响应头含 X-Cache（启用缓存时）与 X-Singleflight: joined（复用了进行中的请求时）。
+    """
+    params = parsed.model_dump()
+    mode = cache_mode(headers, params)
+    share = singleflight_enabled(headers)
+    if mode == CACHE_OFF and not share:
+        return await poe_client.get_response_complete(messages, parsed.model), {}
+    key = cache_key(parsed.model, messages, params, scope="poe")
+    extra_headers: Dict[str, str] = {}
+    if mode == CACHE_USE:
+        cached = await completion_cache.get(key)
+        if cached is not None:
+            return cached, {"X-Cache": "HIT"}
+        extra_headers["X-Cache"] = "MISS"
+    elif mode != CACHE_OFF:
+        completion_cache.record_refresh()
+        extra_headers["X-Cache"] = "REFRESH"
+
+    async def call():
+        text = await poe_client.get_response_complete(messages, parsed.model)
+        if mode != CACHE_OFF and cacheable_response(text):
+            await completion_cache.put(key, text)
+        return text
+
+    if not share:
+        return await call(), extra_headers
+    text, joined = await flights.do(f"{key}:{caller_scope(api_key)}", call)
+    if joined:
+        extra_headers["X-Singleflight"] = "joined"
+    return text, extra_headers
+
+
+async def _stream_response(parsed: ChatCompletionRequest, request_obj: Request, api_key: Optional[str] = None):
     poe_client = request_obj.app.state.poe_client
     if not poe_client:
         raise HTTPException(status_code=500, detail="Poe client not initialized")
 
     request_id = f"chatcmpl-{uuid.uuid4().hex}"
     created_time = int(time.time())
+    coalesce = coalesce_enabled(request_obj.headers)
 
     # Convert messages
     messages: List[Dict[str, Any]] = []
@@ -101,15 +147,37 @@ async def _stream_response(parsed: ChatCompletionRequest, request_obj: Request):
             msg_dict["tool_call_id"] = msg.tool_call_id
         messages.append(msg_dict)
 
+    flight_key = None
+    if singleflight_enabled(request_obj.headers):
+        key = cache_key(parsed.model, messages, parsed.model_dump(), scope="poe")
+        flight_key = f"{key}:{caller_scope(api_key)}"
+
     async def gen():
         full_raw = ""
         full_client = ""
-        wrapper = SafeStreamWrapper(
-            poe_client.get_response_stream(messages, parsed.model),
-            request_obj.app.state.active_generators,
-        )
+        wrapper = None
+
+        def open_upstream():
+            nonlocal wrapper
+            wrapper = SafeStreamWrapper(
+                poe_client.get_response_stream(messages, parsed.model),
+                request_obj.app.state.active_generators,
+            )
+            return wrapper.iterate()
+
+        joined = False
+        if flight_key is not None:
+            # 与完全相同的进行中请求共用一个上游流：后加入者先收到已产出的前缀，再跟随实时分片；
+            # 上游流归 flight 所有，最后一个订阅者断开时才关闭
+            chunks, joined = flights.stream(flight_key, open_upstream)
+        else:
+            # 有界缓冲把上游读取与客户端写出解耦：慢客户端不会让内存无限增长（策略见 Config.STREAM_BACKPRESSURE_*）
+            chunks = backpressure_stream(open_upstream())
+        # 合并后再做域名替换与组帧，跨分片的域名也能被替换
+        if coalesce:
+            chunks = coalesce_chunks(chunks)
         try:
-            async for chunk in wrapper.iterate():
+            async for chunk in chunks:
                 if chunk:
                     # 原始串用于日志
                     full_raw += chunk
@@ -140,15 +208,20 @@ async def _stream_response(parsed: ChatCompletionRequest, request_obj: Request):
             )
             yield f"data: {done.model_dump_json()}\n\n"
             yield "data: [DONE]\n\n"
-            # 日志记录原始完整文本
-            request_logger.log_stream_request_response(
-                parsed.model_dump(), full_raw, 0.0
-            )
+            # 日志记录原始完整文本；复用进行中请求的流不是新的模型输出，由发起者记录一次
+            if not joined:
+                request_logger.log_stream_request_response(
+                    parsed.model_dump(), full_raw, 0.0
+                )
         except Exception as e:
-            err = {"error": {"message": str(e), "type": "internal_error"}}
+            err_type = "rate_limit_error" if isinstance(e, AdmissionRejected) else "internal_error"
+            err = {"error": {"message": str(e), "type": err_type}}
             yield f"data: {json.dumps(err, ensure_ascii=False)}\n\n"
         finally:
-            await wrapper.close()
+            # 先停掉读取上游的后台任务，再关闭上游流（合并请求时由 flight 负责关闭）
+            await chunks.aclose()
+            if flight_key is None and wrapper is not None:
+                await wrapper.close()
 
     return StreamingResponse(
         gen(),
@@ -167,6 +240,8 @@ async def chat_completions(request: Request, api_key: str = Depends(verify_api_k
     poe_client = request.app.state.poe_client
     if not poe_client:
         raise HTTPException(status_code=500, detail="Poe client not initialized")
+    # 上游准入调度按调用方公平排队
+    set_admission_caller(api_key)
 
     content_type = request.headers.get("content-type", "")
     # multipart handling
@@ -277,7 +352,7 @@ async def chat_completions(request: Request, api_key: str = Depends(verify_api_k
             )
 
         if parsed.stream:
-            resp = await _stream_response(parsed, request)
+            resp = await _stream_response(parsed, request, api_key)
             # 此处日志不包含模型响应内容，仅记录请求元信息
             request_logger.log_request_response(pre_log, {"stream": True}, 0.0)
             return resp
@@ -305,6 +380,9 @@ async def chat_completions(request: Request, api_key: str = Depends(verify_api_k
                 )
                 # 返回给客户端的文本（进行域名替换）
                 text_resp_for_client = _replace_poe_domain(text_resp_original)
+            except AdmissionRejected:
+                # 由应用级异常处理返回 429
+                raise
             except Exception as e:
                 raise HTTPException(status_code=500, detail=str(e))
 
@@ -368,7 +446,7 @@ async def chat_completions(request: Request, api_key: str = Depends(verify_api_k
         raise HTTPException(status_code=400, detail=f"Invalid request: {e}")
 
     if parsed.stream:
-        return await _stream_response(parsed, request)
+        return await _stream_response(parsed, request, api_key)
 
     # Non-streaming JSON branch
     messages_oai: List[Dict[str, Any]] = []
@@ -386,9 +464,9 @@ async def chat_completions(request: Request, api_key: str = Depends(verify_api_k
             d["tool_call_id"] = msg.tool_call_id
         messages_oai.append(d)
 
-    # Poe 原始响应
-    text_resp_original = await request.app.state.poe_client.get_response_complete(
-        messages_oai, parsed.model
+    # Poe 原始响应（可能来自结果缓存）
+    text_resp_original, extra_headers = await _complete_with_cache(
+        request.app.state.poe_client, parsed, messages_oai, request.headers, api_key
     )
     # 返回给客户端的文本（替换域名）
     text_resp_for_client = _replace_poe_domain(text_resp_original)
@@ -431,7 +509,11 @@ async def chat_completions(request: Request, api_key: str = Depends(verify_api_k
         usage=resp_for_client.usage,
     )
 
-    request_logger.log_request_response(
-        parsed.model_dump(), resp_for_log.model_dump(), 0.0
-    )
-    return resp_for_client
\ No newline at end of file
+    # 缓存命中与复用进行中请求的结果不是新的模型输出，不写训练日志
+    if extra_headers.get("X-Cache") != "HIT" and "X-Singleflight" not in extra_headers:
+        request_logger.log_request_response(
+            parsed.model_dump(), resp_for_log.model_dump(), 0.0
+        )
+    if not extra_headers:
+        return resp_for_client
+    return JSONResponse(resp_for_client.model_dump(), headers=extra_headers)
\ No newline at end of file
@@ -8,6 +8,9 @@ from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 
 from config import Config
 from models import ModelInfo, ModelListResponse
+from utils.completion_cache import completion_cache
+from utils.singleflight import flights
+from utils.admission import admission
 
 router = APIRouter()
 logger = logging.getLogger(__name__)
@@ -48,6 +51,9 @@ async def health_check(request: Request):
         "timestamp": datetime.now().isoformat(),
         "poe_client": "initialized" if poe_client else "failed",
         "active_generators": len(active_generators),
+        "completion_cache": completion_cache.stats(),
+        "singleflight": flights.stats(),
+        "admission": admission.stats(),
     }
 
 @router.get("/files/{filename}")
@@ -0,0 +1,230 @@
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager
+from contextvars import ContextVar
+from typing import Any, Deque, Dict, Optional
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# 当前请求的调用方（API key 摘要），由路由在进入时设置；上游客户端据此做按调用方的限流与公平排队。
+# 后台任务（流式会话、singleflight）在创建时复制上下文，沿用发起请求的调用方
+admission_caller: ContextVar[str] = ContextVar("admission_caller", default="anonymous")
+# 排队耗时样本数（用于 /health 中的分位数）
+_WAIT_SAMPLES = 1000
+
+
+def set_admission_caller(api_key: Optional[str]):
+    """路由入口调用：以 API key 摘要标识调用方，不保存明文 key"""
+    digest = hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+    admission_caller.set(f"key:{digest}")
+
+
+def parse_model_limits(spec: str) -> Dict[str, int]:
+    """"GPT-5-Pro=2,Claude-Opus-4.6=4" -> {"GPT-5-Pro": 2, "Claude-Opus-4.6": 4}"""
+    limits: Dict[str, int] = {}
+    for item in (spec or "").split(","):
+        name, sep, value = item.strip().rpartition("=")
+        if sep and name.strip():
+            limits[name.strip()] = int(value)
+    return limits
+
+
+class AdmissionRejected(Exception):
+    """排队超过最长等待时间，请求未发往上游"""
+
+    def __init__(self, message: str, retry_after: float):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class _Waiter:
+    __slots__ = ("model", "caller", "future", "enqueued_at")
+
+    def __init__(self, model: str, caller: str, future: asyncio.Future, enqueued_at: float):
+        self.model = model
+        self.caller = caller
+        self.future = future
+        self.enqueued_at = enqueued_at
+
+
+class AdmissionScheduler:
+    """
+    上游请求准入调度：总并发、每个模型、每个调用方各有并发上限（0 为不限），超出的请求排队而不是直接打到上游。
+    - 公平排队：每个调用方一个 FIFO 队列，空出名额时按调用方轮转放行，单个调用方的突发请求不会挤占其他调用方；
+      某个调用方的队首请求因模型 / 调用方上限暂不能放行时，跳过它检查下一个调用方；
+    - 排队超过 max_wait 秒抛出 AdmissionRejected（路由返回 429），不会无限等待；
+    - 流式请求的名额持续到流结束。仅在事件循环线程中使用。
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = 0,
+        model_concurrency: int = 0,
+        model_limits: Optional[Dict[str, int]] = None,
+        key_concurrency: int = 0,
+        max_wait: float = 0,
+    ):
+        self.max_concurrency = max(0, int(max_concurrency))
+        self.model_concurrency = max(0, int(model_concurrency))
+        self.model_limits = dict(model_limits or {})
+        self.key_concurrency = max(0, int(key_concurrency))
+        self.max_wait = max(0.0, float(max_wait))
+        self._queues: "OrderedDict[str, Deque[_Waiter]]" = OrderedDict()
+        self._running = 0
+        self._running_models: Dict[str, int] = {}
+        self._running_callers: Dict[str, int] = {}
+        self._waits: Deque[float] = deque(maxlen=_WAIT_SAMPLES)
+        self.admitted = 0
+        self.queued_total = 0
+        self.rejected = 0
+
+    @property
+    def queued(self) -> int:
+        return sum(len(q) for q in self._queues.values())
+
+    def _model_limit(self, model: str) -> int:
+        return self.model_limits.get(model, self.model_concurrency)
+
+    def _allowed(self, model: str, caller: str) -> bool:
+        if self.max_concurrency and self._running >= self.max_concurrency:
+            return False
+        limit = self._model_limit(model)
+        if limit and self._running_models.get(model, 0) >= limit:
+            return False
+        if self.key_concurrency and self._running_callers.get(caller, 0) >= self.key_concurrency:
+            return False
+        return True
+
+    def _acquire(self, model: str, caller: str):
+        self._running += 1
+        self._running_models[model] = self._running_models.get(model, 0) + 1
+        self._running_callers[caller] = self._running_callers.get(caller, 0) + 1
+        self.admitted += 1
+
+    def _release(self, model: str, caller: str):
+        """归还名额并放行排队者；在请求的 finally 中调用，不能抛出异常"""
+        self._running = max(0, self._running - 1)
+        for counts, name in ((self._running_models, model), (self._running_callers, caller)):
+            left = counts.get(name, 0) - 1
+            if left > 0:
+                counts[name] = left
+            else:
+                counts.pop(name, None)
+        try:
+            self._dispatch()
+        except Exception:
+            logger.exception("Admission dispatch failed")
+
+    def _next_caller(self) -> Optional[str]:
+        """轮转顺序中第一个队首请求可以放行的调用方；顺带移除已取消 / 超时但尚未 _forget 的等待者"""
+        for caller in list(self._queues):
+            queue = self._queues[caller]
+            while queue and queue[0].future.done():
+                queue.popleft()
+            if not queue:
+                del self._queues[caller]
+                continue
+            if self._allowed(queue[0].model, caller):
+                return caller
+        return None
+
+    def _dispatch(self):
+        """按调用方轮转放行排队的请求，直到没有可放行的为止"""
+        now = asyncio.get_running_loop().time()
+        while self._queues:
+            if self.max_concurrency and self._running >= self.max_concurrency:
+                return
+            caller = self._next_caller()
+            if caller is None:
+                return
+            queue = self._queues[caller]
+            waiter = queue.popleft()
+            if queue:
+                # 被放行的调用方排到轮转顺序末尾
+                self._queues.move_to_end(caller)
+            else:
+                del self._queues[caller]
+            self._acquire(waiter.model, caller)
+            self._waits.append(now - waiter.enqueued_at)
+            waiter.future.set_result(None)
+
+    def _forget(self, waiter: _Waiter):
+        queue = self._queues.get(waiter.caller)
+        if queue is None:
+            return
+        try:
+            queue.remove(waiter)
+        except ValueError:
+            return
+        if not queue:
+            del self._queues[waiter.caller]
+
+    @asynccontextmanager
+    async def slot(self, model: str, caller: Optional[str] = None):
+        """占用一个上游名额直到退出；需要排队时按公平顺序等待"""
+        caller = caller or admission_caller.get()
+        if not self._queues and self._allowed(model, caller):
+            # 没有排队者时直接放行
+            self._acquire(model, caller)
+            self._waits.append(0.0)
+        else:
+            loop = asyncio.get_running_loop()
+            waiter = _Waiter(model, caller, loop.create_future(), loop.time())
+            self._queues.setdefault(caller, deque()).append(waiter)
+            self.queued_total += 1
+            self._dispatch()
+            try:
+                if self.max_wait:
+                    await asyncio.wait_for(waiter.future, self.max_wait)
+                else:
+                    await waiter.future
+            except BaseException as e:
+                if waiter.future.done() and not waiter.future.cancelled():
+                    # 放行与超时 / 取消同时发生：名额已计入，归还
+                    self._release(model, caller)
+                else:
+                    self._forget(waiter)
+                if isinstance(e, asyncio.TimeoutError):
+                    self.rejected += 1
+                    raise AdmissionRejected(
+                        f"Upstream busy: waited {self.max_wait:g}s for model {model}", retry_after=self.max_wait
+                    ) from None
+                raise
+        try:
+            yield
+        finally:
+            self._release(model, caller)
+
+    def stats(self) -> Dict[str, Any]:
+        waits = sorted(self._waits)
+
+        def pct(p: float) -> float:
+            return round(waits[min(len(waits) - 1, int(len(waits) * p))] * 1000, 1) if waits else 0.0
+
+        return {
+            "max_concurrency": self.max_concurrency,
+            "model_concurrency": self.model_concurrency,
+            "model_limits": self.model_limits,
+            "key_concurrency": self.key_concurrency,
+            "max_wait_seconds": self.max_wait,
+            "running": self._running,
+            "running_by_model": dict(self._running_models),
+            "queued": self.queued,
+            "queued_callers": len(self._queues),
+            "admitted": self.admitted,
+            "queued_total": self.queued_total,
+            "rejected": self.rejected,
+            "queue_wait_ms": {"p50": pct(0.5), "p95": pct(0.95), "p99": pct(0.99), "max": pct(1.0)},
+        }
+
+
+admission = AdmissionScheduler(
+    Config.ADMISSION_MAX_CONCURRENCY,
+    Config.ADMISSION_MODEL_CONCURRENCY,
+    parse_model_limits(Config.ADMISSION_MODEL_LIMITS),
+    Config.ADMISSION_KEY_CONCURRENCY,
+    Config.ADMISSION_MAX_QUEUE_WAIT,
+)
@@ -0,0 +1,250 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+from config import Config
+
+logger = logging.getLogger(__name__)
+
+# 影响模型输出的请求参数，参与缓存键计算；stream、user 等不影响输出的字段不参与
+_KEY_PARAMS = (
+    "temperature", "top_p", "n", "max_tokens", "stop", "presence_penalty", "frequency_penalty",
+    "logit_bias", "seed", "response_format", "functions", "function_call", "tools", "tool_choice",
+)
+# 缓存模式：use 读写缓存；refresh 不读缓存但写入新结果（Cache-Control: no-cache）；off 不读不写（no-store）
+CACHE_USE, CACHE_REFRESH, CACHE_OFF = "use", "refresh", "off"
+
+
+def cache_mode(headers, params: Dict[str, Any]) -> str:
+    """
+    按全局配置、请求的采样参数和 Cache-Control 请求头决定本次请求的缓存模式。
+    只有 temperature 不高于 COMPLETION_CACHE_MAX_TEMPERATURE 的请求才缓存（默认只缓存 temperature=0），
+    温度更高的请求每次结果本应不同。
+    """
+    if not Config.COMPLETION_CACHE_ENABLED:
+        return CACHE_OFF
+    temperature = params.get("temperature")
+    if temperature is None or temperature > Config.COMPLETION_CACHE_MAX_TEMPERATURE:
+        return CACHE_OFF
+    directives = {d.strip().split("=")[0] for d in (headers.get("cache-control") or "").lower().split(",")}
+    if "no-store" in directives:
+        return CACHE_OFF
+    if "no-cache" in directives:
+        return CACHE_REFRESH
+    return CACHE_USE
+
+
+def cache_key(model: str, messages: List[Dict[str, Any]], params: Dict[str, Any], scope: str = "") -> str:
+    """(scope, model, messages, 采样参数) 的规范化 JSON 的 SHA-256；键顺序、空白不影响结果"""
+    canonical = json.dumps(
+        {
+            "scope": scope,
+            "model": model,
+            "messages": messages,
+            "params": {k: params.get(k) for k in _KEY_PARAMS if params.get(k) is not None},
+        },
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+        default=str,
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+def cacheable_response(text: Optional[str]) -> bool:
+    """空响应与客户端以文本形式返回的错误（"Error: ..."）不缓存"""
+    return bool(text) and not text.startswith("Error:")
+
+
+class CompletionCache:
+    """
+    非流式补全结果缓存：按字节数限制的内存 LRU，可选的磁盘层（重启后仍有效），条目带 TTL。
+    - 内存层查找在事件循环线程内完成，磁盘读写放到线程池；
+    - 磁盘层每个条目一个 <key>.json 文件（先写临时文件再 rename），超过 disk_max_bytes 时删除最旧的文件；
+    - 磁盘命中的条目提升回内存层。
+    """
+
+    def __init__(self, max_bytes: int, ttl: float, disk_dir: Optional[str] = None, disk_max_bytes: int = 0):
+        self.max_bytes = max(0, int(max_bytes))
+        self.ttl = max(0.0, float(ttl))
+        self.disk_dir = disk_dir or None
+        self.disk_max_bytes = max(0, int(disk_max_bytes))
+        self._entries: "OrderedDict[str, Tuple[float, str, int]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._disk_bytes: Optional[int] = None
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.refreshes = 0
+        self.stores = 0
+        self.evictions = 0
+
+    # ---------- public ----------
+    async def get(self, key: str) -> Optional[str]:
+        text = self._memory_get(key)
+        if text is not None:
+            return text
+        if self.disk_dir:
+            item = await asyncio.to_thread(self._disk_get, key)
+            if item is not None:
+                expires_at, text = item
+                self._memory_put(key, text, expires_at)
+                with self._lock:
+                    self.disk_hits += 1
+                return text
+        with self._lock:
+            self.misses += 1
+        return None
+
+    async def put(self, key: str, text: str):
+        expires_at = time.time() + self.ttl if self.ttl else 0.0
+        self._memory_put(key, text, expires_at)
+        with self._lock:
+            self.stores += 1
+        if self.disk_dir:
+            try:
+                await asyncio.to_thread(self._disk_put, key, text, expires_at)
+            except OSError as e:
+                logger.warning("Completion cache disk write failed: %s", e)
+
+    def record_refresh(self):
+        with self._lock:
+            self.refreshes += 1
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            hits = self.memory_hits + self.disk_hits
+            lookups = hits + self.misses
+            return {
+                "max_bytes": self.max_bytes,
+                "bytes": self._bytes,
+                "entries": len(self._entries),
+                "ttl": self.ttl,
+                "disk_dir": self.disk_dir,
+                "disk_bytes": self._disk_bytes,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "refreshes": self.refreshes,
+                "stores": self.stores,
+                "evictions": self.evictions,
+                "hit_ratio": round(hits / lookups, 4) if lookups else 0.0,
+            }
+
+    # ---------- memory tier ----------
+    def _memory_get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, text, size = entry
+            if expires_at and expires_at <= time.time():
+                del self._entries[key]
+                self._bytes -= size
+                return None
+            self._entries.move_to_end(key)
+            self.memory_hits += 1
+            return text
+
+    def _memory_put(self, key: str, text: str, expires_at: float):
+        size = sys.getsizeof(text) + sys.getsizeof(key)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._entries.pop(key, None)
+            if old is not None:
+                self._bytes -= old[2]
+            self._entries[key] = (expires_at, text, size)
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                _, (_, _, evicted) = self._entries.popitem(last=False)
+                self._bytes -= evicted
+                self.evictions += 1
+
+    # ---------- disk tier (runs in worker threads) ----------
+    def _path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, f"{key}.json")
+
+    def _disk_get(self, key: str) -> Optional[Tuple[float, str]]:
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            return None
+        expires_at = float(data.get("expires_at") or 0)
+        if expires_at and expires_at <= time.time():
+            self._disk_remove(path)
+            return None
+        return expires_at, data.get("text") or ""
+
+    def _disk_put(self, key: str, text: str, expires_at: float):
+        os.makedirs(self.disk_dir, exist_ok=True)
+        path = self._path(key)
+        tmp = f"{path}.{threading.get_ident()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"expires_at": expires_at, "text": text}, f, ensure_ascii=False)
+        # 覆盖已有文件（刷新或重复写入同一个键）时只计入大小差值
+        try:
+            old_size = os.path.getsize(path)
+        except OSError:
+            old_size = 0
+        os.replace(tmp, path)
+        size = os.path.getsize(path)
+        with self._lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes += size - old_size
+        if self.disk_max_bytes and (self._disk_bytes is None or self._disk_bytes > self.disk_max_bytes):
+            self._disk_prune()
+
+    def _disk_remove(self, path: str):
+        try:
+            size = os.path.getsize(path)
+            os.remove(path)
+        except OSError:
+            return
+        with self._lock:
+            if self._disk_bytes is not None:
+                self._disk_bytes -= size
+
+    def _disk_prune(self):
+        """重新统计磁盘层大小，删除过期文件，仍超限时从最旧的文件开始删除到上限的 90%"""
+        files = []
+        now = time.time()
+        for name in os.listdir(self.disk_dir):
+            if not name.endswith(".json"):
+                continue
+            path = os.path.join(self.disk_dir, name)
+            try:
+                st = os.stat(path)
+            except OSError:
+                continue
+            files.append((st.st_mtime, st.st_size, path))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        target = self.disk_max_bytes * 0.9
+        for mtime, size, path in files:
+            if total <= target and (not self.ttl or mtime + self.ttl > now):
+                continue
+            try:
+                os.remove(path)
+                total -= size
+            except OSError:
+                pass
+        with self._lock:
+            self._disk_bytes = total
+
+
+completion_cache = CompletionCache(
+    Config.COMPLETION_CACHE_MAX_BYTES,
+    Config.COMPLETION_CACHE_TTL,
+    Config.COMPLETION_CACHE_DIR,
+    Config.COMPLETION_CACHE_DISK_MAX_BYTES,
+)
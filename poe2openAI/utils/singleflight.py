@@ -0,0 +1,220 @@
+import asyncio
+import hashlib
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Tuple
+from config import Config
+from utils.chunk_buffer import ChunkBuffer
+
+# 订阅者每次从缓冲中取出的最多分片数
+_REPLAY_BATCH = 256
+
+
+def singleflight_enabled(headers) -> bool:
+    """全局开关 SINGLEFLIGHT_ENABLED；请求头 Cache-Control: no-cache / no-store 表示要求独立的新结果，不合并"""
+    if not Config.SINGLEFLIGHT_ENABLED:
+        return False
+    directives = {d.strip().split("=")[0] for d in (headers.get("cache-control") or "").lower().split(",")}
+    return not directives & {"no-cache", "no-store"}
+
+
+def caller_scope(api_key: Optional[str]) -> str:
+    """不同 API key 的请求不合并；键里只放摘要，不保存明文 key"""
+    return hashlib.sha256((api_key or "").encode("utf-8")).hexdigest()[:16]
+
+
+class _StreamFlight:
+    """
+    一个进行中的流式上游请求：分片顺序保存在 ChunkBuffer 中一份，订阅者各自持有读取位置。
+    缓冲内存上限沿用 STREAM_BACKPRESSURE_MAX_BYTES，超出部分写入临时文件，慢订阅者不会让内存无限增长。
+    """
+
+    def __init__(self):
+        self.buffer = ChunkBuffer(Config.STREAM_BACKPRESSURE_MAX_BYTES, Config.STREAM_BACKPRESSURE_SPILL_DIR)
+        self.done = False
+        self.error: Optional[BaseException] = None
+        self.subscribers = 0
+        self.task: Optional[asyncio.Task] = None
+        # 最后一个订阅者离开后等待重新加入的计时器
+        self.linger: Optional[asyncio.TimerHandle] = None
+        self._changed = asyncio.Event()
+
+    async def wait(self):
+        await self._changed.wait()
+
+    def notify(self):
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    async def run(self, source: AsyncIterator[str]):
+        try:
+            async for chunk in source:
+                if chunk:
+                    self.buffer.append(chunk)
+                    self.notify()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.error = e
+        finally:
+            self.done = True
+            self.notify()
+
+
+class _Subscription:
+    """
+    flights.stream() 返回的迭代器。订阅在创建时即登记（首次读取前其他订阅者退出不会误取消上游）；
+    读完、出错、aclose() 或被回收时退订一次，即使从未开始读取。
+    """
+
+    def __init__(self, owner: "SingleFlight", key: str, flight: _StreamFlight):
+        self._owner = owner
+        self._key = key
+        self._flight = flight
+        self._chunks = owner._follow(flight)
+        self._left = False
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self) -> str:
+        if self._left:
+            raise StopAsyncIteration
+        try:
+            return await self._chunks.__anext__()
+        except BaseException:
+            self._leave()
+            raise
+
+    async def aclose(self):
+        try:
+            await self._chunks.aclose()
+        finally:
+            self._leave()
+
+    def _leave(self):
+        if not self._left:
+            self._left = True
+            self._owner._unsubscribe(self._key, self._flight)
+
+    def __del__(self):
+        self._leave()
+
+
+class SingleFlight:
+    """
+    合并完全相同且正在进行中的上游请求（键为请求的规范化哈希）：
+    - do():     非流式，后到的调用等待第一个调用的结果；上游调用在独立任务中执行，发起者断开不影响其他等待者；
+    - stream(): 流式，后到的调用先收到已产出的前缀，再跟随实时分片；所有订阅者都断开后再保留 linger 秒，
+                期间到达的相同请求（如客户端断线重试）接着使用它，仍无人订阅时才取消上游请求。
+    请求结束即从表中移除，之后到达的相同请求重新发起。仅在事件循环线程中使用。
+    """
+
+    def __init__(self, linger: float = 0):
+        self.linger = max(0.0, float(linger))
+        self._calls: Dict[str, asyncio.Task] = {}
+        self._streams: Dict[str, _StreamFlight] = {}
+        self.leaders = 0
+        self.joined = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """返回 (结果, 是否复用了进行中的请求)"""
+        task = self._calls.get(key)
+        shared = task is not None
+        if shared:
+            self.joined += 1
+        else:
+            self.leaders += 1
+            task = asyncio.get_running_loop().create_task(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda t, k=key: self._call_done(k, t))
+        return await asyncio.shield(task), shared
+
+    def _call_done(self, key: str, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        # 所有调用方都已断开时异常无人读取，这里取走以免 asyncio 报 "exception was never retrieved"
+        if not task.cancelled():
+            task.exception()
+
+    def stream(self, key: str, source_factory: Callable[[], AsyncIterator[str]]) -> Tuple[AsyncIterator[str], bool]:
+        """
+        返回 (分片迭代器, 是否复用了进行中的流)。复用时上游输出不是本请求产生的，调用方据此跳过训练日志等只应记录一次的处理。
+        """
+        flight = self._streams.get(key)
+        joined = flight is not None
+        if joined:
+            self.joined += 1
+            if flight.linger is not None:
+                flight.linger.cancel()
+                flight.linger = None
+        else:
+            self.leaders += 1
+            flight = _StreamFlight()
+            self._streams[key] = flight
+            flight.task = asyncio.get_running_loop().create_task(flight.run(source_factory()))
+            flight.task.add_done_callback(lambda t, k=key, f=flight: self._flight_done(k, f))
+        flight.subscribers += 1
+        return _Subscription(self, key, flight), joined
+
+    async def _follow(self, flight: _StreamFlight) -> AsyncIterator[str]:
+        # 从第一个分片开始产出：后加入的请求先拿到已缓冲的前缀，再跟随实时分片；
+        # 分批取出，落后很多的订阅者每次只物化有限个分片
+        idx = 0
+        while True:
+            if idx < len(flight.buffer):
+                batch = flight.buffer.chunks(idx, idx + _REPLAY_BATCH)
+                idx += len(batch)
+                for chunk in batch:
+                    yield chunk
+                continue
+            if flight.done:
+                if flight.error is not None:
+                    raise flight.error
+                return
+            await flight.wait()
+
+    def _unsubscribe(self, key: str, flight: _StreamFlight):
+        flight.subscribers -= 1
+        if flight.subscribers > 0:
+            return
+        if flight.done:
+            flight.buffer.close()
+            return
+        if self.linger:
+            # 断线的客户端通常很快重试：保留上游请求一段时间，重试的请求接着使用它
+            if flight.linger is None:
+                flight.linger = flight.task.get_loop().call_later(self.linger, self._abandon, key, flight)
+            return
+        self._abandon(key, flight)
+
+    def _abandon(self, key: str, flight: _StreamFlight):
+        flight.linger = None
+        if flight.subscribers > 0 or flight.done:
+            return
+        # 没有客户端在等这个结果了，停止上游请求；之后的相同请求会重新发起（缓冲在任务结束后释放）
+        if self._streams.get(key) is flight:
+            del self._streams[key]
+        flight.task.cancel()
+
+    def _flight_done(self, key: str, flight: _StreamFlight):
+        if self._streams.get(key) is flight:
+            del self._streams[key]
+        if flight.linger is not None:
+            flight.linger.cancel()
+            flight.linger = None
+        if flight.subscribers == 0:
+            flight.buffer.close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "in_flight": len(self._calls),
+            "in_flight_streams": len(self._streams),
+            "subscribers": sum(f.subscribers for f in self._streams.values()),
+            "lingering_streams": sum(1 for f in self._streams.values() if f.linger is not None),
+            "buffered_bytes": sum(f.buffer.memory_bytes for f in self._streams.values()),
+            "spilled_bytes": sum(f.buffer.spilled_bytes for f in self._streams.values()),
+            "leaders": self.leaders,
+            "joined": self.joined,
+        }
+
+
+flights = SingleFlight(Config.SINGLEFLIGHT_LINGER_SECONDS)
@@ -0,0 +1,86 @@
+import asyncio
+from typing import AsyncIterator, Optional
+from config import Config
+
+# 关闭合并的请求头取值，例如 X-Stream-Coalesce: off
+_OPT_OUT_VALUES = {"0", "off", "false", "no", "none"}
+
+
+def coalesce_enabled(headers) -> bool:
+    """按全局配置与请求头 X-Stream-Coalesce 判断本次请求是否合并流式分片"""
+    if Config.STREAM_COALESCE_MS <= 0 or Config.STREAM_COALESCE_BYTES <= 0:
+        return False
+    value = (headers.get("x-stream-coalesce") or "").strip().lower()
+    return value not in _OPT_OUT_VALUES
+
+
+async def coalesce_chunks(
+    source: AsyncIterator[str],
+    max_delay_ms: Optional[float] = None,
+    max_bytes: Optional[int] = None,
+) -> AsyncIterator[str]:
+    """
+    把上游的细碎文本分片合并后再产出，减少 SSE 帧数（每帧一次模型构建 + JSON 序列化 + 一次写）。
+    - 缓冲区达到 max_bytes（UTF-8 字节）立即产出；
+    - 缓冲区中最早的分片等待满 max_delay_ms 时产出，不等待下一个分片到达；
+    - 距离上次产出已超过 max_delay_ms 的分片直接产出，慢速流（含首个分片）不增加延迟。
+    上游结束时产出剩余内容；上游异常在产出剩余内容后继续抛出。
+    """
+    max_delay = (Config.STREAM_COALESCE_MS if max_delay_ms is None else max_delay_ms) / 1000.0
+    max_bytes = Config.STREAM_COALESCE_BYTES if max_bytes is None else max_bytes
+    loop = asyncio.get_running_loop()
+    iterator = source.__aiter__()
+    parts = []
+    size = 0
+    deadline = 0.0
+    last_flush = float("-inf")
+    pending: Optional[asyncio.Future] = None
+    error: Optional[Exception] = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+            if parts:
+                # 只等到截止时间；超时不取消 pending，下一轮继续等同一个分片
+                done, _ = await asyncio.wait({pending}, timeout=max(0.0, deadline - loop.time()))
+                if not done:
+                    yield "".join(parts)
+                    parts, size = [], 0
+                    last_flush = loop.time()
+                    continue
+            fut, pending = pending, None
+            try:
+                chunk = await fut
+            except StopAsyncIteration:
+                break
+            except Exception as e:
+                error = e
+                break
+            if not chunk:
+                continue
+            now = loop.time()
+            if not parts:
+                if now - last_flush >= max_delay:
+                    last_flush = now
+                    yield chunk
+                    continue
+                deadline = now + max_delay
+            parts.append(chunk)
+            size += len(chunk.encode("utf-8"))
+            if size >= max_bytes:
+                yield "".join(parts)
+                parts, size = [], 0
+                last_flush = loop.time()
+    finally:
+        if pending is not None and not pending.done():
+            pending.cancel()
+            try:
+                await pending
+            except (asyncio.CancelledError, Exception):
+                pass
+        if hasattr(iterator, "aclose"):
+            await iterator.aclose()
+    if parts:
+        yield "".join(parts)
+    if error is not None:
+        raise error
@@ -1,3 +1,4 @@
+-- 新库可直接执行本文件；已有库请在部署时运行 chat_backend/schema_migrations.py 补齐索引（版本记录于 schema_migrations 表）
 -- Projects Table
 CREATE TABLE IF NOT EXISTS projects (
     id INT AUTO_INCREMENT PRIMARY KEY,
@@ -37,6 +38,7 @@ CREATE TABLE IF NOT EXISTS plan_documents (
     FOREIGN KEY (project_id) REFERENCES projects(id) ON DELETE CASCADE,
     FOREIGN KEY (category_id) REFERENCES plan_categories(id),
     INDEX idx_project_category (project_id, category_id),
+    INDEX idx_project_category_filename_version (project_id, category_id, filename, version),
     INDEX idx_created_time (created_time)
 );
 
@@ -115,13 +117,14 @@ CREATE TABLE IF NOT EXISTS conversations (
     system_prompt MEDIUMTEXT,
     status TINYINT NOT NULL DEFAULT 0, -- 1 为存档
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+    updated_at DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP, -- 会话列表 keyset 分页的游标列，不允许 NULL
+    project_id INT NOT NULL DEFAULT 0,
+    name VARCHAR(32) DEFAULT NULL COMMENT '会话名称',
+    assistance_role VARCHAR(32) DEFAULT NULL COMMENT '助手角色',
+    model VARCHAR(64) DEFAULT NULL COMMENT '使用的模型名称',
+    -- 会话列表按项目/状态筛选并按 updated_at 倒序 keyset 分页
+    INDEX idx_project_status_updated (project_id, status, updated_at)
 );
-ALTER TABLE conversations
-ADD COLUMN project_id INT NOT NULL DEFAULT 0
-ADD COLUMN name VARCHAR(32) DEFAULT NULL COMMENT '会话名称',
-ADD COLUMN assistance_role VARCHAR(32) DEFAULT NULL COMMENT '助手角色',
-ADD COLUMN model VARCHAR(64) DEFAULT NULL COMMENT '使用的模型名称';
 
 CREATE TABLE IF NOT EXISTS messages (
     id BIGINT PRIMARY KEY AUTO_INCREMENT,
@@ -129,9 +132,12 @@ CREATE TABLE IF NOT EXISTS messages (
     role VARCHAR(32),
     content MEDIUMTEXT,
     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
-    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP
-    FOREIGN KEY (conversation_id) REFERENCES conversations(id) ON DELETE CASCADE
+    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+    FOREIGN KEY (conversation_id) REFERENCES conversations(id) ON DELETE CASCADE,
+    -- 消息按会话做 keyset 分页（WHERE conversation_id=? AND id<? ORDER BY id DESC LIMIT n）
+    INDEX idx_conversation_id_id (conversation_id, id)
 );
+-- 已有数据库的索引与列变更由 chat_backend/schema_migrations.py 应用
 
 -- 创建文档引用表，用于记录项目和会话对知识库的引用关系，即引用了的文档会作为提问上下文的一部分
 CREATE TABLE IF NOT EXISTS document_references (